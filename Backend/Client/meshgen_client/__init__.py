@@ -0,0 +1,2 @@
+from .client import MeshGenClient
+from .errors import MeshGenError, ResourceNotFoundError, TaskFailedError, WaitTimeoutError
@@ -0,0 +1,370 @@
+# Base
+import uuid
+import time
+import asyncio
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Union
+
+# Third-party
+import httpx
+
+# Local
+from .errors import MeshGenError, ResourceNotFoundError, TaskFailedError, WaitTimeoutError
+
+def _http2_available() -> bool:
+    try:
+        import h2
+        return True
+    except ImportError:
+        return False
+
+class MeshGenClient:
+    """
+    Async client of the MeshGenAPI (Backend/Server/server.py).
+
+    All calls share one connection pool, HTTP/2 when the h2 package is
+    installed and keep-alive HTTP/1.1 otherwise. Fan-out helpers run at
+    most max_concurrency requests at a time.
+
+    Example:
+        async with MeshGenClient("https://host/api") as client:
+            project_id = await client.request_image("a red chair")
+            await client.wait_image(project_id)
+            await client.request_mesh(project_id)
+            await client.download_mesh(project_id, "chair.zip")
+    """
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = 20,
+        max_concurrency: int = 8,
+        long_poll_s: float = 20.0,
+        timeout_s: float = 60.0,
+        http2: bool = True,
+        transport: httpx.AsyncBaseTransport = None
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.long_poll_s = long_poll_s
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+        self.http = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=http2 and _http2_available(),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ),
+            # Long polls hold the response back, give reads headroom
+            timeout=httpx.Timeout(timeout_s, read=timeout_s + long_poll_s),
+            transport=transport
+        )
+
+    async def __aenter__(self) -> "MeshGenClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    # Private
+    ################################################################
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response):
+        url = str(response.url)
+
+        if response.status_code == 404:
+            raise ResourceNotFoundError(url)
+
+        # The task failed on a worker, the server itself is fine
+        if response.status_code == 409:
+            try:
+                detail = response.json().get("detail")
+            except Exception:
+                detail = None
+            if isinstance(detail, dict) and detail.get("status") == "FAILED":
+                raise TaskFailedError(url, detail.get("error"))
+
+        response.raise_for_status()
+
+    @staticmethod
+    def _retry_after(
+        response: httpx.Response,
+        default: float
+    ) -> float:
+        try:
+            return max(0.0, float(response.headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            return default
+
+    async def _poll(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        timeout: Union[float, None],
+        on_ready: Callable[[httpx.Response], Awaitable[Any]]
+    ) -> Any:
+        """
+        Wait until url answers 200 and hand the (streamed) response to on_ready.
+
+        Asks the server to long-poll, sleeps for Retry-After between polls and
+        falls back to exponential backoff if the server sends neither.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        backoff = 0.5
+
+        while True:
+            wait = self.long_poll_s
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise WaitTimeoutError(url, timeout)
+                wait = min(wait, remaining)
+
+            async with self.http.stream("GET", url, params={ **params, "wait": wait }) as response:
+                if response.status_code == 200:
+                    return await on_ready(response)
+
+                if response.status_code != 202:
+                    await response.aread()
+                    self._raise_for_status(response)
+                    raise MeshGenError(f"Unexpected status {response.status_code} from {url}")
+
+                delay = self._retry_after(response, default=backoff)
+
+            backoff = min(backoff * 2, 5.0)
+            if deadline is not None:
+                delay = min(delay, max(0.0, deadline - time.monotonic()))
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _read(response: httpx.Response) -> bytes:
+        return await response.aread()
+
+    @staticmethod
+    async def _stream_to_file(
+        response: httpx.Response,
+        path: Path,
+        chunk_size: int
+    ) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write next to the target, rename once complete
+        partial = path.with_name(path.name + ".part")
+        with open(partial, "wb") as file:
+            async for chunk in response.aiter_bytes(chunk_size):
+                file.write(chunk)
+        partial.replace(path)
+
+        return path
+
+    # Public (Image)
+    ################################################################
+
+    async def request_image(
+        self,
+        prompt: str,
+        negative_prompt: str = None,
+        num_variants: int = 1,
+        perspective_mesh: bool = False,
+        resolution: int = None,
+        priority: str = "interactive",
+        tenant_id: str = None
+    ) -> uuid.UUID:
+        """
+        num_variants images are generated, see select_image. perspective_mesh
+        also meshes the first one in the same task, wait for it with
+        download_mesh.
+        """
+        response = await self.http.post("/image", json={
+            "prompt": prompt,
+            "negative_prompt": negative_prompt,
+            "num_variants": num_variants,
+            "perspective_mesh": perspective_mesh,
+            "resolution": resolution,
+            "priority": priority,
+            "tenant_id": tenant_id
+        })
+        self._raise_for_status(response)
+        return uuid.UUID(response.json()["project_id"])
+
+    async def upload_image(
+        self,
+        image: Union[bytes, str, Path]
+    ) -> uuid.UUID:
+        image_bytes = image if isinstance(image, bytes) else Path(image).read_bytes()
+        response = await self.http.put(
+            "/image",
+            content=image_bytes,
+            headers={ "Content-Type": "application/image" }
+        )
+        self._raise_for_status(response)
+        return uuid.UUID(response.json()["project_id"])
+
+    async def wait_image(
+        self,
+        project_id: uuid.UUID,
+        timeout: float = None,
+        variant: int = None
+    ) -> bytes:
+        params = {} if variant is None else { "variant": variant }
+        return await self._poll(f"/image/{project_id}", params, timeout, self._read)
+
+    async def download_image(
+        self,
+        project_id: uuid.UUID,
+        path: Union[str, Path],
+        timeout: float = None,
+        chunk_size: int = 1 << 16,
+        variant: int = None
+    ) -> Path:
+        return await self._poll(
+            f"/image/{project_id}",
+            {} if variant is None else { "variant": variant },
+            timeout,
+            lambda response: self._stream_to_file(response, path, chunk_size)
+        )
+
+    async def select_image(
+        self,
+        project_id: uuid.UUID,
+        variant: int
+    ):
+        """
+        Use a generated variant as the project image, before requesting meshes.
+        """
+        response = await self.http.post(f"/image/{project_id}/select", json={ "variant": variant })
+        self._raise_for_status(response)
+
+    # Public (Mesh)
+    ################################################################
+
+    async def request_mesh(
+        self,
+        project_id: uuid.UUID,
+        perspective: bool = True,
+        textured: bool = True,
+        resolution: int = None,
+        priority: str = "interactive",
+        tenant_id: str = None
+    ):
+        """
+        resolution is the perspective mesh grid, re-meshed from stored depth
+        without GPU inference when the project was meshed before.
+        """
+        response = await self.http.post("/model", json={
+            "project_id": str(project_id),
+            "perspective": perspective,
+            "textured": textured,
+            "resolution": resolution,
+            "priority": priority,
+            "tenant_id": tenant_id
+        })
+        self._raise_for_status(response)
+
+    async def download_mesh(
+        self,
+        project_id: uuid.UUID,
+        path: Union[str, Path],
+        perspective: bool = True,
+        textured: bool = True,
+        resolution: int = None,
+        lod: int = None,
+        timeout: float = None,
+        chunk_size: int = 1 << 16
+    ) -> Path:
+        """
+        Wait for the mesh zip and stream it to path without buffering it in memory.
+        lod picks an adaptive level of detail, when the worker generates them.
+        """
+        params = {
+            "perspective": perspective,
+            "textured": textured
+        }
+        if resolution is not None:
+            params["resolution"] = resolution
+        if lod is not None:
+            params["lod"] = lod
+        return await self._poll(
+            f"/model/{project_id}",
+            params,
+            timeout,
+            lambda response: self._stream_to_file(response, path, chunk_size)
+        )
+
+    async def download_pointcloud(
+        self,
+        project_id: uuid.UUID,
+        path: Union[str, Path],
+        timeout: float = None,
+        chunk_size: int = 1 << 16
+    ) -> Path:
+        """
+        Wait for the binary PLY preview of a perspective project, a fraction
+        of the size of the mesh zip.
+        """
+        return await self._poll(
+            f"/model/{project_id}",
+            { "kind": "pointcloud" },
+            timeout,
+            lambda response: self._stream_to_file(response, path, chunk_size)
+        )
+
+    # Public (Bulk)
+    ################################################################
+
+    async def gather_limited(
+        self,
+        fn: Callable[[Any], Awaitable[Any]],
+        items: Iterable[Any]
+    ) -> List[Any]:
+        """
+        Run fn over items concurrently, at most max_concurrency at a time.
+        Results keep the order of items.
+        """
+        async def run(item):
+            async with self.semaphore:
+                return await fn(item)
+
+        return await asyncio.gather(*(run(item) for item in items))
+
+    async def submit_images(
+        self,
+        requests: Iterable[Union[str, Dict[str, Any]]]
+    ) -> List[uuid.UUID]:
+        """
+        Bulk image submission, each request is a prompt or request_image kwargs.
+        """
+        requests = [{ "prompt": r } if isinstance(r, str) else r for r in requests]
+        return await self.gather_limited(lambda r: self.request_image(**r), requests)
+
+    async def generate_meshes(
+        self,
+        project_ids: Iterable[uuid.UUID],
+        directory: Union[str, Path],
+        perspective: bool = True,
+        textured: bool = True,
+        resolution: int = None,
+        timeout: float = None,
+        **request_kwargs
+    ) -> List[Path]:
+        """
+        Request, wait for and download meshes of many projects.
+        """
+        directory = Path(directory)
+
+        async def generate(project_id):
+            await self.request_mesh(project_id, perspective, textured, resolution=resolution, **request_kwargs)
+            return await self.download_mesh(
+                project_id,
+                directory / f"{project_id}.zip",
+                perspective=perspective,
+                textured=textured,
+                resolution=resolution,
+                timeout=timeout
+            )
+
+        return await self.gather_limited(generate, list(project_ids))
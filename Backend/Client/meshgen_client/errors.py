@@ -0,0 +1,30 @@
+from typing import Union
+
+class MeshGenError(Exception):
+    """
+    Base class of all client errors.
+    """
+
+class ResourceNotFoundError(MeshGenError):
+    def __init__(self, url: str) -> None:
+        super().__init__(f"Resource not found: {url}")
+        self.url = url
+
+class TaskFailedError(MeshGenError):
+    def __init__(
+        self,
+        url: str,
+        error: Union[dict, None] = None
+    ) -> None:
+        error = error or {}
+        super().__init__(
+            f"Task failed: {url} ({error.get('class', 'Unknown')}: {error.get('message', '')})"
+        )
+        self.url = url
+        self.error = error
+
+class WaitTimeoutError(MeshGenError):
+    def __init__(self, url: str, timeout: float) -> None:
+        super().__init__(f"Timed out after {timeout}s waiting for {url}")
+        self.url = url
+        self.timeout = timeout
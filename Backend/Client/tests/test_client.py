@@ -0,0 +1,194 @@
+# Base
+import uuid
+import asyncio
+from pathlib import Path
+
+# Third-party
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
+
+# Local
+from meshgen_client import MeshGenClient, ResourceNotFoundError, TaskFailedError, WaitTimeoutError
+
+MESH_BYTES = b"mesh" * 10000
+
+class StubServer:
+    """
+    In-process stand-in for the MeshGen API, answers like Backend/Server/server.py.
+    """
+    def __init__(
+        self,
+        pending_polls: int = 0,
+        retry_after: str = "0.01"
+    ) -> None:
+        self.pending_polls = pending_polls
+        self.retry_after = retry_after
+        self.polls = []
+        self.active = 0
+        self.peak_active = 0
+        self.prompts = []
+        self.failed = set()
+        self.broken_stream = False
+
+        self.app = FastAPI()
+        self.app.post("/image")(self.request_image)
+        self.app.get("/image/{project_id}")(self.get_image)
+        self.app.get("/model/{project_id}")(self.get_mesh)
+
+    def _pending(self, wait: float) -> bool:
+        self.polls.append(wait)
+        return len(self.polls) <= self.pending_polls
+
+    async def request_image(self, request: dict):
+        # Held open so concurrent submissions overlap
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+
+        self.prompts.append(request["prompt"])
+        return { "project_id": str(uuid.uuid5(uuid.NAMESPACE_URL, request["prompt"])) }
+
+    async def get_image(self, project_id: uuid.UUID, wait: float = 0):
+        if project_id in self.failed:
+            raise HTTPException(
+                status_code=409,
+                detail={ "status": "FAILED", "error": { "class": "PoisonTaskError", "message": "bad prompt" } }
+            )
+        if project_id.int == 0:
+            raise HTTPException(status_code=404, detail="Image not found")
+        if project_id.int == 1:
+            raise HTTPException(status_code=500, detail="Internal error")
+        if self._pending(wait):
+            return Response(status_code=202, headers={ "Retry-After": self.retry_after })
+        return Response(content=b"png", media_type="image/png")
+
+    async def get_mesh(self, project_id: uuid.UUID, wait: float = 0):
+        if self._pending(wait):
+            return Response(status_code=202, headers={ "Retry-After": self.retry_after })
+
+        async def chunks():
+            for i in range(0, len(MESH_BYTES), 4096):
+                if self.broken_stream and i > 0:
+                    raise ConnectionError("connection dropped")
+                yield MESH_BYTES[i:i + 4096]
+
+        return StreamingResponse(chunks(), media_type="application/zip")
+
+def run(stub: StubServer, fn, **client_kwargs):
+    async def main():
+        client = MeshGenClient(
+            "http://stub",
+            transport=httpx.ASGITransport(app=stub.app),
+            **client_kwargs
+        )
+        async with client:
+            return await fn(client)
+    return asyncio.run(main())
+
+def test_wait_follows_retry_after(monkeypatch):
+    stub = StubServer(pending_polls=2, retry_after="1.5")
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def recording_sleep(delay):
+        sleeps.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr("meshgen_client.client.asyncio.sleep", recording_sleep)
+    image = run(stub, lambda client: client.wait_image(uuid.uuid4()), long_poll_s=7)
+
+    assert image == b"png"
+    assert stub.polls == [7, 7, 7]
+    assert sleeps == [1.5, 1.5]
+
+def test_wait_long_poll_shrinks_to_timeout():
+    stub = StubServer(pending_polls=1000)
+
+    with pytest.raises(WaitTimeoutError):
+        run(stub, lambda client: client.wait_image(uuid.uuid4(), timeout=0.2), long_poll_s=20)
+
+    assert len(stub.polls) > 1
+    assert all(0 < wait <= 0.2 for wait in stub.polls)
+
+def test_submit_images_limits_concurrency():
+    stub = StubServer()
+    prompts = [f"prompt {i}" for i in range(10)]
+
+    project_ids = run(stub, lambda client: client.submit_images(prompts), max_concurrency=3)
+
+    assert stub.peak_active == 3
+    assert sorted(stub.prompts) == sorted(prompts)
+    # Results keep the order of the requests
+    assert project_ids == [uuid.uuid5(uuid.NAMESPACE_URL, p) for p in prompts]
+
+def test_download_mesh_streams_to_file(tmp_path: Path):
+    stub = StubServer(pending_polls=1)
+    path = tmp_path / "meshes" / "mesh.zip"
+
+    result = run(stub, lambda client: client.download_mesh(uuid.uuid4(), path))
+
+    assert result == path
+    assert path.read_bytes() == MESH_BYTES
+    assert not path.with_name("mesh.zip.part").exists()
+
+def test_stream_writes_part_file_then_renames(tmp_path: Path):
+    path = tmp_path / "mesh.zip"
+    path.write_bytes(b"old")
+    partial = tmp_path / "mesh.zip.part"
+    seen = []
+
+    class ChunkedResponse:
+        async def aiter_bytes(self, chunk_size):
+            for i in range(3):
+                # The target keeps its old content until the download completes
+                seen.append((partial.exists(), path.read_bytes()))
+                yield b"new%d" % i
+
+    asyncio.run(MeshGenClient._stream_to_file(ChunkedResponse(), path, 1 << 16))
+
+    assert seen[0] == (True, b"old")
+    assert seen[-1] == (True, b"old")
+    assert path.read_bytes() == b"new0new1new2"
+    assert not partial.exists()
+
+def test_broken_download_keeps_previous_file(tmp_path: Path):
+    stub = StubServer()
+    stub.broken_stream = True
+    path = tmp_path / "mesh.zip"
+    path.write_bytes(b"old")
+
+    with pytest.raises(Exception):
+        run(stub, lambda client: client.download_mesh(uuid.uuid4(), path))
+
+    assert path.read_bytes() == b"old"
+
+def test_failed_task_raises_task_failed():
+    stub = StubServer()
+    project_id = uuid.uuid4()
+    stub.failed.add(project_id)
+
+    with pytest.raises(TaskFailedError) as info:
+        run(stub, lambda client: client.wait_image(project_id))
+
+    assert info.value.error["class"] == "PoisonTaskError"
+    assert "bad prompt" in str(info.value)
+    # FAILED is final, no further polls
+    assert stub.polls == []
+
+def test_missing_resource_raises_not_found():
+    stub = StubServer()
+
+    with pytest.raises(ResourceNotFoundError):
+        run(stub, lambda client: client.wait_image(uuid.UUID(int=0)))
+
+def test_server_error_is_not_a_failed_task():
+    stub = StubServer()
+
+    with pytest.raises(httpx.HTTPStatusError) as info:
+        run(stub, lambda client: client.wait_image(uuid.UUID(int=1)))
+
+    assert not isinstance(info.value, TaskFailedError)
+    assert info.value.response.status_code == 500
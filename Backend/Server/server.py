@@ -1,6 +1,8 @@
 # Python
 import io
+import time
 import uuid
+import asyncio
 
 # FastAPI
 from fastapi import FastAPI, Request, Response, HTTPException
@@ -12,6 +14,7 @@ from src import serializable
 from src.credentials import AWSCredentials
 from src.model import MeshGenServerModel
 from src.resource import ResourceStatus
+from src.priority import Priority
 
 # Init model
 ################################################################
@@ -29,6 +32,25 @@ async def lifespan(app: FastAPI):
     # On shutdown
     app_logic.destroy()
     
+# Polling hints for clients
+RETRY_AFTER_S = 1
+MAX_WAIT_S = 25
+
+# Task failed on a worker, final and not a server fault, so nothing retries it
+FAILED_STATUS_CODE = 409
+
+async def wait_while_pending(
+    task_type: str,
+    project_id: uuid.UUID,
+    wait: float
+):
+    """
+    Long-poll: hold the request until the task leaves pending or wait runs out.
+    """
+    deadline = time.monotonic() + min(max(wait, 0), MAX_WAIT_S)
+    while app_logic.is_pending(task_type, project_id) and time.monotonic() < deadline:
+        await asyncio.sleep(0.25)
+
 app = FastAPI(
     lifespan=lifespan,
     root_path="/api"
@@ -56,6 +78,20 @@ def root():
         "status": "OK"
     }
 
+@app.get("/queues")
+def get_queues():
+    """
+    Per-lane queue depth and wait times of every task type.
+    """
+    return app_logic.queue_report()
+
+@app.get("/workers")
+def get_workers():
+    """
+    Live workers with their capabilities, and throughput per role.
+    """
+    return app_logic.workers.report()
+
 # Image
 ################################################################
 
@@ -68,7 +104,12 @@ async def post_image(request: serializable.ImageGenerationRequest):
 
     image_uuid = app_logic.request_image_generation(
         request.prompt,
-        request.negative_prompt
+        request.negative_prompt,
+        num_variants=request.num_variants,
+        perspective_mesh=request.perspective_mesh,
+        resolution=request.resolution,
+        priority=Priority.parse(request.priority),
+        tenant_id=request.tenant_id
     )
     return { "project_id": str(image_uuid) }
 
@@ -83,16 +124,27 @@ async def put_image(request: Request):
     return { "project_id": str(image_uuid) }
 
 @app.get("/image/{project_id}")
-async def get_image(project_id: uuid.UUID):
-    result = app_logic.download_image(project_id)
+async def get_image(project_id: uuid.UUID, variant: int = None, wait: float = 0):
+    await wait_while_pending("image_gen", project_id, wait)
+    result = app_logic.download_image(project_id, variant)
     
     # Error
     if result.status == ResourceStatus.NOT_AVAILABLE:
         raise HTTPException(status_code=404, detail="Image not found")
     
+    # Failed, stop polling
+    elif result.status == ResourceStatus.FAILED:
+        raise HTTPException(
+            status_code=FAILED_STATUS_CODE,
+            detail={ "status": "FAILED", "error": result.error }
+        )
+    
     # Not ready, return 202
     elif result.status == ResourceStatus.PENDING:
-        return Response(status_code=202)
+        return Response(
+            status_code=202,
+            headers={ "Retry-After": str(RETRY_AFTER_S) }
+        )
     
     # Image is ready
     return Response(
@@ -100,6 +152,26 @@ async def get_image(project_id: uuid.UUID):
         media_type="image/png"
     )
 
+@app.post("/image/{project_id}/select")
+async def select_image(project_id: uuid.UUID, request: serializable.ImageSelectionRequest):
+    """
+    Use a generated variant as the project image
+    """
+    print(f"POST /image/{project_id}/select")
+    try:
+        result = app_logic.select_variant(project_id, request.variant)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if result.status == ResourceStatus.PENDING:
+        return Response(
+            status_code=202,
+            headers={ "Retry-After": str(RETRY_AFTER_S) }
+        )
+    elif result.status != ResourceStatus.AVAILABLE:
+        raise HTTPException(status_code=404, detail="Variant not found")
+    return { "project_id": str(project_id), "variant": request.variant }
+
 # Mesh
 ################################################################
 
@@ -108,23 +180,52 @@ async def post_depth(request: serializable.MeshGenerationRequest):
     mesh_uuid = app_logic.request_mesh_generation(
         request.project_id,
         perspective=request.perspective,
+        resolution=request.resolution,
+        priority=Priority.parse(request.priority),
+        tenant_id=request.tenant_id
     )
     return { "uuid": str(mesh_uuid) }
 
 @app.get("/model/{project_id}")
-async def get_mesh(project_id: uuid.UUID, perspective: bool = True, textured: bool = True):
-    result = app_logic.download_mesh_zip(project_id, perspective, textured)
+async def get_mesh(project_id: uuid.UUID, perspective: bool = True, textured: bool = True, resolution: int = None, lod: int = None, kind: str = "mesh", wait: float = 0):
+    # Point clouds are a preview of perspective projects
+    if kind not in ["mesh", "pointcloud"]:
+        raise HTTPException(status_code=400, detail=f"Invalid kind: {kind}")
+    if kind == "pointcloud" and not perspective:
+        raise HTTPException(status_code=400, detail="Point clouds are only available for perspective projects")
+    
+    task_type = "pmesh_gen" if perspective else "omesh_gen"
+    await wait_while_pending(task_type, project_id, wait)
+    if kind == "pointcloud":
+        # Building a missing point cloud is CPU work, off the event loop
+        result = await asyncio.get_running_loop().run_in_executor(
+            app_logic.remesh_executor,
+            app_logic.download_pointcloud,
+            project_id
+        )
+    else:
+        result = app_logic.download_mesh_zip(project_id, perspective, textured, resolution, lod)
     
     # Error
     if result.status == ResourceStatus.NOT_AVAILABLE:
         raise HTTPException(status_code=404, detail="Image not found")
     
+    # Failed, stop polling
+    elif result.status == ResourceStatus.FAILED:
+        raise HTTPException(
+            status_code=FAILED_STATUS_CODE,
+            detail={ "status": "FAILED", "error": result.error }
+        )
+    
     # Not ready, return 202
     elif result.status == ResourceStatus.PENDING:
-        return Response(status_code=202)
+        return Response(
+            status_code=202,
+            headers={ "Retry-After": str(RETRY_AFTER_S) }
+        )
     
     # Mesh is ready
     return Response(
         content=result.data.getvalue(),
-        media_type="application/zip"
+        media_type="application/x-ply" if kind == "pointcloud" else "application/zip"
     )
\ No newline at end of file
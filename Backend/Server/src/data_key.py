@@ -2,15 +2,34 @@
 class DataKey:
 
     @staticmethod
-    def image(project_id: str) -> str:
+    def image(
+        project_id: str,
+        variant: int = None
+    ) -> str:
+        if variant is not None:
+            return f"{project_id}/variants/{variant}.png"
         return f"{project_id}/image.png"
     
+    @staticmethod
+    def depth(project_id: str) -> str:
+        return f"{project_id}/depth.png"
+    
+    @staticmethod
+    def pointcloud(project_id: str) -> str:
+        return f"{project_id}/perspective/pointcloud.ply"
+    
     @staticmethod
     def mesh(
         project_id: str,
         perspective: bool= True,
-        textured: bool = True
+        textured: bool = True,
+        resolution: int = None,
+        lod: int = None
     ) -> str:
         mesh_dir = "perspective" if perspective else "object"
+        if resolution is not None:
+            mesh_dir = f"{mesh_dir}/{resolution}"
+        if lod:
+            mesh_dir = f"{mesh_dir}/lod{lod}"
         mesh_file = "textured" if textured else "mesh"
         return f"{project_id}/{mesh_dir}/{mesh_file}.zip"
\ No newline at end of file
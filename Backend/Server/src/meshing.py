@@ -0,0 +1,210 @@
+import numpy as np
+from typing import Tuple
+
+from .artifacts import MeshData
+
+# Triangle corners as (dy, dx) offsets from the cell's top-left pixel, in the
+# order the triangles are emitted for one pixel:
+#   0: left-bottom fan, only when the pixel on the left is missing
+#   1: lower triangle of the cell
+#   2: upper triangle of the cell
+#   3: fallback when the bottom-right pixel is missing
+TRIANGLE_OFFSETS = np.array([
+    [[0, 0], [1, -1], [1, 0]],
+    [[0, 0], [1, 0], [1, 1]],
+    [[0, 0], [1, 1], [0, 1]],
+    [[0, 0], [1, 0], [0, 1]]
+], dtype=np.int64)
+
+def create_pixel_vertice_mapping(
+    mask: np.ndarray
+) -> Tuple[np.ndarray, int]:
+    """
+    Vertex index of every masked pixel in row-major order, -1 elsewhere.
+    """
+    flat_mask = mask.reshape(-1).astype(bool)
+
+    grid = np.cumsum(flat_mask, dtype=np.int32) - 1
+    grid[~flat_mask] = -1
+    grid = grid.reshape(mask.shape[:2])
+
+    return grid, int(flat_mask.sum())
+
+def triangulate_grid(
+    grid: np.ndarray
+) -> np.ndarray:
+    """
+    Triangles (T, 3) over the valid pixels of a vertex grid.
+
+    Same triangles and order as the per-pixel scan: every pixel emits its
+    candidates 0..3 (see TRIANGLE_OFFSETS) and pixels are visited row-major.
+    """
+    h, w = grid.shape[:2]
+    if h < 2:
+        return np.zeros((0, 3), dtype=np.int32)
+
+    valid = grid >= 0
+    pad = np.zeros((h, w + 2), dtype=bool)
+    pad[:, 1:-1] = valid
+
+    # Neighbourhood of every pixel in rows 0..h-2
+    c = valid[:-1]
+    l = pad[:-1, :-2]
+    r = pad[:-1, 2:]
+    b = pad[1:, 1:-1]
+    bl = pad[1:, :-2]
+    br = pad[1:, 2:]
+
+    candidates = np.stack([
+        c & bl & b & ~l,
+        c & b & br,
+        c & r & br,
+        c & r & b & ~br
+    ], axis=-1)
+
+    # Row-major nonzero keeps the per-pixel emission order
+    flat = np.flatnonzero(candidates)
+    pixel, kind = np.divmod(flat, 4)
+    y, x = np.divmod(pixel, w)
+
+    offsets = TRIANGLE_OFFSETS[kind]
+    ys = y[:, None] + offsets[:, :, 0]
+    xs = x[:, None] + offsets[:, :, 1]
+
+    return grid[ys, xs].astype(np.int32)
+
+def grid_vertices(
+    depth: np.ndarray,
+    grid: np.ndarray
+) -> np.ndarray:
+    """
+    Vertex positions (V, 3) of the valid pixels, in vertex index order.
+    """
+    scaler = np.max(grid.shape[:2])
+    ys, xs = np.nonzero(grid >= 0)
+
+    v = np.empty((ys.shape[0], 3), dtype=np.float32)
+    v[:, 0] = xs / scaler
+    v[:, 1] = -ys / scaler
+    v[:, 2] = -depth[ys, xs]
+    return v
+
+def grid_uvs(
+    grid: np.ndarray
+) -> np.ndarray:
+    """
+    Texture coordinates (V, 2) per vertex, indexed like the vertices.
+    """
+    h, w = grid.shape[:2]
+    ys, xs = np.nonzero(grid >= 0)
+
+    uv = np.empty((ys.shape[0], 2), dtype=np.float32)
+    uv[:, 0] = xs / w
+    uv[:, 1] = 1 - ys / h
+    return uv
+
+def create_mesh_arrays(
+    depth: np.ndarray,
+    grid: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns:
+        vertices (V, 3), triangles (T, 3), per-vertex uvs (V, 2)
+    """
+    return grid_vertices(depth, grid), triangulate_grid(grid), grid_uvs(grid)
+
+def pointcloud_arrays(
+    image: np.ndarray,
+    depth: np.ndarray,
+    max_points: int = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Colored points of the masked pixels, centered like the meshes. The pixel
+    grid is subsampled by a uniform stride to at most max_points.
+
+    Returns:
+        points (N, 3), uint8 colors (N, 3)
+    """
+    mask = depth > 5
+    if max_points is not None:
+        stride = max(int(np.ceil(np.sqrt(mask.sum() / max(max_points, 1)))), 1)
+        image, depth, mask = image[::stride, ::stride], depth[::stride, ::stride], mask[::stride, ::stride]
+
+    grid, v_num = create_pixel_vertice_mapping(mask)
+    points = grid_vertices(depth / -200, grid)
+    if v_num > 0:
+        points -= points.mean(axis=0)
+
+    ys, xs = np.nonzero(grid >= 0)
+    return points, image[ys, xs]
+
+def _linear_coordinates(
+    dst_size: int,
+    src_size: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Half-pixel centers, clamped at the borders like cv2
+    x = (np.arange(dst_size, dtype=np.float64) + 0.5) * (src_size / dst_size) - 0.5
+    x0 = np.floor(x)
+    weight = x - x0
+    x0 = x0.astype(np.int64)
+
+    low = x0 < 0
+    x0[low], weight[low] = 0, 0
+    high = x0 >= src_size - 1
+    x0[high], weight[high] = src_size - 1, 0
+    return x0, np.minimum(x0 + 1, src_size - 1), weight.astype(np.float32)
+
+def resize_linear(
+    depth_map: np.ndarray,
+    width: int,
+    height: int
+) -> np.ndarray:
+    """
+    Bilinear resize sampled like cv2.resize(INTER_LINEAR), without the
+    antialiasing PIL applies when downscaling, so meshes of stored depth
+    match the ones WorkerA builds.
+    """
+    depth_map = np.asarray(depth_map, dtype=np.float32)
+    y0, y1, wy = _linear_coordinates(height, depth_map.shape[0])
+    x0, x1, wx = _linear_coordinates(width, depth_map.shape[1])
+
+    wx = wx[None, :]
+    top = depth_map[y0][:, x0] * (1 - wx) + depth_map[y0][:, x1] * wx
+    bottom = depth_map[y1][:, x0] * (1 - wx) + depth_map[y1][:, x1] * wx
+    return top * (1 - wy[:, None]) + bottom * wy[:, None]
+
+def perspective_mesh(
+    image: np.ndarray,
+    depth_map: np.ndarray,
+    resolution: int = 256
+) -> MeshData:
+    """
+    Textured mesh of a stored depth map, as WorkerA builds it.
+    """
+    depth_map = np.asarray(depth_map, dtype=np.float32)
+    if depth_map.shape[:2] != (resolution, resolution):
+        depth_map = resize_linear(depth_map, resolution, resolution)
+    mask = depth_map > 5
+    depth_map = depth_map / -200
+
+    v_grid, v_num = create_pixel_vertice_mapping(mask)
+    vertices, triangles, uvs = create_mesh_arrays(depth_map, v_grid)
+
+    # Center mesh
+    if v_num > 0:
+        vertices -= vertices.mean(axis=0)
+
+    return MeshData(vertices, triangles, uvs=uvs, texture=image)
+
+def perspective_pointcloud(
+    image: np.ndarray,
+    depth_map: np.ndarray,
+    max_points: int = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Point cloud preview of a stored depth map, as WorkerA builds it.
+    """
+    depth_map = np.asarray(depth_map, dtype=np.float32)
+    if depth_map.shape[:2] != image.shape[:2]:
+        depth_map = resize_linear(depth_map, image.shape[1], image.shape[0])
+    return pointcloud_arrays(image, depth_map, max_points=max_points)
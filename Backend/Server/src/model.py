@@ -1,15 +1,23 @@
 # Base
 import io
+import time
 import uuid
 import json
 import threading
+from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+
+# Third-party
+import numpy as np
 
 # Local
-from . import utils
+from . import utils, artifacts, meshing
 from .data_key import DataKey
 from .storage import S3Helper
 from .queue import SQSHelper, QueueMessage, AWSCredentials
+from .priority import Priority, LaneQueues, LaneStatistics
 from .resource import ResourceStatus, RequestedResource
+from .workers import WorkerRegistry
 
 class MeshGenServerModel:
     def __init__(
@@ -23,18 +31,18 @@ class MeshGenServerModel:
             credentials=credentials
         )
         
-        # SQS
-        self.sqs_image_gen = SQSHelper(
+        # SQS (one queue per priority lane)
+        self.sqs_image_gen = LaneQueues(
             "mg-image-queue",
             region="eu-central-1",
             credentials=credentials
         )
-        self.sqs_perspective_gen = SQSHelper(
+        self.sqs_perspective_gen = LaneQueues(
             "mg-perspective-gen",
             region="eu-central-1",
             credentials=credentials
         )
-        self.sqs_object_gen = SQSHelper(
+        self.sqs_object_gen = LaneQueues(
             "mg-object-gen",
             region="eu-central-1",
             credentials=credentials
@@ -52,6 +60,33 @@ class MeshGenServerModel:
             "omesh_gen": set()
         }
         
+        # Failed tasks with their error, reported until resubmitted
+        self.failed_tasks: Dict[str, Dict[uuid.UUID, dict]] = {
+            "image_gen": {},
+            "pmesh_gen": {},
+            "omesh_gen": {}
+        }
+        
+        # Image requests that also want a perspective mesh, meshed by the
+        # image worker when it serves both roles, queued here otherwise
+        self.fused_requests: Dict[uuid.UUID, dict] = {}
+        
+        # Task type -> its queues, results free their admission slots
+        self.task_queues = {
+            "image_gen": self.sqs_image_gen,
+            "pmesh_gen": self.sqs_perspective_gen,
+            "omesh_gen": self.sqs_object_gen
+        }
+        
+        # Per-lane wait time statistics
+        self.lane_statistics = LaneStatistics()
+        
+        # Live workers and their capabilities
+        self.workers = WorkerRegistry()
+        
+        # Re-meshing and point clouds from stored depth, CPU only
+        self.remesh_executor = ThreadPoolExecutor(max_workers=2)
+        
         # Result observation thread
         self.result_observation_interval_s = 1
         self.result_observation_thread = threading.Thread(target=self.observe_results)
@@ -72,6 +107,60 @@ class MeshGenServerModel:
         
         return new_uuid
     
+    def process_result(self, body_json: dict):
+        # Parse
+        project_id = uuid.UUID(body_json["project_id"])
+        task_type = str(body_json["task_type"])
+        
+        # Verify task type
+        assert task_type in self.pending_tasks, "Invalid task type"
+        
+        # Record wait times
+        lane = Priority.parse(body_json.get("priority")).lane
+        self.lane_statistics.record(
+            task_type,
+            lane,
+            wait_s=body_json.get("wait_s"),
+            submitted_at=body_json.get("submitted_at")
+        )
+        
+        # Next task of the lane's backlog goes to SQS
+        self.task_queues[task_type].finish(project_id)
+        
+        # Remove from pending
+        if project_id in self.pending_tasks[task_type]:
+            self.pending_tasks[task_type].remove(project_id)
+        else:
+            print(f"Task {project_id} not found in pending tasks of type {task_type}")
+        
+        # Track failure
+        if body_json.get("status", "done") == "failed":
+            print(f"Task {project_id} of type {task_type} failed: {body_json.get('error')}")
+            self.failed_tasks[task_type][project_id] = body_json.get("error") or {}
+        else:
+            self.failed_tasks[task_type].pop(project_id, None)
+        
+        if task_type == "image_gen" and project_id in self.fused_requests:
+            self.finish_fused_image(project_id, body_json)
+    
+    def finish_fused_image(
+        self,
+        project_id: uuid.UUID,
+        body_json: dict
+    ):
+        """
+        The mesh of a fused request fails with its image, and is queued as a
+        separate task when the image worker did not mesh it.
+        """
+        mesh_request = self.fused_requests.pop(project_id)
+        if body_json.get("status", "done") == "failed":
+            self.pending_tasks["pmesh_gen"].discard(project_id)
+            self.failed_tasks["pmesh_gen"][project_id] = body_json.get("error") or {}
+        elif not body_json.get("fused", False):
+            print(f"Image {project_id} was not meshed by its worker, queueing mesh")
+            self.pending_tasks["pmesh_gen"].discard(project_id)
+            self.request_mesh_generation(project_id, perspective=True, **mesh_request)
+    
     def observe_results(self):
         print("Observation Thread: Started")
         
@@ -84,19 +173,13 @@ class MeshGenServerModel:
             for msg in messages:
                 
                 try:
-                    # Parse
                     body_json = msg.body_json()
-                    project_id = uuid.UUID(body_json["project_id"])
-                    task_type = str(body_json["task_type"])
-                    
-                    # Verify task type
-                    assert task_type in self.pending_tasks, "Invalid task type"
                     
-                    # Remove from pending
-                    if project_id in self.pending_tasks[task_type]:
-                        self.pending_tasks[task_type].remove(project_id)
+                    # Worker advertisement, not a task result
+                    if body_json.get("message_type") == "worker_status":
+                        self.workers.update(body_json)
                     else:
-                        print(f"Task {project_id} not found in pending tasks of type {task_type}")
+                        self.process_result(body_json)
                 
                 except Exception as e:
                     print(f"Failed to process result message: {e}")
@@ -105,6 +188,10 @@ class MeshGenServerModel:
                 self.sqs_result.delete_message(msg.receipt_handle)
             
             print(f"Observation Thread: Processed {len(messages)} messages")
+            
+            # Admissions that failed to send earlier
+            for lane_queues in self.task_queues.values():
+                lane_queues.admit()
         
         print(f"Observation Thread: Finished")
     
@@ -113,6 +200,33 @@ class MeshGenServerModel:
     
     def destroy(self):
         self.result_observation_termination_event.set()
+        self.remesh_executor.shutdown(wait=False)
+    
+    def is_pending(
+        self,
+        task_type: str,
+        project_id: uuid.UUID
+    ) -> bool:
+        return project_id in self.pending_tasks[task_type]
+    
+    def queue_report(self) -> Dict[str, Dict]:
+        report = {}
+        for task_type, lane_queues in self.task_queues.items():
+            depth = lane_queues.depth()
+            admission = lane_queues.admission()
+            report[task_type] = {
+                "pending": len(self.pending_tasks[task_type]),
+                "lanes": {
+                    lane: {
+                        "depth": lane_depth,
+                        **admission[lane],
+                        **self.lane_statistics.summary(task_type, lane)
+                    }
+                    for lane, lane_depth in depth.items()
+                }
+            }
+        
+        return report
     
     # Public (Image)
     ################################################################
@@ -120,23 +234,47 @@ class MeshGenServerModel:
     def request_image_generation(
         self,
         positive_prompt: str,
-        negative_prompt: str = None
+        negative_prompt: str = None,
+        num_variants: int = 1,
+        perspective_mesh: bool = False,
+        resolution: int = None,
+        priority: Priority = Priority.INTERACTIVE,
+        tenant_id: str = None
     ) -> uuid.UUID:
         # Generate image uuid
         project_id = self.generate_identifier()
         
+        # Lane some live image worker consumes
+        priority = self.workers.route("image", priority)
+        
         # Create task data
         task_data = {
             "project_id": str(project_id),
             "positive_prompt": positive_prompt,
-            "negative_prompt": negative_prompt
+            "negative_prompt": negative_prompt,
+            "num_variants": num_variants,
+            "priority": priority.lane,
+            "tenant_id": tenant_id,
+            "submitted_at": time.time()
         }
         
+        # Mesh of the first variant in the same task, no image round trip
+        if perspective_mesh:
+            task_data["perspective_mesh"] = True
+            task_data["resolution"] = resolution
+            self.fused_requests[project_id] = {
+                "resolution": resolution,
+                "priority": priority,
+                "tenant_id": tenant_id
+            }
+            self.failed_tasks["pmesh_gen"].pop(project_id, None)
+            self.pending_tasks["pmesh_gen"].add(project_id)
+        
         # Write task data to string
         message = json.dumps(task_data)
         
         # Send message
-        self.sqs_image_gen.send_message(message)
+        self.sqs_image_gen.send_message(message, priority, tenant_id=tenant_id, project_id=project_id)
         
         # Add to pending tasks
         self.pending_tasks["image_gen"].add(project_id)
@@ -169,15 +307,21 @@ class MeshGenServerModel:
     
     def download_image(
         self,
-        project_id: uuid.UUID
+        project_id: uuid.UUID,
+        variant: int = None
     ) -> RequestedResource:
         # Task is not completed
         if project_id in self.pending_tasks["image_gen"]:
             print("Task is not completed")
             return RequestedResource(project_id, ResourceStatus.PENDING)
         
+        # Task failed
+        if project_id in self.failed_tasks["image_gen"]:
+            error = self.failed_tasks["image_gen"][project_id]
+            return RequestedResource(project_id, ResourceStatus.FAILED, error=error)
+        
         # Try download image
-        image_buffer = self.s3_storage.download_file(DataKey.image(str(project_id)))
+        image_buffer = self.s3_storage.download_file(DataKey.image(str(project_id), variant))
         
         status = ResourceStatus.NOT_AVAILABLE if image_buffer is None else ResourceStatus.AVAILABLE
         result = RequestedResource(
@@ -187,40 +331,136 @@ class MeshGenServerModel:
         )
         return result
     
+    def select_variant(
+        self,
+        project_id: uuid.UUID,
+        variant: int
+    ) -> RequestedResource:
+        """
+        Make a generated variant the project image meshes are built from.
+        Refused once meshing started, meshes would not match the image.
+        """
+        if (
+            project_id in self.pending_tasks["pmesh_gen"]
+            or project_id in self.pending_tasks["omesh_gen"]
+            or self.s3_storage.file_exists(DataKey.depth(str(project_id)))
+            or self.s3_storage.file_exists(DataKey.mesh(str(project_id), perspective=True))
+            or self.s3_storage.file_exists(DataKey.mesh(str(project_id), perspective=False))
+        ):
+            raise ValueError("Project is already meshed")
+        
+        result = self.download_image(project_id, variant)
+        if result.status != ResourceStatus.AVAILABLE:
+            return result
+        
+        uploaded = self.s3_storage.upload_file(
+            DataKey.image(str(project_id)),
+            io.BytesIO(result.data.getvalue())
+        )
+        if not uploaded:
+            raise RuntimeError("Failed to upload image")
+        return result
+    
     # Public (Mesh)
     ################################################################
     
+    def remesh(
+        self,
+        project_id: uuid.UUID,
+        resolution: int
+    ):
+        """
+        Perspective meshes at resolution from the stored depth map, no GPU involved.
+        """
+        try:
+            image_buffer = self.s3_storage.download_file(DataKey.image(str(project_id)))
+            depth_buffer = self.s3_storage.download_file(DataKey.depth(str(project_id)))
+            if image_buffer is None or depth_buffer is None:
+                raise RuntimeError("Failed to download image or depth")
+            
+            image = np.array(utils.open_image(image_buffer, mode="RGB"))
+            depth_map = artifacts.depth_from_png(depth_buffer)
+            
+            textured_mesh = meshing.perspective_mesh(image, depth_map, resolution)
+            for textured, mesh in [(True, textured_mesh), (False, textured_mesh.without_texture())]:
+                uploaded = self.s3_storage.upload_file(
+                    DataKey.mesh(str(project_id), perspective=True, textured=textured, resolution=resolution),
+                    artifacts.mesh_to_zip(mesh)
+                )
+                if not uploaded:
+                    raise RuntimeError("Failed to upload mesh")
+        
+        except Exception as e:
+            print(f"Failed to re-mesh {project_id}: {e}")
+            self.failed_tasks["pmesh_gen"][project_id] = {
+                "class": type(e).__name__,
+                "kind": "permanent",
+                "message": str(e),
+                "attempts": 1
+            }
+        
+        finally:
+            self.pending_tasks["pmesh_gen"].discard(project_id)
+    
     def request_mesh_generation(
         self,
         project_id: uuid.UUID,
         perspective: bool,
+        resolution: int = None,
+        priority: Priority = Priority.INTERACTIVE,
+        tenant_id: str = None
     ):
         # Validate image is uploaded to S3
         assert self.s3_storage.file_exists(DataKey.image(str(project_id))), "Image not found!"
         
+        # Resolution only applies to perspective meshes
+        if not perspective:
+            resolution = None
+        
         if self.s3_storage.file_exists(
-            DataKey.mesh(str(project_id), perspective=perspective)
+            DataKey.mesh(str(project_id), perspective=perspective, resolution=resolution)
         ):
             print("Mesh already exists")
             return
         
+        # Resubmission clears a previous failure
+        task_type = "pmesh_gen" if perspective else "omesh_gen"
+        self.failed_tasks[task_type].pop(project_id, None)
+        
+        # Stored depth, re-mesh here instead of queueing inference
+        if resolution is not None and self.s3_storage.file_exists(DataKey.depth(str(project_id))):
+            self.pending_tasks["pmesh_gen"].add(project_id)
+            self.remesh_executor.submit(self.remesh, project_id, resolution)
+            return
+        
+        # Lane some live worker of the role consumes
+        priority = self.workers.route("perspective" if perspective else "object", priority)
+        
         # Create task
-        task_data = { "project_id": str(project_id) }
+        task_data = {
+            "project_id": str(project_id),
+            "resolution": resolution,
+            "priority": priority.lane,
+            "tenant_id": tenant_id,
+            "submitted_at": time.time()
+        }
         message = json.dumps(task_data)
         
         # Task type
         if perspective:
             self.pending_tasks["pmesh_gen"].add(project_id)
-            self.sqs_perspective_gen.send_message(message)
+            self.sqs_perspective_gen.send_message(message, priority, tenant_id=tenant_id, project_id=project_id)
         else:
             self.pending_tasks["omesh_gen"].add(project_id)
-            self.sqs_object_gen.send_message(message)
+            self.sqs_object_gen.send_message(message, priority, tenant_id=tenant_id, project_id=project_id)
     
     def download_mesh_zip(
         self,
         project_id: uuid.UUID,
         perspective: bool = True,
-        textured: bool = True
+        textured: bool = True,
+        resolution: int = None,
+        lod: int = None
     ) -> RequestedResource:
         # Task is not completed
         if perspective and project_id in self.pending_tasks["pmesh_gen"]:
@@ -230,12 +470,20 @@ class MeshGenServerModel:
         elif project_id in self.pending_tasks["omesh_gen"]:
             print("Task is not completed")
             return RequestedResource(project_id, ResourceStatus.PENDING)
+        
+        # Task failed
+        task_type = "pmesh_gen" if perspective else "omesh_gen"
+        if project_id in self.failed_tasks[task_type]:
+            error = self.failed_tasks[task_type][project_id]
+            return RequestedResource(project_id, ResourceStatus.FAILED, error=error)
 
         # Try download mesh
         file_key = DataKey.mesh(
             str(project_id),
             perspective=perspective,
-            textured=textured
+            textured=textured,
+            resolution=resolution if perspective else None,
+            lod=lod if perspective else None
         )
         mesh_buffer = self.s3_storage.download_file(file_key)
         
@@ -247,4 +495,40 @@ class MeshGenServerModel:
         )
         
         return result
+    
+    def download_pointcloud(
+        self,
+        project_id: uuid.UUID,
+        max_points: int = 1 << 16
+    ) -> RequestedResource:
+        """
+        Binary PLY preview of a perspective project. Projects meshed before
+        point clouds were stored get one built from their depth map here.
+        """
+        if project_id in self.pending_tasks["pmesh_gen"]:
+            return RequestedResource(project_id, ResourceStatus.PENDING)
+        
+        if project_id in self.failed_tasks["pmesh_gen"]:
+            error = self.failed_tasks["pmesh_gen"][project_id]
+            return RequestedResource(project_id, ResourceStatus.FAILED, error=error)
+        
+        ply_buffer = self.s3_storage.download_file(DataKey.pointcloud(str(project_id)))
+        if ply_buffer is None:
+            image_buffer = self.s3_storage.download_file(DataKey.image(str(project_id)))
+            depth_buffer = self.s3_storage.download_file(DataKey.depth(str(project_id)))
+            if image_buffer is None or depth_buffer is None:
+                return RequestedResource(project_id, ResourceStatus.NOT_AVAILABLE)
+            
+            image = np.array(utils.open_image(image_buffer, mode="RGB"))
+            points, colors = meshing.perspective_pointcloud(
+                image,
+                artifacts.depth_from_png(depth_buffer),
+                max_points=max_points
+            )
+            ply_buffer = artifacts.pointcloud_to_ply(points, colors)
+            
+            # Stored for the next request, the upload may close its buffer
+            self.s3_storage.upload_file(DataKey.pointcloud(str(project_id)), io.BytesIO(ply_buffer.getvalue()))
+        
+        return RequestedResource(project_id, ResourceStatus.AVAILABLE, data=ply_buffer)
     
\ No newline at end of file
@@ -0,0 +1,268 @@
+# Base
+import time
+import uuid
+import threading
+from enum import IntEnum
+from collections import deque
+from typing import Dict, Tuple, Union
+
+# Local
+from .queue import SQSHelper, AWSCredentials
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+    SPECULATIVE = 2
+
+    @property
+    def lane(self) -> str:
+        return self.name.lower()
+
+    @staticmethod
+    def parse(value: Union[str, int, "Priority", None]) -> "Priority":
+        if value is None:
+            return Priority.INTERACTIVE
+        if isinstance(value, str):
+            return Priority[value.upper()]
+        return Priority(value)
+
+def lane_queue_name(
+    base_name: str,
+    priority: Priority
+) -> str:
+    """
+    Interactive lane keeps the original queue name, so old messages
+    and workers without lane support keep working.
+    """
+    if priority == Priority.INTERACTIVE:
+        return base_name
+    return f"{base_name}-{priority.lane}"
+
+class LaneQueues:
+    """
+    One SQS queue per priority lane of a single task type.
+
+    Tasks are admitted to SQS per tenant: at most max_admitted tasks of a
+    lane are queued or running at a time, the rest wait here in one backlog
+    per tenant. Freed slots go to the tenants by stride scheduling on
+    their weights, so a tenant submitting hundreds of tasks does not hold
+    up the ones submitted after them. Workers only ever see a short queue
+    and take it in order.
+    """
+    def __init__(
+        self,
+        base_name: str,
+        region: str,
+        credentials: AWSCredentials = None,
+        max_admitted: int = 64,
+        admission_timeout_s: float = 3600,
+        tenant_weights: Dict[str, float] = None
+    ) -> None:
+        self.base_name = base_name
+        self.lanes: Dict[Priority, SQSHelper] = {
+            priority: SQSHelper(
+                lane_queue_name(base_name, priority),
+                region=region,
+                credentials=credentials
+            )
+            for priority in Priority
+        }
+
+        # Tasks in SQS per lane, project_id -> admission time. Tasks whose
+        # result never arrives free their slot after admission_timeout_s
+        self.max_admitted = max_admitted
+        self.admission_timeout_s = admission_timeout_s
+        self.admitted: Dict[Priority, Dict[str, float]] = { p: {} for p in Priority }
+
+        # Backlog: lane -> tenant -> (project_id, message) in submission order
+        self.backlog: Dict[Priority, Dict[str, deque]] = { p: {} for p in Priority }
+        self.tenant_weights = dict(tenant_weights or {})
+        self.tenant_pass: Dict[Priority, Dict[str, float]] = { p: {} for p in Priority }
+        self.tenant_vtime: Dict[Priority, float] = { p: 0.0 for p in Priority }
+        self.lock = threading.Lock()
+
+    # Private
+    ################################################################
+
+    def _next_backlogged(
+        self,
+        priority: Priority
+    ) -> Union[Tuple[str, str, str], None]:
+        # Caller holds the lock, the tenant with the lowest pass goes next
+        tenants = self.backlog[priority]
+        if len(tenants) == 0:
+            return None
+
+        tenant_pass = self.tenant_pass[priority]
+        tenant_id = min(tenants, key=lambda t: (tenant_pass[t], t))
+        self.tenant_vtime[priority] = tenant_pass[tenant_id]
+        tenant_pass[tenant_id] += 1.0 / self.tenant_weights.get(tenant_id, 1.0)
+
+        project_id, message = tenants[tenant_id].popleft()
+        if len(tenants[tenant_id]) == 0:
+            del tenants[tenant_id]
+        return tenant_id, project_id, message
+
+    def _expire(self, priority: Priority):
+        # Caller holds the lock
+        now = time.time()
+        admitted = self.admitted[priority]
+        for project_id in [p for p, t in admitted.items() if now - t > self.admission_timeout_s]:
+            print(f"No result for {project_id} in {self.base_name} after {self.admission_timeout_s:.0f}s, freeing its slot")
+            del admitted[project_id]
+
+    def _admit(self, priority: Priority):
+        while True:
+            with self.lock:
+                self._expire(priority)
+                if len(self.admitted[priority]) >= self.max_admitted:
+                    return
+                selected = self._next_backlogged(priority)
+                if selected is None:
+                    return
+                tenant_id, project_id, message = selected
+                self.admitted[priority][project_id] = time.time()
+
+            try:
+                self.lanes[priority].send_message(message)
+            except Exception as e:
+                # Back to the front of its tenant, admitted again on the next call
+                print(f"Failed to queue {project_id} in {self.base_name}: {e}")
+                with self.lock:
+                    self.admitted[priority].pop(project_id, None)
+                    self.backlog[priority].setdefault(tenant_id, deque()).appendleft((project_id, message))
+                return
+
+    # Public
+    ################################################################
+
+    def send_message(
+        self,
+        message: str,
+        priority: Priority = Priority.INTERACTIVE,
+        tenant_id: str = None,
+        project_id: str = None
+    ):
+        """
+        Queue a task, it reaches SQS once its tenant's turn comes up.
+        """
+        tenant_id = str(tenant_id or "default")
+        project_id = str(project_id or uuid.uuid4())
+        with self.lock:
+            tenants = self.backlog[priority]
+            # Idle tenants do not bank credit while away
+            if tenant_id not in tenants:
+                tenant_pass = self.tenant_pass[priority].get(tenant_id, 0.0)
+                self.tenant_pass[priority][tenant_id] = max(tenant_pass, self.tenant_vtime[priority])
+                tenants[tenant_id] = deque()
+            tenants[tenant_id].append((project_id, message))
+        self._admit(priority)
+
+    def finish(
+        self,
+        project_id: str
+    ):
+        """
+        Result of a task arrived, its slot goes to the next tenant.
+        """
+        project_id = str(project_id)
+        for priority in Priority:
+            with self.lock:
+                found = self.admitted[priority].pop(project_id, None) is not None
+            if found:
+                self._admit(priority)
+
+    def admit(self):
+        """
+        Retry admissions that failed to send, and free timed out slots.
+        """
+        for priority in Priority:
+            self._admit(priority)
+
+    def admission(self) -> Dict[str, Dict[str, int]]:
+        with self.lock:
+            return {
+                priority.lane: {
+                    "admitted": len(self.admitted[priority]),
+                    "backlog": sum(len(tasks) for tasks in self.backlog[priority].values()),
+                    "backlog_tenants": len(self.backlog[priority])
+                }
+                for priority in Priority
+            }
+
+    def depth(self) -> Dict[str, Dict[str, Union[int, str, None]]]:
+        """
+        Depth per lane, a lane whose queue can not be read reports None
+        counts and the error instead of failing the others.
+        """
+        depth = {}
+        for priority, queue in self.lanes.items():
+            try:
+                depth[priority.lane] = queue.get_queue_depth()
+            except Exception as e:
+                print(f"Failed to get depth of {queue.name}: {e}")
+                depth[priority.lane] = { "visible": None, "in_flight": None, "error": str(e) }
+        return depth
+
+class LaneStatistics:
+    """
+    Rolling wait (submit -> dequeue) and turnaround (submit -> result)
+    times per task type and lane.
+    """
+    def __init__(
+        self,
+        window: int = 1000
+    ) -> None:
+        self.window = window
+        self.wait_s: Dict[str, Dict[str, deque]] = {}
+        self.turnaround_s: Dict[str, Dict[str, deque]] = {}
+        self.lock = threading.Lock()
+
+    def _samples(
+        self,
+        table: Dict[str, Dict[str, deque]],
+        task_type: str,
+        lane: str
+    ) -> deque:
+        lanes = table.setdefault(task_type, {})
+        return lanes.setdefault(lane, deque(maxlen=self.window))
+
+    def record(
+        self,
+        task_type: str,
+        lane: str,
+        wait_s: float = None,
+        submitted_at: float = None
+    ):
+        with self.lock:
+            if wait_s is not None:
+                self._samples(self.wait_s, task_type, lane).append(float(wait_s))
+            if submitted_at is not None:
+                turnaround = time.time() - float(submitted_at)
+                self._samples(self.turnaround_s, task_type, lane).append(turnaround)
+
+    @staticmethod
+    def _summary(samples: deque) -> Dict[str, float]:
+        if len(samples) == 0:
+            return { "count": 0, "mean_s": None, "p95_s": None }
+
+        ordered = sorted(samples)
+        p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+        return {
+            "count": len(ordered),
+            "mean_s": sum(ordered) / len(ordered),
+            "p95_s": ordered[p95_index]
+        }
+
+    def summary(
+        self,
+        task_type: str,
+        lane: str
+    ) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            wait = self.wait_s.get(task_type, {}).get(lane, deque())
+            turnaround = self.turnaround_s.get(task_type, {}).get(lane, deque())
+            return {
+                "wait": self._summary(wait),
+                "turnaround": self._summary(turnaround)
+            }
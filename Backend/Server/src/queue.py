@@ -1,7 +1,7 @@
 # Base
 import uuid
 import json
-from typing import Tuple, List, Union
+from typing import Tuple, List, Union, Dict
 from pathlib import Path
 
 # AWS
@@ -15,10 +15,12 @@ class QueueMessage:
     def __init__(
         self,
         body: str,
-        receipt_handle: str
+        receipt_handle: str,
+        receive_count: int = 1
     ) -> None:
         self.body = body
         self.receipt_handle = receipt_handle
+        self.receive_count = receive_count
     
     def body_json(self):
         return json.loads(self.body)
@@ -81,6 +83,7 @@ class SQSHelper:
             QueueUrl=self.name,
             MaxNumberOfMessages=max_messages,
             MessageAttributeNames=['All'],
+            AttributeNames=['ApproximateReceiveCount'],
             WaitTimeSeconds=20
         )
         
@@ -89,7 +92,8 @@ class SQSHelper:
         for msg in response.get("Messages", []):
             msg_entity = QueueMessage(
                 body=msg["Body"],
-                receipt_handle=msg["ReceiptHandle"]
+                receipt_handle=msg["ReceiptHandle"],
+                receive_count=int(msg.get("Attributes", {}).get("ApproximateReceiveCount", 1))
             )
             messages.append(msg_entity)
         
@@ -104,4 +108,32 @@ class SQSHelper:
             QueueUrl=self.name,
             ReceiptHandle=receipt_handle
         )
-        return response
\ No newline at end of file
+        return response
+
+    def change_message_visibility(
+        self,
+        receipt_handle: str,
+        timeout: int
+    ):
+        sqs = self._init_client()
+        response = sqs.change_message_visibility(
+            QueueUrl=self.name,
+            ReceiptHandle=receipt_handle,
+            VisibilityTimeout=timeout
+        )
+        return response
+
+    def get_queue_depth(self) -> Dict[str, int]:
+        sqs = self._init_client()
+        response = sqs.get_queue_attributes(
+            QueueUrl=self.name,
+            AttributeNames=[
+                "ApproximateNumberOfMessages",
+                "ApproximateNumberOfMessagesNotVisible"
+            ]
+        )
+        attributes = response.get("Attributes", {})
+        return {
+            "visible": int(attributes.get("ApproximateNumberOfMessages", 0)),
+            "in_flight": int(attributes.get("ApproximateNumberOfMessagesNotVisible", 0))
+        }
\ No newline at end of file
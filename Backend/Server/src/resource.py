@@ -7,14 +7,17 @@ class ResourceStatus(IntEnum):
     PENDING = 0
     AVAILABLE = 1
     NOT_AVAILABLE = 2
+    FAILED = 3
 
 class RequestedResource:
     def __init__(
         self,
         project_id: uuid.UUID,
         status: ResourceStatus = ResourceStatus.PENDING,
-        data: io.BytesIO = None
+        data: io.BytesIO = None,
+        error: dict = None
     ) -> None:
         self.id = project_id
         self.status = status
-        self.data = data
\ No newline at end of file
+        self.data = data
+        self.error = error
\ No newline at end of file
@@ -1,12 +1,25 @@
-from pydantic import BaseModel, UUID4
-from typing import Optional
+from pydantic import BaseModel, Field, UUID4
+from typing import Optional, Literal
+
+Lane = Literal["interactive", "batch", "speculative"]
 
 class ImageGenerationRequest(BaseModel):
     prompt: str
     negative_prompt: Optional[str] = None
+    num_variants: int = Field(1, ge=1, le=8)
+    perspective_mesh: bool = False  # mesh the first variant in the same task
+    resolution: Optional[int] = Field(None, ge=16, le=2048)
+    priority: Lane = "interactive"
+    tenant_id: Optional[str] = None
+
+class ImageSelectionRequest(BaseModel):
+    variant: int = Field(..., ge=0)
 
 class MeshGenerationRequest(BaseModel):
     project_id: UUID4
     perspective: bool   # perspective or object
     textured: bool      # textured or non-textured
-    #meshing: bool      # pc or mesh
\ No newline at end of file
+    #meshing: bool      # pc or mesh
+    resolution: Optional[int] = Field(None, ge=16, le=2048)  # mesh grid, worker default if unset
+    priority: Lane = "interactive"
+    tenant_id: Optional[str] = None
\ No newline at end of file
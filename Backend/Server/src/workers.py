@@ -0,0 +1,84 @@
+# Base
+import time
+import threading
+from typing import Dict, List
+
+# Local
+from .priority import Priority
+
+# Role -> task type it serves
+ROLES = {
+    "image": "image_gen",
+    "perspective": "pmesh_gen",
+    "object": "omesh_gen"
+}
+
+class WorkerRegistry:
+    """
+    Workers as advertised in their "worker_status" messages, live until
+    expiry_s after the last one.
+    """
+    def __init__(self, expiry_s: float = 90) -> None:
+        self.expiry_s = expiry_s
+        self.workers: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def update(self, status: dict):
+        with self.lock:
+            self.workers[status["worker_id"]] = { **status, "seen_at": time.time() }
+
+    def live(self) -> List[dict]:
+        now = time.time()
+        with self.lock:
+            # Forget workers that stopped advertising
+            for worker_id in [w for w, s in self.workers.items() if now - s["seen_at"] > self.expiry_s]:
+                del self.workers[worker_id]
+            return list(self.workers.values())
+
+    def route(
+        self,
+        role: str,
+        priority: Priority
+    ) -> Priority:
+        """
+        Lane to queue a task on so a live worker of role consumes it.
+
+        Keeps the requested lane when some worker takes it, or when no
+        worker of the role is live (one may be starting). Otherwise the
+        closest lane a worker takes, e.g. interactive on a batch-only fleet.
+        """
+        lanes = set()
+        for status in self.live():
+            if role in status.get("roles", []):
+                lanes.update(status.get("lanes") or [p.lane for p in Priority])
+
+        if len(lanes) == 0 or priority.lane in lanes:
+            return priority
+        return min(
+            (p for p in Priority if p.lane in lanes),
+            key=lambda p: abs(int(p) - int(priority))
+        )
+
+    def report(self) -> dict:
+        workers = self.live()
+
+        roles = {}
+        for role in ROLES:
+            serving = [w for w in workers if role in w.get("roles", [])]
+            roles[role] = {
+                "workers": len(serving),
+                "completed": sum(w.get("throughput", {}).get(role, {}).get("completed", 0) for w in serving),
+                "per_min": sum((w.get("throughput", {}).get(role, {}).get("per_min", 0.0) for w in serving), 0.0)
+            }
+
+        # Duplicate execution across the fleet
+        duplicates = {}
+        for worker in workers:
+            for name, count in worker.get("counters", {}).items():
+                duplicates[name] = duplicates.get(name, 0) + count
+
+        return {
+            "roles": roles,
+            "duplicates": duplicates,
+            "workers": workers
+        }
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import the server modules as server.py does, from the server directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
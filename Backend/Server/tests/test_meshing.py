@@ -0,0 +1,29 @@
+# Third-party
+import numpy as np
+import pytest
+
+# Local
+from src.meshing import resize_linear
+
+# WorkerA's dependency, the server only has to match it
+cv2 = pytest.importorskip("cv2")
+
+@pytest.mark.parametrize("source, target", [
+    ((518, 518), (256, 256)),
+    ((518, 518), (1024, 1024)),
+    ((37, 61), (200, 15)),
+    ((64, 64), (64, 64)),
+    ((1, 9), (4, 4)),
+    ((300, 200), (7, 3))
+])
+def test_resize_linear_matches_cv2(source: tuple, target: tuple):
+    rng = np.random.default_rng(sum(source + target))
+    depth_map = (rng.random(source) * 100).astype(np.float32)
+    width, height = target[1], target[0]
+
+    resized = resize_linear(depth_map, width, height)
+    expected = cv2.resize(depth_map, (width, height), interpolation=cv2.INTER_LINEAR)
+
+    assert resized.shape == expected.shape
+    # No antialiasing when downscaling, only float rounding differs
+    np.testing.assert_allclose(resized, expected, rtol=0, atol=1e-3)
@@ -0,0 +1,86 @@
+# Base
+import json
+from typing import List
+
+# Local
+from src.priority import Priority, LaneQueues
+
+class FakeLane:
+    """
+    In-memory stand-in for the SQS queue of one lane.
+    """
+    def __init__(self) -> None:
+        self.sent: List[str] = []
+        self.fail = False
+
+    def send_message(self, message: str):
+        if self.fail:
+            raise ConnectionError("SQS unreachable")
+        self.sent.append(json.loads(message)["project_id"])
+
+def make_queues(**kwargs) -> LaneQueues:
+    queues = LaneQueues("test-queue", region="eu-central-1", **kwargs)
+    queues.lanes = { priority: FakeLane() for priority in Priority }
+    return queues
+
+def submit(queues: LaneQueues, project_id: str, tenant_id: str, priority: Priority = Priority.BATCH):
+    message = json.dumps({ "project_id": project_id, "tenant_id": tenant_id })
+    queues.send_message(message, priority, tenant_id=tenant_id, project_id=project_id)
+
+def test_large_backlog_does_not_hold_up_later_tenants():
+    queues = make_queues(max_admitted=2)
+    lane = queues.lanes[Priority.BATCH]
+    for i in range(50):
+        submit(queues, f"a{i}", "tenant-a")
+    submit(queues, "b0", "tenant-b")
+    submit(queues, "b1", "tenant-b")
+
+    # Only max_admitted tasks reach SQS, the rest wait per tenant
+    assert lane.sent == ["a0", "a1"]
+    assert queues.admission()["batch"] == { "admitted": 2, "backlog": 50, "backlog_tenants": 2 }
+
+    # Freed slots alternate between the tenants
+    for project_id in ["a0", "a1", "b0", "a2"]:
+        queues.finish(project_id)
+    assert lane.sent == ["a0", "a1", "b0", "a2", "b1", "a3"]
+
+def test_tenant_weights_share_slots():
+    queues = make_queues(max_admitted=1, tenant_weights={ "tenant-a": 3.0 })
+    lane = queues.lanes[Priority.BATCH]
+    for i in range(20):
+        submit(queues, f"a{i}", "tenant-a")
+        submit(queues, f"b{i}", "tenant-b")
+
+    for _ in range(12):
+        queues.finish(lane.sent[-1])
+
+    # 3:1 once both tenants are backlogged
+    tenants = [project_id[0] for project_id in lane.sent[1:]]
+    assert tenants.count("a") == 3 * tenants.count("b")
+
+def test_lanes_are_admitted_separately():
+    queues = make_queues(max_admitted=1)
+    submit(queues, "batch", "tenant-a", Priority.BATCH)
+    submit(queues, "interactive", "tenant-a", Priority.INTERACTIVE)
+
+    assert queues.lanes[Priority.BATCH].sent == ["batch"]
+    assert queues.lanes[Priority.INTERACTIVE].sent == ["interactive"]
+
+def test_failed_send_is_admitted_later():
+    queues = make_queues(max_admitted=4)
+    lane = queues.lanes[Priority.BATCH]
+    lane.fail = True
+    submit(queues, "a0", "tenant-a")
+    assert queues.admission()["batch"]["backlog"] == 1
+
+    lane.fail = False
+    queues.admit()
+    assert lane.sent == ["a0"]
+    assert queues.admission()["batch"] == { "admitted": 1, "backlog": 0, "backlog_tenants": 0 }
+
+def test_lost_results_free_their_slot():
+    queues = make_queues(max_admitted=1, admission_timeout_s=0)
+    lane = queues.lanes[Priority.BATCH]
+    submit(queues, "a0", "tenant-a")
+    submit(queues, "a1", "tenant-a")
+    assert lane.sent == ["a0", "a1"]
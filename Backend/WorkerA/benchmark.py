@@ -0,0 +1,831 @@
+"""
+Benchmarks of WorkerA's processing stages.
+
+Usage:
+    python benchmark.py meshing --resolutions 128 256 512 1024 2048
+    python benchmark.py artifacts --resolutions 256 512 1024
+    python benchmark.py lod --resolutions 256 512 1024 --tolerances 0.001 0.005 0.02
+    python benchmark.py diffusion --device cpu --batch-sizes 1 2 4 8
+    python benchmark.py prompts --device cpu --num-prompts 256
+    python benchmark.py residency --budgets 0 3 2 --memory-modes attention_slicing vae_tiling
+    python benchmark.py depth --encoder vits --device cpu --batch-sizes 1 2 4 8
+    python benchmark.py onnx --encoders vits vitb --images samples/*.png
+    python benchmark.py accel --encoder vits --device cuda
+    python benchmark.py tiled --encoder vits --device cuda --sizes 1024 2048 4096
+    python benchmark.py polling --wait-time 2 --arrival-rate 2 --num-tasks 40
+    python benchmark.py postprocess --resolution 512 --image-size 768 --jobs 16 --processes 0 2 4
+"""
+import io
+import time
+import zipfile
+import argparse
+import tempfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src import artifacts
+from src.depth import meshing
+
+# Helpers
+################################################################
+
+def timed(fn, *args, repeat: int = 3, **kwargs):
+    """
+    Best wall time of repeat runs and the last result.
+    """
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def synthetic_depth(
+    resolution: int,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Smooth depth map with a few blobs on a flat background, values in 0..255.
+    """
+    rng = np.random.default_rng(seed)
+    ys, xs = np.mgrid[0:resolution, 0:resolution] / resolution
+    depth = np.full((resolution, resolution), 2.0, dtype=np.float32)
+    for _ in range(6):
+        cy, cx = rng.uniform(0.2, 0.8, 2)
+        radius = rng.uniform(0.05, 0.25)
+        height = rng.uniform(40, 250)
+        depth += height * np.exp(-((ys - cy) ** 2 + (xs - cx) ** 2) / (2 * radius ** 2))
+    return depth.astype(np.float32)
+
+# Meshing
+################################################################
+
+def reference_triangles(grid: np.ndarray) -> np.ndarray:
+    """
+    Per-pixel triangulation loop the vectorized engine replaced.
+    """
+    t = []
+    h, w = grid.shape[:2]
+    for y in range(h - 1):
+        prev_block = False
+        for x in range(w):
+            if grid[y, x] == -1:
+                prev_block = False
+                continue
+
+            bl = x > 0 and grid[y + 1, x - 1] != -1
+            b = grid[y + 1, x] != -1
+            br = x < w - 1 and grid[y + 1, x + 1] != -1
+            r = x < w - 1 and grid[y, x + 1] != -1
+
+            if bl and b and not prev_block:
+                t.append([grid[y, x], grid[y + 1, x - 1], grid[y + 1, x]])
+
+            prev_block = False
+            if b and br:
+                t.append([grid[y, x], grid[y + 1, x], grid[y + 1, x + 1]])
+                prev_block = True
+            if r and br:
+                t.append([grid[y, x], grid[y + 1, x + 1], grid[y, x + 1]])
+                prev_block = True
+            if r and b and not prev_block:
+                t.append([grid[y, x], grid[y + 1, x], grid[y, x + 1]])
+                prev_block = True
+
+    return np.array(t, dtype=np.int32).reshape(-1, 3)
+
+def bench_meshing(args):
+    print(f"{'res':>6} {'verts':>10} {'tris':>10} {'grid ms':>9} {'arrays ms':>10} {'o3d ms':>9} {'ref ms':>9} {'match':>6}")
+
+    for resolution in args.resolutions:
+        depth = synthetic_depth(resolution)
+        image = np.zeros((resolution, resolution, 3), dtype=np.uint8)
+        mask = depth > 5
+
+        t_grid, (grid, v_num) = timed(meshing.create_pixel_vertice_mapping, mask, repeat=args.repeat)
+        t_arrays, (v, t, uv) = timed(meshing.create_mesh_arrays, depth, grid, repeat=args.repeat)
+        t_o3d, _ = timed(meshing.create_mesh, image, depth, grid, v_num, repeat=args.repeat)
+
+        # The loop is too slow past a few hundred pixels
+        t_ref, match = float("nan"), "-"
+        if resolution <= args.reference_max:
+            t_ref, t_expected = timed(reference_triangles, grid, repeat=1)
+            match = "yes" if np.array_equal(t, t_expected) else "NO"
+
+        print(
+            f"{resolution:>6} {v_num:>10} {t.shape[0]:>10} {t_grid * 1e3:>9.1f} "
+            f"{t_arrays * 1e3:>10.1f} {t_o3d * 1e3:>9.1f} {t_ref * 1e3:>9.1f} {match:>6}"
+        )
+
+def bench_lod(args):
+    from src.depth import quadtree
+
+    print(f"{'res':>6} {'tol':>7} {'tris':>10} {'verts':>9} {'x fewer':>8} {'zip kB':>9} {'x smaller':>9} {'max err':>8} {'rms err':>8} {'ms':>7}")
+
+    for resolution in args.resolutions:
+        depth = synthetic_depth(resolution)
+        mask = depth > 5
+        depth = depth / -200
+        grid, v_num = meshing.create_pixel_vertice_mapping(mask)
+        vertices, triangles, uvs = meshing.create_mesh_arrays(depth, grid)
+        full_kb = artifacts.mesh_to_zip(artifacts.MeshData(vertices, triangles)).getbuffer().nbytes / 1e3
+        print(f"{resolution:>6} {'grid':>7} {triangles.shape[0]:>10} {v_num:>9} {1:>7.1f}x {full_kb:>9.1f} {1:>8.1f}x {0:>8.2%} {0:>8.2%} {'-':>7}")
+
+        # Every level from the same block errors
+        t_build, triangulator = timed(quadtree.QuadtreeTriangulator, depth, mask, grid, repeat=args.repeat)
+        print(f"{'':>6} {'build':>7} {'':>10} {'':>9} {'':>8} {'':>9} {'':>9} {'':>8} {'':>8} {t_build * 1e3:>7.1f}")
+        for tolerance in args.tolerances:
+            t_lod, (lod_triangles, stats) = timed(triangulator.triangulate, tolerance, repeat=args.repeat)
+            used, lod_triangles = quadtree.compact(lod_triangles, v_num)
+            lod_kb = artifacts.mesh_to_zip(artifacts.MeshData(vertices[used], lod_triangles)).getbuffer().nbytes / 1e3
+            print(
+                f"{'':>6} {tolerance:>7g} {lod_triangles.shape[0]:>10} {used.shape[0]:>9} "
+                f"{triangles.shape[0] / max(lod_triangles.shape[0], 1):>7.1f}x {lod_kb:>9.1f} {full_kb / lod_kb:>8.1f}x "
+                f"{stats['max_error']:>8.2%} {stats['rms_error']:>8.2%} {t_lod * 1e3:>7.1f}"
+            )
+
+# Artifacts
+################################################################
+
+def legacy_mesh_to_zip(
+    mesh: artifacts.MeshData,
+    temp_dir: Path
+) -> io.BytesIO:
+    """
+    Previous path: Open3D writes OBJ/MTL/PNG to a temp dir, zip reads them back.
+    """
+    import open3d as o3d
+
+    o3d_mesh = o3d.geometry.TriangleMesh(
+        o3d.utility.Vector3dVector(mesh.vertices),
+        o3d.utility.Vector3iVector(mesh.triangles)
+    )
+    if mesh.textured:
+        o3d_mesh.textures = [o3d.geometry.Image(mesh.texture.copy()).flip_vertical()]
+        o3d_mesh.triangle_material_ids = o3d.utility.IntVector(np.zeros(mesh.triangles.shape[0], dtype=np.int32))
+        o3d_mesh.triangle_uvs = o3d.utility.Vector2dVector(mesh.uvs[mesh.uv_triangles.reshape(-1)])
+
+    o3d.io.write_triangle_mesh(str(temp_dir / "mesh.obj"), o3d_mesh)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for file_p in list(temp_dir.glob("*")):
+            zip_file.write(file_p, file_p.name)
+            file_p.unlink()
+    buffer.seek(0)
+    return buffer
+
+def bench_artifacts(args):
+    print(f"{'res':>6} {'textured':>9} {'legacy ms':>10} {'memory ms':>10} {'legacy kB':>10} {'memory kB':>10} {f'x{args.threads} ms':>10}")
+
+    for resolution in args.resolutions:
+        depth = synthetic_depth(resolution)
+        grid, _ = meshing.create_pixel_vertice_mapping(depth > 5)
+        vertices, triangles, uvs = meshing.create_mesh_arrays(depth / -200, grid)
+        texture = np.random.default_rng(0).integers(0, 255, (512, 512, 3), dtype=np.uint8)
+        textured = artifacts.MeshData(vertices, triangles, uvs=uvs, texture=texture)
+
+        for mesh in [textured, textured.without_texture()]:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                t_legacy, legacy_zip = timed(legacy_mesh_to_zip, mesh, Path(temp_dir), repeat=args.repeat)
+            t_memory, memory_zip = timed(artifacts.mesh_to_zip, mesh, repeat=args.repeat)
+
+            # Concurrent packaging, every zip must come out complete
+            with ThreadPoolExecutor(args.threads) as pool:
+                start = time.perf_counter()
+                zips = list(pool.map(lambda _: artifacts.mesh_to_zip(mesh), range(args.threads)))
+                t_concurrent = time.perf_counter() - start
+            names = sorted(artifacts.mesh_files(mesh).keys())
+            assert all(sorted(zipfile.ZipFile(z).namelist()) == names for z in zips)
+
+            print(
+                f"{resolution:>6} {str(mesh.textured):>9} {t_legacy * 1e3:>10.1f} {t_memory * 1e3:>10.1f} "
+                f"{legacy_zip.getbuffer().nbytes / 1e3:>10.1f} {memory_zip.getbuffer().nbytes / 1e3:>10.1f} "
+                f"{t_concurrent * 1e3:>10.1f}"
+            )
+
+# Diffusion
+################################################################
+
+def simulate_batching(
+    service_s: dict,
+    batch_size: int,
+    deadline_s: float,
+    arrival_rate: float,
+    num_tasks: int = 2000,
+    seed: int = 0
+) -> tuple:
+    """
+    Single worker, Poisson arrivals. A batch starts with the first waiting task
+    and closes when full or deadline_s after it started collecting.
+
+    Returns:
+        throughput (tasks/s), mean latency (s)
+    """
+    rng = np.random.default_rng(seed)
+    arrivals = np.cumsum(rng.exponential(1.0 / arrival_rate, num_tasks))
+
+    now, i, latencies = 0.0, 0, []
+    while i < num_tasks:
+        start = max(now, arrivals[i])
+        close = start + deadline_s
+        j = i + 1
+        while j < num_tasks and j - i < batch_size and arrivals[j] <= close:
+            j += 1
+
+        # Full batches leave at once, partial ones wait for the deadline
+        launch = max(start, arrivals[j - 1]) if j - i == batch_size else close
+        now = launch + service_s[j - i]
+        latencies.extend(now - arrivals[i:j])
+        i = j
+
+    return num_tasks / now, float(np.mean(latencies))
+
+def bench_diffusion(args):
+    import torch
+    from src import diffusion
+
+    dtype = torch.float16 if args.device == "cuda" else torch.float32
+    pipe = diffusion.load(args.model, device=args.device, torch_dtype=dtype)
+    pipe.set_progress_bar_config(disable=True)
+
+    # Measured service time of one pipeline call per batch size
+    service_s = {}
+    print(f"{'batch':>6} {'call s':>8} {'img/s':>8}")
+    for batch_size in range(1, max(args.batch_sizes) + 1):
+        prompts = [f"a photo of object {i}" for i in range(batch_size)]
+        generate = lambda: diffusion.generate_batch(
+            pipe,
+            prompts,
+            seeds=list(range(batch_size)),
+            num_inference_steps=args.steps,
+            height=args.size,
+            width=args.size
+        )
+        generate()
+        service_s[batch_size], _ = timed(generate, repeat=args.repeat)
+        if batch_size in args.batch_sizes:
+            print(f"{batch_size:>6} {service_s[batch_size]:>8.3f} {batch_size / service_s[batch_size]:>8.2f}")
+
+    # Worker throughput under load for each batch size and deadline
+    print()
+    print(f"arrivals: {args.arrival_rate} tasks/s")
+    print(f"{'batch':>6} {'deadline':>9} {'tasks/s':>8} {'latency s':>10}")
+    for batch_size in args.batch_sizes:
+        for deadline_s in args.deadlines:
+            throughput, latency = simulate_batching(service_s, batch_size, deadline_s, args.arrival_rate)
+            print(f"{batch_size:>6} {deadline_s:>9.2f} {throughput:>8.2f} {latency:>10.3f}")
+
+def bench_prompts(args):
+    import torch
+    from src import diffusion
+
+    dtype = torch.float16 if args.device == "cuda" else torch.float32
+    pipe = diffusion.load(args.model, device=args.device, torch_dtype=dtype)
+
+    # Templated traffic: few subjects and styles, one shared negative prompt
+    rng = np.random.default_rng(0)
+    subjects = [f"object {i}" for i in range(args.num_subjects)]
+    styles = ["a photo of", "a 3d render of", "a sketch of", "a low poly model of"]
+    prompts = [f"{rng.choice(styles)} {rng.choice(subjects)}" for _ in range(args.num_prompts)]
+    negative = ["blurry, low quality"] * args.batch_size
+
+    def encode_uncached(batch):
+        return pipe.encode_prompt(batch, pipe.device, 1, True, negative_prompt=negative[:len(batch)])
+
+    cache = diffusion.PromptEmbeddingCache(max_entries=args.max_entries)
+    def encode_cached(batch):
+        return cache.embed(pipe, batch), cache.embed(pipe, negative[:len(batch)])
+
+    batches = [prompts[i:i + args.batch_size] for i in range(0, len(prompts), args.batch_size)]
+    print(f"{'encoder':>9} {'ms/batch':>9} {'hit rate':>9} {'entries':>8} {'MB':>6}")
+    for name, encode in [("uncached", encode_uncached), ("cached", encode_cached)]:
+        start = time.perf_counter()
+        for batch in batches:
+            encode(batch)
+        if args.device == "cuda":
+            torch.cuda.synchronize()
+        t_batch = (time.perf_counter() - start) / len(batches)
+
+        stats = cache.stats() if name == "cached" else { "hit_rate": 0.0, "entries": 0, "mb": 0.0 }
+        print(f"{name:>9} {1000 * t_batch:>9.2f} {stats['hit_rate']:>9.0%} {stats['entries']:>8} {stats['mb']:>6.1f}")
+
+def bench_residency(args):
+    import torch
+    from src import depth, diffusion
+    from src.residency import ResidencyManager
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, (512, 512, 3), dtype=np.uint8)
+
+    print(f"{'budget GB':>10} {'modes':>28} {'image s':>8} {'depth s':>8} {'peak GB':>8} {'loads':>6}")
+    for budget_gb in args.budgets:
+        # 0 keeps everything resident, as without a budget
+        residency = ResidencyManager("cuda", budget_gb=budget_gb or None)
+        pipe = residency.register_pipeline("sd", diffusion.load(
+            args.model,
+            device=residency.load_device(),
+            memory_modes=args.memory_modes
+        ))
+        mde = depth.DepthAnythingFacade(encoder=args.encoder, device="cuda")
+        residency.register("depth", mde.model)
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+
+        # Alternating tasks, every switch may move a model
+        t_image, t_depth = 0.0, 0.0
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            with residency.use("sd.unet", "sd.vae"):
+                diffusion.generate_batch(pipe, ["a chair"], num_inference_steps=args.steps, height=args.size, width=args.size)
+            torch.cuda.synchronize()
+            t_image += time.perf_counter() - start
+
+            start = time.perf_counter()
+            with residency.use("depth"):
+                mde(image)
+            torch.cuda.synchronize()
+            t_depth += time.perf_counter() - start
+
+        loads = sum(stats["loads"] for stats in residency.report().values())
+        modes = "+".join(args.memory_modes) or "-"
+        print(
+            f"{budget_gb or 'none':>10} {modes:>28} {t_image / args.rounds:>8.2f} {t_depth / args.rounds:>8.2f} "
+            f"{torch.cuda.max_memory_allocated() / (1 << 30):>8.2f} {loads:>6}"
+        )
+
+        del pipe, mde, residency
+        torch.cuda.empty_cache()
+
+# Depth
+################################################################
+
+def bench_depth(args):
+    from src import depth
+
+    mde = depth.DepthAnythingFacade(encoder=args.encoder, device=args.device)
+
+    # Mixed upload sizes, a few shapes repeat so buckets fill up
+    rng = np.random.default_rng(0)
+    sizes = [(512, 512), (512, 384), (384, 512), (640, 480)]
+    images = [
+        rng.integers(0, 255, (*sizes[i % len(sizes)], 3), dtype=np.uint8)
+        for i in range(args.num_images)
+    ]
+
+    mde.infer_batch(images[:1])
+    print(f"{'batch':>6} {'total s':>8} {'img/s':>8}")
+    for batch_size in args.batch_sizes:
+        t_total, _ = timed(mde.infer_batch, images, max_batch_size=batch_size, repeat=args.repeat)
+        print(f"{batch_size:>6} {t_total:>8.3f} {len(images) / t_total:>8.2f}")
+
+    print("\nPer image, ms: " + ", ".join(f"{stage} {ms:.2f}" for stage, ms in mde.timing_report().items()))
+
+    # Preprocessing, NumPy/cv2 reference vs on-device tensors
+    import torch
+
+    def preprocess_tensor(image):
+        image_pt = mde.preprocess(image)
+        if args.device == "cuda":
+            torch.cuda.synchronize()
+        return image_pt
+
+    print(f"\n{'size':>10} {'numpy ms':>9} {'tensor ms':>10} {'max diff':>9}")
+    for image in images[:len(sizes)]:
+        t_numpy, reference = timed(mde.preprocess_numpy, image, repeat=args.repeat)
+        t_tensor, image_pt = timed(preprocess_tensor, image, repeat=args.repeat)
+        diff = np.abs(image_pt[0].float().cpu().numpy() - reference).max()
+        size = f"{image.shape[1]}x{image.shape[0]}"
+        print(f"{size:>10} {1000 * t_numpy:>9.2f} {1000 * t_tensor:>10.2f} {diff:>9.4f}")
+
+def benchmark_images(
+    paths: list,
+    count: int
+) -> list:
+    """
+    Images from paths, or synthetic ones shaded by a smooth depth map.
+    """
+    if paths:
+        from PIL import Image
+        return [np.array(Image.open(path).convert("RGB")) for path in paths]
+
+    images = []
+    for i in range(count):
+        shade = synthetic_depth(512, seed=i)
+        shade = (shade / shade.max() * 255).astype(np.uint8)
+        images.append(np.stack([shade, 255 - shade, shade // 2], axis=-1))
+    return images
+
+def bench_onnx(args):
+    from src import depth
+
+    images = benchmark_images(args.images, args.num_images)
+
+    print(f"{'encoder':>8} {'backend':>10} {'s/img':>8} {'speedup':>8} {'rel err':>8} {'mask IoU':>8}")
+    for encoder in args.encoders:
+        reference, t_reference = None, None
+        for backend in depth.BACKENDS:
+            mde = depth.DepthAnythingFacade(
+                encoder=encoder,
+                device="cpu",
+                backend=backend,
+                onnx_dir=args.onnx_dir,
+                num_threads=args.threads
+            )
+            mde(images[0])
+
+            t_total, depths = timed(lambda: [mde(image) for image in images], repeat=args.repeat)
+            t_image = t_total / len(images)
+
+            # Torch on CPU is the reference for accuracy and speed
+            if reference is None:
+                reference, t_reference = depths, t_image
+
+            rel_err = np.mean([
+                np.abs(d - r).mean() / max(np.abs(r).mean(), 1e-6)
+                for d, r in zip(depths, reference)
+            ])
+            # Pixels the mesher keeps (depth > 5)
+            iou = np.mean([
+                np.logical_and(d > 5, r > 5).sum() / max(np.logical_or(d > 5, r > 5).sum(), 1)
+                for d, r in zip(depths, reference)
+            ])
+            print(f"{encoder:>8} {backend:>10} {t_image:>8.3f} {t_reference / t_image:>7.2f}x {rel_err:>8.4f} {iou:>8.4f}")
+
+def bench_accel(args):
+    import torch
+    from src import depth
+    from src.depth import acceleration
+
+    inputs = [acceleration.sample_input(size, args.device) for size in args.sizes]
+
+    print(f"device: {args.device}, encoder: {args.encoder}")
+    print(f"{'modes':>36} {'ms':>8} {'speedup':>8} {'rel err':>9} {'tol':>7} {'check':>6}")
+
+    t_reference = None
+    for combo in args.combos:
+        modes = [] if combo == "eager" else combo.split("+")
+        if "compile" in modes and not hasattr(torch, "compile"):
+            print(f"{combo:>36} {'torch.compile not available':>40}")
+            continue
+
+        # Fresh fp32 eager model, its outputs are the reference
+        model = depth.DepthAnythingFacade.load_torch(args.encoder).to(args.device).eval()
+        with torch.no_grad():
+            references = [model(x) for x in inputs]
+
+        try:
+            accelerated = acceleration.AcceleratedModel(model, modes, args.device) if modes else model
+            with torch.no_grad():
+                passed, error = acceleration.check_accuracy(accelerated, inputs, references, modes)
+
+                def run():
+                    for x in inputs:
+                        accelerated(x)
+                    if args.device == "cuda":
+                        torch.cuda.synchronize()
+
+                # First calls compile / pick kernels
+                run()
+                t_total, _ = timed(run, repeat=args.repeat)
+        except Exception as e:
+            print(f"{combo:>36} failed: {e}")
+            continue
+
+        t_image = 1000 * t_total / len(inputs)
+        t_reference = t_reference or t_image
+        check = "PASS" if passed else "FAIL"
+        print(
+            f"{combo:>36} {t_image:>8.1f} {t_reference / t_image:>7.2f}x "
+            f"{error:>9.2e} {acceleration.tolerance(modes):>7.0e} {check:>6}"
+        )
+
+def peak_memory_mb(device: str) -> float:
+    """
+    Peak allocated CUDA memory since the last reset, peak process RSS on CPU.
+    """
+    if device == "cuda":
+        import torch
+        return torch.cuda.max_memory_allocated() / 2 ** 20
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def bench_tiled(args):
+    import torch
+    from PIL import Image
+    from src import depth
+    from src.depth import tiling
+
+    mde = depth.DepthAnythingFacade(encoder=args.encoder, device=args.device)
+    mde(np.zeros((518, 518, 3), dtype=np.uint8))
+
+    def measured(fn, *fn_args, **kwargs):
+        if args.device == "cuda":
+            torch.cuda.empty_cache()
+            torch.cuda.reset_peak_memory_stats()
+        t, result = timed(fn, *fn_args, repeat=args.repeat, **kwargs)
+        return t, peak_memory_mb(args.device), result
+
+    @torch.no_grad()
+    def native(image):
+        # One shot at full resolution, memory grows with the pixel count
+        h, w = image.shape[:2]
+        return mde.model(mde.preprocess(image, (h // 14 * 14, w // 14 * 14)))
+
+    print("memory: peak CUDA allocation" if args.device == "cuda" else "memory: peak process RSS, only grows")
+    print(
+        f"{'size':>6} {'tiles':>6} {'518 s':>7} {'518 MB':>8} {'tiled s':>8} {'tiled MB':>9} "
+        f"{'native s':>9} {'native MB':>10} {'vs 518':>7}"
+    )
+    for size in args.sizes:
+        image = np.array(Image.fromarray(benchmark_images([], 1)[0]).resize((size, size)))
+        num_tiles = len(tiling.tile_windows(size, size, args.tile_size, args.overlap))
+
+        t_single, m_single, single = measured(mde, image)
+        t_tiled, m_tiled, tiled = measured(
+            mde.infer_tiled,
+            image,
+            tile_size=args.tile_size,
+            overlap=args.overlap,
+            max_batch_size=args.batch_size
+        )
+
+        t_native, m_native = float("nan"), float("nan")
+        if size <= args.native_max:
+            try:
+                t_native, m_native, _ = measured(native, image)
+            except RuntimeError as e:
+                print(f"native {size} failed: {e}")
+
+        # Agreement with the downscaled pass, tiles add detail on top of it
+        rel_err = np.abs(tiled - single).mean() / max(np.abs(single).mean(), 1e-6)
+        print(
+            f"{size:>6} {num_tiles:>6} {t_single:>7.2f} {m_single:>8.0f} {t_tiled:>8.2f} {m_tiled:>9.0f} "
+            f"{t_native:>9.2f} {m_native:>10.0f} {rel_err:>7.3f}"
+        )
+
+# Main
+################################################################
+
+# Post-processing
+################################################################
+
+def spin_rate(fn) -> tuple:
+    """
+    Runs fn while a Python loop counts in another thread, the work the
+    inference process would get done meanwhile.
+
+    Returns:
+        fn's duration (s), loop iterations per second
+    """
+    import threading
+    stop, counts = threading.Event(), [0]
+
+    def spin():
+        while not stop.is_set():
+            counts[0] += 1
+
+    spinner = threading.Thread(target=spin)
+    spinner.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    spinner.join()
+    return elapsed, counts[0] / elapsed
+
+def bench_postprocess(args):
+    from src import perspective
+    from src.postprocess import PostProcessPool
+
+    image = np.random.default_rng(0).integers(0, 255, (args.image_size, args.image_size, 3), dtype=np.uint8)
+    depth = synthetic_depth(args.image_size)
+
+    print(f"{'processes':>9} {'jobs/s':>8} {'main loop':>10} {'wait ms':>8} {'run ms':>8} {'peak':>5}")
+    for processes in args.processes:
+        pool = PostProcessPool(processes)
+        pool.warmup()
+        # Processes start and import before timing
+        pool.run(perspective.perspective_artifacts, [image, depth], project_id="warmup", resolution=16)
+
+        def run_jobs():
+            with ThreadPoolExecutor(max(processes, 1)) as executor:
+                list(executor.map(
+                    lambda i: pool.run(
+                        perspective.perspective_artifacts,
+                        [image, depth],
+                        project_id=str(i),
+                        resolution=args.resolution
+                    ),
+                    range(args.jobs)
+                ))
+
+        # Main process loop rate relative to an idle one
+        elapsed, rate = spin_rate(run_jobs)
+        _, idle_rate = spin_rate(lambda: time.sleep(1.0))
+        stats = pool.report()
+        pool.shutdown()
+        print(
+            f"{processes:>9} {args.jobs / elapsed:>8.2f} {rate / idle_rate:>10.0%} "
+            f"{stats['wait_ms']:>8.1f} {stats['run_ms']:>8.1f} {stats['peak_pending']:>5}"
+        )
+
+# Polling
+################################################################
+
+class SimulatedQueue:
+    """
+    In-memory stand-in for a FairScheduler, next_batch long polls like SQS.
+    """
+    def __init__(self, wait_time: float) -> None:
+        import queue
+        self.tasks = queue.Queue()
+        self.wait_time = wait_time
+
+    def next_batch(
+        self,
+        max_tasks: int,
+        deadline_s: float
+    ) -> list:
+        import queue
+        try:
+            tasks = [self.tasks.get(timeout=self.wait_time)]
+        except queue.Empty:
+            return []
+        while len(tasks) < max_tasks:
+            try:
+                tasks.append(self.tasks.get(timeout=deadline_s))
+            except queue.Empty:
+                break
+        return tasks
+
+def simulate_arrivals(
+    queues: list,
+    arrival_rate: float,
+    num_tasks: int,
+    seed: int = 0
+):
+    """
+    Poisson arrivals spread over the queues at random, tasks are their arrival times.
+    """
+    rng = np.random.default_rng(seed)
+    for gap, index in zip(rng.exponential(1.0 / arrival_rate, num_tasks), rng.integers(0, len(queues), num_tasks)):
+        time.sleep(gap)
+        queues[index].tasks.put(time.monotonic())
+
+def bench_polling(args):
+    import threading
+    from src.polling import PolledQueue, QueuePoller
+
+    for mode in ["sequential", "concurrent"]:
+        queues = [SimulatedQueue(args.wait_time) for _ in range(2)]
+        feeder = threading.Thread(target=simulate_arrivals, args=(queues, args.arrival_rate, args.num_tasks))
+        feeder.start()
+
+        # Dispatch latency, arrival to handing the task to the pipeline
+        latencies = []
+        if mode == "sequential":
+            # The worker loop before, one long poll after the other
+            while len(latencies) < args.num_tasks:
+                for queue in queues:
+                    tasks = queue.next_batch(max_tasks=args.batch_size, deadline_s=args.deadline)
+                    latencies.extend(time.monotonic() - arrived for arrived in tasks)
+        else:
+            poller = QueuePoller([
+                PolledQueue(str(i), queue, max_tasks=args.batch_size, deadline_s=args.deadline)
+                for i, queue in enumerate(queues)
+            ])
+            poller.start()
+            while len(latencies) < args.num_tasks:
+                polled = poller.next(timeout=1.0)
+                if polled is not None:
+                    latencies.extend(time.monotonic() - arrived for arrived in polled[1])
+            poller.stop()
+        feeder.join()
+
+        latencies = np.array(latencies) * 1000
+        print(
+            f"{mode:>10}: mean {latencies.mean():7.1f} ms, p50 {np.percentile(latencies, 50):7.1f} ms, "
+            f"p95 {np.percentile(latencies, 95):7.1f} ms, max {latencies.max():7.1f} ms"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="WorkerA benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_meshing = subparsers.add_parser("meshing", help="Depth grid triangulation")
+    parser_meshing.add_argument("--resolutions", type=int, nargs="+", default=[128, 256, 512, 1024, 2048])
+    parser_meshing.add_argument("--reference-max", type=int, default=512)
+    parser_meshing.add_argument("--repeat", type=int, default=3)
+    parser_meshing.set_defaults(run=bench_meshing)
+
+    parser_lod = subparsers.add_parser("lod", help="Adaptive LOD meshes, error vs size")
+    parser_lod.add_argument("--resolutions", type=int, nargs="+", default=[256, 512, 1024])
+    parser_lod.add_argument("--tolerances", type=float, nargs="+", default=[0.001, 0.005, 0.02, 0.05])
+    parser_lod.add_argument("--repeat", type=int, default=3)
+    parser_lod.set_defaults(run=bench_lod)
+
+    parser_artifacts = subparsers.add_parser("artifacts", help="Mesh zip packaging, temp dir vs in-memory")
+    parser_artifacts.add_argument("--resolutions", type=int, nargs="+", default=[256, 512, 1024])
+    parser_artifacts.add_argument("--threads", type=int, default=4)
+    parser_artifacts.add_argument("--repeat", type=int, default=3)
+    parser_artifacts.set_defaults(run=bench_artifacts)
+
+    parser_diffusion = subparsers.add_parser("diffusion", help="Batched Stable Diffusion throughput")
+    parser_diffusion.add_argument("--model", default="hf-internal-testing/tiny-stable-diffusion-pipe")
+    parser_diffusion.add_argument("--device", default="cpu")
+    parser_diffusion.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser_diffusion.add_argument("--deadlines", type=float, nargs="+", default=[0.0, 0.25, 0.5, 1.0])
+    parser_diffusion.add_argument("--arrival-rate", type=float, default=4.0)
+    parser_diffusion.add_argument("--steps", type=int, default=4)
+    parser_diffusion.add_argument("--size", type=int, default=64)
+    parser_diffusion.add_argument("--repeat", type=int, default=3)
+    parser_diffusion.set_defaults(run=bench_diffusion)
+
+    parser_prompts = subparsers.add_parser("prompts", help="Text encoding with and without the prompt embedding cache")
+    parser_prompts.add_argument("--model", default="hf-internal-testing/tiny-stable-diffusion-pipe")
+    parser_prompts.add_argument("--device", default="cpu")
+    parser_prompts.add_argument("--num-prompts", type=int, default=256)
+    parser_prompts.add_argument("--num-subjects", type=int, default=16)
+    parser_prompts.add_argument("--batch-size", type=int, default=4)
+    parser_prompts.add_argument("--max-entries", type=int, default=512)
+    parser_prompts.set_defaults(run=bench_prompts)
+
+    parser_residency = subparsers.add_parser("residency", help="SD and depth sharing a GPU under VRAM budgets")
+    parser_residency.add_argument("--model", default="stabilityai/stable-diffusion-2-1")
+    parser_residency.add_argument("--encoder", default="vitl", choices=["vits", "vitb", "vitl"])
+    parser_residency.add_argument("--budgets", type=float, nargs="+", default=[0, 4, 3])
+    parser_residency.add_argument("--memory-modes", nargs="*", default=[], choices=["attention_slicing", "vae_slicing", "vae_tiling"])
+    parser_residency.add_argument("--rounds", type=int, default=4)
+    parser_residency.add_argument("--steps", type=int, default=20)
+    parser_residency.add_argument("--size", type=int, default=512)
+    parser_residency.set_defaults(run=bench_residency)
+
+    parser_depth = subparsers.add_parser("depth", help="Batched depth inference throughput")
+    parser_depth.add_argument("--encoder", default="vits", choices=["vits", "vitb", "vitl"])
+    parser_depth.add_argument("--device", default="cpu")
+    parser_depth.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser_depth.add_argument("--num-images", type=int, default=16)
+    parser_depth.add_argument("--repeat", type=int, default=2)
+    parser_depth.set_defaults(run=bench_depth)
+
+    parser_onnx = subparsers.add_parser("onnx", help="CPU depth backends, accuracy vs latency")
+    parser_onnx.add_argument("--encoders", nargs="+", default=["vits", "vitb"], choices=["vits", "vitb", "vitl"])
+    parser_onnx.add_argument("--images", nargs="*", default=[])
+    parser_onnx.add_argument("--num-images", type=int, default=4)
+    parser_onnx.add_argument("--onnx-dir", default="models/onnx")
+    parser_onnx.add_argument("--threads", type=int, default=None)
+    parser_onnx.add_argument("--repeat", type=int, default=2)
+    parser_onnx.set_defaults(run=bench_onnx)
+
+    parser_accel = subparsers.add_parser("accel", help="Depth acceleration modes, speedup vs fp32 eager accuracy")
+    parser_accel.add_argument("--encoder", default="vits", choices=["vits", "vitb", "vitl"])
+    parser_accel.add_argument("--device", default="cpu")
+    parser_accel.add_argument("--sizes", type=int, nargs="+", default=[518])
+    parser_accel.add_argument("--combos", nargs="+", default=[
+        "eager",
+        "channels_last",
+        "fused_upsampling",
+        "channels_last+fused_upsampling",
+        "fp16",
+        "bf16",
+        "compile",
+        "channels_last+fused_upsampling+bf16",
+        "compile+channels_last+fp16"
+    ])
+    parser_accel.add_argument("--repeat", type=int, default=3)
+    parser_accel.set_defaults(run=bench_accel)
+
+    parser_tiled = subparsers.add_parser("tiled", help="Tiled native-resolution depth, latency and memory vs image size")
+    parser_tiled.add_argument("--encoder", default="vits", choices=["vits", "vitb", "vitl"])
+    parser_tiled.add_argument("--device", default="cpu")
+    parser_tiled.add_argument("--sizes", type=int, nargs="+", default=[518, 1024, 2048, 4096])
+    parser_tiled.add_argument("--tile-size", type=int, default=518)
+    parser_tiled.add_argument("--overlap", type=float, default=0.25)
+    parser_tiled.add_argument("--batch-size", type=int, default=4)
+    parser_tiled.add_argument("--native-max", type=int, default=2048)
+    parser_tiled.add_argument("--repeat", type=int, default=1)
+    parser_tiled.set_defaults(run=bench_tiled)
+
+    parser_polling = subparsers.add_parser("polling", help="Dispatch latency of sequential vs concurrent queue polling")
+    parser_polling.add_argument("--wait-time", type=float, default=2.0)
+    parser_polling.add_argument("--arrival-rate", type=float, default=2.0)
+    parser_polling.add_argument("--num-tasks", type=int, default=40)
+    parser_polling.add_argument("--batch-size", type=int, default=1)
+    parser_polling.add_argument("--deadline", type=float, default=0.2)
+    parser_polling.set_defaults(run=bench_polling)
+
+    parser_postprocess = subparsers.add_parser("postprocess", help="Meshing in post-processing processes vs threads, throughput and main process stall")
+    parser_postprocess.add_argument("--resolution", type=int, default=512)
+    parser_postprocess.add_argument("--image-size", type=int, default=768)
+    parser_postprocess.add_argument("--jobs", type=int, default=16)
+    parser_postprocess.add_argument("--processes", type=int, nargs="+", default=[0, 2, 4])
+    parser_postprocess.set_defaults(run=bench_postprocess)
+
+    args = parser.parse_args()
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,49 @@
-import io
+import argparse
 
 from src.aws.credentials import AWSCredentials
 from src.model import MeshGenServerModel
 
-credentials = AWSCredentials.from_json_file("../credentials.json")
-model = MeshGenServerModel(credentials)
-model.run()
\ No newline at end of file
+# Post-processing processes are spawned and import this module again
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MeshGen worker A (images and perspective meshes)")
+    parser.add_argument("--roles", nargs="+", default=["image", "perspective"], choices=["image", "perspective"])
+    parser.add_argument("--lanes", nargs="+", default=None, choices=["interactive", "batch", "speculative"])
+    parser.add_argument("--image-queue-weight", type=float, default=1.0)
+    parser.add_argument("--mesh-queue-weight", type=float, default=1.0)
+    parser.add_argument("--queue-prefetch", type=int, default=1)
+    parser.add_argument("--device", default="cuda")  # cuda, cuda:N or cpu
+    parser.add_argument("--encoder", default="vitl", choices=["vits", "vitb", "vitl"])
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--acceleration", nargs="*", default=[], choices=["channels_last", "fused_upsampling", "compile", "fp16", "bf16"])
+    parser.add_argument("--tile-above", type=int, default=None)
+    parser.add_argument("--tile-size", type=int, default=518)
+    parser.add_argument("--lod-tolerances", type=float, nargs="*", default=[])
+    parser.add_argument("--postprocess-processes", type=int, default=2)
+    parser.add_argument("--prompt-cache-entries", type=int, default=512)
+    parser.add_argument("--max-variants", type=int, default=8)
+    parser.add_argument("--vram-budget-gb", type=float, default=None)
+    parser.add_argument("--sd-memory-modes", nargs="*", default=[], choices=["attention_slicing", "vae_slicing", "vae_tiling"])
+    args = parser.parse_args()
+
+    credentials = AWSCredentials.from_json_file("../credentials.json")
+    model = MeshGenServerModel(
+        credentials,
+        roles=args.roles,
+        lanes=args.lanes,
+        image_queue_weight=args.image_queue_weight,
+        mesh_queue_weight=args.mesh_queue_weight,
+        queue_prefetch=args.queue_prefetch,
+        mde_device=args.device,
+        mde_encoder=args.encoder,
+        mde_backend=args.backend,
+        mde_acceleration=args.acceleration,
+        mde_tile_above=args.tile_above,
+        mde_tile_size=args.tile_size,
+        mesh_lod_tolerances=args.lod_tolerances,
+        postprocess_processes=args.postprocess_processes,
+        prompt_cache_entries=args.prompt_cache_entries,
+        max_variants=args.max_variants,
+        vram_budget_gb=args.vram_budget_gb,
+        sd_memory_modes=args.sd_memory_modes
+    )
+    model.run()
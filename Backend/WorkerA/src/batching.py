@@ -0,0 +1,95 @@
+# Base
+import time
+import threading
+from queue import Queue, Empty
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence
+
+class DynamicBatcher:
+    """
+    Gathers items submitted from any thread into batches for fn.
+
+    A batch runs once max_batch_size items are waiting, or max_wait_s after
+    its first item arrived. fn takes a list of items and returns one result
+    per item; it is only ever called from the batcher thread.
+    """
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 8,
+        max_wait_s: float = 0.05,
+        name: str = "batcher"
+    ) -> None:
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_s
+
+        # Statistics
+        self.batches = 0
+        self.items = 0
+
+        self.queue: Queue = Queue()
+        self.termination_event = threading.Event()
+        self.thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self.thread.start()
+
+    # Private
+    ################################################################
+
+    def _collect(self) -> list:
+        try:
+            batch = [self.queue.get(timeout=0.1)]
+        except Empty:
+            return []
+
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    # Past the deadline, only take items already waiting
+                    batch.append(self.queue.get_nowait())
+            except Empty:
+                break
+
+        return batch
+
+    def _loop(self):
+        while not self.termination_event.is_set():
+            batch = self._collect()
+            if len(batch) == 0:
+                continue
+
+            items = [item for item, _ in batch]
+            try:
+                results = self.fn(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+            self.batches += 1
+            self.items += len(batch)
+
+    # Public
+    ################################################################
+
+    def submit(self, item: Any) -> Future:
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    def mean_batch_size(self) -> float:
+        return self.items / self.batches if self.batches > 0 else 0.0
+
+    def stop(self):
+        self.termination_event.set()
+        self.thread.join()
@@ -1,2 +1,3 @@
-from .depth import DepthAnythingFacade
-from .meshing import create_pixel_vertice_mapping, create_mesh
\ No newline at end of file
+from .depth import DepthAnythingFacade, BACKENDS
+from .meshing import create_pixel_vertice_mapping, create_mesh, create_mesh_arrays, pointcloud_arrays
+from .quadtree import QuadtreeTriangulator, adaptive_lods
\ No newline at end of file
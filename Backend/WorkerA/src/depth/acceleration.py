@@ -0,0 +1,153 @@
+import numpy as np
+from typing import Callable, Dict, Sequence, Tuple
+
+import torch
+
+from .depth_anything.blocks import FeatureFusionBlock
+
+# Mode -> mean relative error allowed against the fp32 eager reference
+MODES = {
+    "channels_last": 1e-4,
+    "fused_upsampling": 1e-4,
+    "compile": 1e-3,
+    "fp16": 1e-2,
+    "bf16": 3e-2
+}
+
+AUTOCAST_DTYPES = {
+    "fp16": torch.float16,
+    "bf16": torch.bfloat16
+}
+
+def fuse_upsampling(
+    model: torch.nn.Module,
+    enabled: bool = True
+):
+    for module in model.modules():
+        if isinstance(module, FeatureFusionBlock):
+            module.conv_before_upsample = enabled
+    if hasattr(model, "skip_identity_resize"):
+        model.skip_identity_resize = enabled
+
+def tolerance(modes: Sequence[str]) -> float:
+    return max([MODES[mode] for mode in modes], default=1e-5)
+
+def relative_error(
+    depth: torch.Tensor,
+    reference: torch.Tensor
+) -> float:
+    depth, reference = depth.float(), reference.float()
+    return float((depth - reference).abs().mean() / reference.abs().mean().clamp_min(1e-6))
+
+def sample_input(
+    size: int = 518,
+    device: str = "cpu"
+) -> torch.Tensor:
+    """
+    Deterministic normalized input: smooth gradients plus a little noise.
+    """
+    generator = torch.Generator().manual_seed(0)
+    ys, xs = torch.meshgrid(torch.linspace(-1, 1, size), torch.linspace(-1, 1, size), indexing="ij")
+    image = torch.stack([xs, ys, xs * ys])[None]
+    image = image + 0.1 * torch.randn(image.shape, generator=generator)
+    return image.to(device)
+
+class AcceleratedModel:
+    """
+    DepthAnything behind a set of acceleration modes:
+        channels_last: NHWC memory format for the convolutions
+        fused_upsampling: convs before upsampling, identity resizes skipped
+        fp16 / bf16: autocast, depth returned in float32
+        compile: torch.compile of the whole model
+    """
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        modes: Sequence[str],
+        device: str
+    ) -> None:
+        for mode in modes:
+            if mode not in MODES:
+                raise ValueError(f"Invalid acceleration mode: {mode}")
+        if "fp16" in modes and "bf16" in modes:
+            raise ValueError("fp16 and bf16 are exclusive")
+
+        self.eager = model
+        self.modes = list(modes)
+        self.device = device
+
+        if "fused_upsampling" in self.modes:
+            fuse_upsampling(model)
+        if "channels_last" in self.modes:
+            model = model.to(memory_format=torch.channels_last)
+        if "compile" in self.modes:
+            model = torch.compile(model, dynamic=True)
+        self.model = model
+
+        self.autocast_dtype = next((AUTOCAST_DTYPES[m] for m in self.modes if m in AUTOCAST_DTYPES), None)
+
+    def __call__(self, image_pt: torch.Tensor) -> torch.Tensor:
+        if "channels_last" in self.modes:
+            image_pt = image_pt.contiguous(memory_format=torch.channels_last)
+
+        if self.autocast_dtype is None:
+            return self.model(image_pt)
+
+        with torch.autocast(device_type=torch.device(self.device).type, dtype=self.autocast_dtype):
+            return self.model(image_pt).float()
+
+    def parameters(self):
+        return self.eager.parameters()
+
+    def revert(self) -> torch.nn.Module:
+        """
+        The plain eager model, e.g. after a failed accuracy check.
+        """
+        fuse_upsampling(self.eager, False)
+        return self.eager.to(memory_format=torch.contiguous_format)
+
+@torch.no_grad()
+def check_accuracy(
+    accelerated: Callable[[torch.Tensor], torch.Tensor],
+    inputs: Sequence[torch.Tensor],
+    references: Sequence[torch.Tensor],
+    modes: Sequence[str]
+) -> Tuple[bool, float]:
+    """
+    Mean relative error of accelerated against the fp32 references of
+    inputs, and whether it is within the tolerance of the modes.
+    """
+    errors = [relative_error(accelerated(x), reference) for x, reference in zip(inputs, references)]
+    error = float(np.mean(errors))
+    return error <= tolerance(modes), error
+
+@torch.no_grad()
+def accelerate(
+    model: torch.nn.Module,
+    modes: Sequence[str],
+    device: str,
+    validate: bool = True
+) -> Tuple[Callable[[torch.Tensor], torch.Tensor], Dict[str, float]]:
+    """
+    Apply modes to model. With validate, the accelerated model is checked
+    against the fp32 eager model on a sample input first and the eager
+    model is returned if it drifts past the tolerance.
+    """
+    if len(modes) == 0:
+        return model, {}
+
+    inputs = [sample_input(device=device)] if validate else []
+    references = [model(x) for x in inputs]
+
+    accelerated = AcceleratedModel(model, modes, device)
+    if not validate:
+        return accelerated, {}
+
+    passed, error = check_accuracy(accelerated, inputs, references, modes)
+    report = { "relative_error": error, "tolerance": tolerance(modes) }
+    if not passed:
+        print(f"Acceleration {'+'.join(modes)} failed the accuracy check ({error:.2e} > {tolerance(modes):.0e}), using fp32 eager")
+        return accelerated.revert(), report
+
+    print(f"Acceleration {'+'.join(modes)}: relative error {error:.2e}")
+    return accelerated, report
@@ -1,75 +1,347 @@
+import os
+import json
+import time
+import threading
 import cv2
 import numpy as np
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple, Union
 
 import torch
 import torch.nn.functional as F
 from torchvision.transforms import Compose
+from huggingface_hub import hf_hub_download
 
 from .depth_anything.dpt import DepthAnything
 from .depth_anything.util.transform import Resize, NormalizeImage, PrepareForNet
+from .onnx_backend import OnnxDepthModel, export_onnx, quantize_onnx
+from .acceleration import accelerate
+from .tiling import tile_windows, blend_weights, align_scale_shift
+from ..loading import cached_safetensors
+
+BACKENDS = ["torch", "onnx", "onnx-int8"]
 
 class DepthAnythingFacade:
     def __init__(
         self,
         encoder: str = "vitl",
         device: str = "cuda",
+        backend: str = "torch",
+        onnx_dir: str = "models/onnx",
+        num_threads: Union[int, None] = None,
+        weights_dir: Union[str, None] = "models/safetensors",
+        acceleration: Sequence[str] = (),
+        validate_acceleration: bool = True
     ) -> None:
+        """
+        Args:
+            backend: "torch", or "onnx" / "onnx-int8" for ONNX Runtime on CPU.
+                The ONNX model is exported (and quantized) into onnx_dir on
+                first use.
+            weights_dir: safetensors copies of the torch weights, memory-mapped
+                on later starts. None loads the hub checkpoint every time.
+            acceleration: torch backend modes, see acceleration.MODES. With
+                validate_acceleration they are checked against fp32 eager
+                on a sample input and dropped if depth drifts too far.
+        """
         # Validate
         if encoder not in ["vits", "vitb", "vitl"]:
             raise ValueError(f"Invalid encoder: {encoder}")
-        if device not in ["cuda", "cpu"]:
+        if device.split(":")[0] not in ["cuda", "cpu"]:
             raise ValueError(f"Invalid device: {device}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Invalid backend: {backend}")
+        if backend != "torch" and device != "cpu":
+            raise ValueError(f"Backend {backend} only runs on cpu")
+        if backend != "torch" and len(acceleration) > 0:
+            raise ValueError("Acceleration modes need the torch backend")
 
-        # Load model        
-        self.model = DepthAnything.from_pretrained(f"LiheYoung/depth_anything_{encoder}14")
-        self.model = self.model.to(device).eval()
+        # Load model
+        if backend == "torch":
+            self.model = self.load_torch(encoder, weights_dir).to(device).eval()
+            self.model, self.acceleration_report = accelerate(
+                self.model,
+                acceleration,
+                device,
+                validate=validate_acceleration
+            )
+        else:
+            path = self.prepare_onnx(encoder, onnx_dir, quantized=backend == "onnx-int8")
+            self.model = OnnxDepthModel(path, num_threads=num_threads)
+            self.acceleration_report = {}
         
         # Load preprocessing
+        self.resize = Resize(
+            width=518,
+            height=518,
+            resize_target=False,
+            keep_aspect_ratio=True,
+            ensure_multiple_of=14,
+            resize_method='lower_bound',
+            image_interpolation_method=cv2.INTER_CUBIC,
+        )
         self.transform = Compose([
-            Resize(
-                width=518,
-                height=518,
-                resize_target=False,
-                keep_aspect_ratio=True,
-                ensure_multiple_of=14,
-                resize_method='lower_bound',
-                image_interpolation_method=cv2.INTER_CUBIC,
-            ),
+            self.resize,
             NormalizeImage(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
             PrepareForNet(),
         ])
         
+        # Same normalization as the transform, applied on the device
+        self.mean = torch.tensor([0.485, 0.456, 0.406], device=device).view(1, 3, 1, 1)
+        self.std = torch.tensor([0.229, 0.224, 0.225], device=device).view(1, 3, 1, 1)
+        self.dtype = next(self.model.parameters()).dtype if backend == "torch" else torch.float32
+        
         # Misc
         self.device = device
+        self.backend = backend
+        
+        # Forward passes and statistics are serialized, the depth batcher
+        # and tiled inference of the stage threads share the model
+        self.lock = threading.RLock()
+        
+        # Statistics, seconds per stage over timed_images
+        self.timings = { "preprocess": 0.0, "inference": 0.0, "postprocess": 0.0 }
+        self.timed_images = 0
     
-    def preprocess(
+    @staticmethod
+    def load_torch(
+        encoder: str,
+        weights_dir: Union[str, None] = None
+    ) -> DepthAnything:
+        repo_id = f"LiheYoung/depth_anything_{encoder}14"
+        if weights_dir is None:
+            return DepthAnything.from_pretrained(repo_id)
+        
+        with open(hf_hub_download(repo_id, "config.json")) as file:
+            config = json.load(file)
+        state_dict = cached_safetensors(
+            hf_hub_download(repo_id, "pytorch_model.bin"),
+            os.path.join(weights_dir, f"depth_anything_{encoder}14.safetensors")
+        )
+        
+        model = DepthAnything(config)
+        model.load_state_dict(state_dict, strict=True)
+        return model
+    
+    @classmethod
+    def prepare_onnx(
+        cls,
+        encoder: str,
+        onnx_dir: str,
+        quantized: bool = False
+    ) -> str:
+        """
+        Path of the (quantized) ONNX model, exported if not there yet.
+        """
+        path = os.path.join(onnx_dir, f"depth_anything_{encoder}14.onnx")
+        if not os.path.exists(path):
+            print(f"Exporting {encoder} to {path}")
+            export_onnx(cls.load_torch(encoder), path)
+        
+        if not quantized:
+            return path
+        
+        quantized_path = os.path.join(onnx_dir, f"depth_anything_{encoder}14.int8.onnx")
+        if not os.path.exists(quantized_path):
+            print(f"Quantizing {path}")
+            quantize_onnx(path, quantized_path)
+        return quantized_path
+    
+    def _input_size(
+        self,
+        image: np.ndarray
+    ) -> Tuple[int, int]:
+        """
+        Network input (H, W) of an image, multiples of 14.
+        """
+        w, h = self.resize.get_size(image.shape[1], image.shape[0])
+        return int(h), int(w)
+    
+    @contextmanager
+    def _timed(self, stage: str):
+        start = time.perf_counter()
+        yield
+        # Kernels run asynchronously, charge them to their stage
+        if self.device.startswith("cuda"):
+            torch.cuda.synchronize(self.device)
+        self.timings[stage] += time.perf_counter() - start
+    
+    def preprocess_numpy(
         self,
         image: np.ndarray
     ) -> np.ndarray:
+        """
+        Reference preprocessing with the NumPy/cv2 transforms.
+        """
         image_t = image / 255.0
         image_t = self.transform({"image": image_t})["image"]
-        image_t = torch.from_numpy(image_t).unsqueeze(0).to(self.device)
         return image_t
     
-    @torch.no_grad()
+    def preprocess(
+        self,
+        image: np.ndarray,
+        input_size: Union[Tuple[int, int], None] = None
+    ) -> torch.Tensor:
+        """
+        Upload the uint8 image once, resize and normalize on the device.
+        
+        Returns:
+            torch.Tensor, shape=(1, 3, H, W), multiples of 14
+        """
+        input_size = input_size or self._input_size(image)
+        
+        image_pt = torch.from_numpy(np.ascontiguousarray(image)).to(self.device, non_blocking=True)
+        image_pt = image_pt.permute(2, 0, 1)[None].float() / 255.0
+        image_pt = F.interpolate(image_pt, input_size, mode='bicubic', align_corners=False)
+        image_pt = (image_pt - self.mean) / self.std
+        
+        return image_pt.to(self.dtype)
+    
     def __call__(
         self,
-        image: np.ndarray
+        image: np.ndarray,
+        size: Union[Tuple[int, int], None] = None
     ) -> np.ndarray:
         """
         Args:
             image: np.ndarray, shape=(H, W, 3), dtype=np.uint8
+            size: (H, W) of the returned depth, the image size by default
+        """
+        return self.infer_batch([image], sizes=[size])[0]
+    
+    @torch.no_grad()
+    def infer_batch(
+        self,
+        images: Sequence[np.ndarray],
+        max_batch_size: int = 8,
+        sizes: Union[Sequence[Union[Tuple[int, int], List[Tuple[int, int]], None]], None] = None
+    ) -> List[Union[np.ndarray, List[np.ndarray]]]:
+        """
+        Depth of many images, each returned at its size in sizes (H, W),
+        the image's own size by default. A list of sizes returns a list of
+        depths of the image, all from the same forward pass.
+        
+        Images are bucketed by network input shape (multiples of 14 after
+        the resize), every bucket runs in forward passes of max_batch_size.
+        Depth is interpolated to the output size on the device and copied
+        to host once per image and size. Calls from several threads run
+        one at a time.
+        
+        Args:
+            images: list of np.ndarray, shape=(H, W, 3), dtype=np.uint8
+        """
+        with self.lock:
+            return self._infer_batch(images, max_batch_size, sizes)
+    
+    def _infer_batch(
+        self,
+        images: Sequence[np.ndarray],
+        max_batch_size: int,
+        sizes: Union[Sequence[Union[Tuple[int, int], List[Tuple[int, int]], None]], None]
+    ) -> List[Union[np.ndarray, List[np.ndarray]]]:
+        sizes = sizes or [None] * len(images)
+        output_sizes = [
+            [s or image.shape[:2] for s in size] if isinstance(size, list) else [size or image.shape[:2]]
+            for image, size in zip(images, sizes)
+        ]
+        
+        # Bucket by input shape
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for i, image in enumerate(images):
+            buckets.setdefault(self._input_size(image), []).append(i)
+        
+        depths: List[np.ndarray] = [None] * len(images)
+        for input_size, indices in buckets.items():
+            for start in range(0, len(indices), max_batch_size):
+                chunk = indices[start:start + max_batch_size]
+                
+                with self._timed("preprocess"):
+                    batch_pt = torch.cat([self.preprocess(images[i], input_size) for i in chunk])
+                
+                with self._timed("inference"):
+                    depth_pt = self.model(batch_pt)
+                
+                # Straight to the output size, then a single host copy
+                with self._timed("postprocess"):
+                    for j, i in enumerate(chunk):
+                        depths_i = [
+                            F.interpolate(
+                                depth_pt[j][None, None].float(),
+                                tuple(output_size),
+                                mode='bilinear',
+                                align_corners=False
+                            )[0, 0].cpu().numpy()
+                            for output_size in output_sizes[i]
+                        ]
+                        depths[i] = depths_i if isinstance(sizes[i], list) else depths_i[0]
+        
+        self.timed_images += len(images)
+        return depths
+    
+    @torch.no_grad()
+    def infer_tiled(
+        self,
+        image: np.ndarray,
+        tile_size: int = 518,
+        overlap: float = 0.25,
+        max_batch_size: int = 4,
+        size: Union[Tuple[int, int], None] = None
+    ) -> np.ndarray:
         """
+        Depth of a large image at native resolution from overlapping tiles.
+        
+        A single downscaled pass gives the global layout, every tile is
+        aligned to it by a scale/shift fit and blended in with weights
+        fading across the overlap. Device memory is bounded by the network
+        input and max_batch_size tiles of tile_size, whatever the image
+        size, the reference is upsampled on the host. Every
+        chunk takes the model lock on its own, batched requests of other
+        threads run between chunks.
         
-        # Preprocess
+        Args:
+            image: np.ndarray, shape=(H, W, 3), dtype=np.uint8
+            tile_size: tile side in image pixels, a multiple of 14 keeps
+                tiles at native resolution
+            size: (H, W) of the returned depth, the image size by default
+        """
         h, w = image.shape[:2]
-        image_pt = self.preprocess(image)
+        if max(h, w) <= tile_size:
+            return self(image, size)
+        
+        # Global estimate the tiles are aligned to. Downscaled to the network
+        # input on the host, so the device never holds native resolution
+        input_h, input_w = self._input_size(image)
+        small = cv2.resize(image, (input_w, input_h), interpolation=cv2.INTER_AREA)
+        reference = self.infer_batch([small])[0]
+        reference = cv2.resize(reference, (w, h), interpolation=cv2.INTER_LINEAR)
         
-        # Inference
-        depth_pt = self.model(image_pt)
+        windows = tile_windows(h, w, tile_size, overlap)
+        ramp = int(tile_size * overlap)
+        depth_sum = np.zeros((h, w), dtype=np.float32)
+        weight_sum = np.zeros((h, w), dtype=np.float32)
         
-        # Postprocess
-        depth_pt = F.interpolate(depth_pt[None], (h, w), mode='bilinear', align_corners=False)[0, 0]
-        depth_np = depth_pt.cpu().numpy().astype(np.float32)
+        # Tiles of a chunk share forward passes, one chunk on the device at a time
+        for start in range(0, len(windows), max_batch_size):
+            chunk = windows[start:start + max_batch_size]
+            tiles = self.infer_batch(
+                [image[y0:y1, x0:x1] for y0, y1, x0, x1 in chunk],
+                max_batch_size=max_batch_size
+            )
+            for (y0, y1, x0, x1), tile in zip(chunk, tiles):
+                weights = blend_weights(y1 - y0, x1 - x0, ramp)
+                scale, shift = align_scale_shift(tile, reference[y0:y1, x0:x1], weights)
+                depth_sum[y0:y1, x0:x1] += weights * (scale * tile + shift)
+                weight_sum[y0:y1, x0:x1] += weights
         
-        return depth_np
\ No newline at end of file
+        depth = depth_sum / weight_sum
+        if size is not None and tuple(size) != (h, w):
+            depth = cv2.resize(depth, (size[1], size[0]), interpolation=cv2.INTER_LINEAR)
+        return depth
+    
+    def timing_report(self) -> Dict[str, float]:
+        """
+        Mean milliseconds per image of every stage.
+        """
+        with self.lock:
+            n = max(self.timed_images, 1)
+            return { stage: 1000 * seconds / n for stage, seconds in self.timings.items() }
@@ -123,6 +123,10 @@ class FeatureFusionBlock(nn.Module):
 
         self.size=size
 
+        # 1x1 conv before the bilinear upsample instead of after, both are
+        # linear so the result matches at a quarter of the conv's cost
+        self.conv_before_upsample = False
+
     def forward(self, *xs, size=None):
         """Forward pass.
 
@@ -144,10 +148,14 @@ class FeatureFusionBlock(nn.Module):
         else:
             modifier = {"size": size}
 
+        if self.conv_before_upsample:
+            output = self.out_conv(output)
+
         output = nn.functional.interpolate(
             output, **modifier, mode="bilinear", align_corners=self.align_corners
         )
 
-        output = self.out_conv(output)
+        if not self.conv_before_upsample:
+            output = self.out_conv(output)
 
         return output
@@ -152,6 +152,9 @@ class DPT_DINOv2(nn.Module):
         
         self.depth_head = DPTHead(1, dim, features, use_bn, out_channels=out_channels, use_clstoken=use_clstoken)
         
+        # Skip the final resize when the head already returns the input size
+        self.skip_identity_resize = False
+        
     def forward(self, x):
         h, w = x.shape[-2:]
         
@@ -160,7 +163,8 @@ class DPT_DINOv2(nn.Module):
         patch_h, patch_w = h // 14, w // 14
 
         depth = self.depth_head(features, patch_h, patch_w)
-        depth = F.interpolate(depth, size=(h, w), mode="bilinear", align_corners=True)
+        if not (self.skip_identity_resize and tuple(depth.shape[-2:]) == (h, w)):
+            depth = F.interpolate(depth, size=(h, w), mode="bilinear", align_corners=True)
         depth = F.relu(depth)
 
         return depth.squeeze(1)
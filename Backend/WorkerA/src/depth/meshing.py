@@ -1,21 +1,152 @@
 import numpy as np
-from tqdm import tqdm
 from typing import Tuple
 
 import open3d as o3d
 o3d.utility.set_verbosity_level(o3d.utility.VerbosityLevel.Error)
 
+# Triangle corners as (dy, dx) offsets from the cell's top-left pixel, in the
+# order the triangles are emitted for one pixel:
+#   0: left-bottom fan, only when the pixel on the left is missing
+#   1: lower triangle of the cell
+#   2: upper triangle of the cell
+#   3: fallback when the bottom-right pixel is missing
+TRIANGLE_OFFSETS = np.array([
+    [[0, 0], [1, -1], [1, 0]],
+    [[0, 0], [1, 0], [1, 1]],
+    [[0, 0], [1, 1], [0, 1]],
+    [[0, 0], [1, 0], [0, 1]]
+], dtype=np.int64)
+
 def create_pixel_vertice_mapping(
     mask: np.ndarray
 ) -> Tuple[np.ndarray, int]:
-    grid = np.ones(mask.shape[:2], dtype=np.int32) * -1
-    i = 0
-    for y in range(mask.shape[0]):
-        for x in range(mask.shape[1]):
-            if mask[y, x]:
-                grid[y, x] = i
-                i += 1
-    return grid, i
+    """
+    Vertex index of every masked pixel in row-major order, -1 elsewhere.
+    """
+    flat_mask = mask.reshape(-1).astype(bool)
+
+    grid = np.cumsum(flat_mask, dtype=np.int32) - 1
+    grid[~flat_mask] = -1
+    grid = grid.reshape(mask.shape[:2])
+
+    return grid, int(flat_mask.sum())
+
+def triangle_pixels(
+    grid: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pixel coordinates (ys, xs), each (T, 3), of the triangle corners over
+    the valid pixels of a vertex grid.
+
+    Same triangles and order as the per-pixel scan: every pixel emits its
+    candidates 0..3 (see TRIANGLE_OFFSETS) and pixels are visited row-major.
+    """
+    h, w = grid.shape[:2]
+    if h < 2:
+        return np.zeros((0, 3), dtype=np.int64), np.zeros((0, 3), dtype=np.int64)
+
+    valid = grid >= 0
+    pad = np.zeros((h, w + 2), dtype=bool)
+    pad[:, 1:-1] = valid
+
+    # Neighbourhood of every pixel in rows 0..h-2
+    c = valid[:-1]
+    l = pad[:-1, :-2]
+    r = pad[:-1, 2:]
+    b = pad[1:, 1:-1]
+    bl = pad[1:, :-2]
+    br = pad[1:, 2:]
+
+    candidates = np.stack([
+        c & bl & b & ~l,
+        c & b & br,
+        c & r & br,
+        c & r & b & ~br
+    ], axis=-1)
+
+    # Row-major nonzero keeps the per-pixel emission order
+    flat = np.flatnonzero(candidates)
+    pixel, kind = np.divmod(flat, 4)
+    y, x = np.divmod(pixel, w)
+
+    offsets = TRIANGLE_OFFSETS[kind]
+    ys = y[:, None] + offsets[:, :, 0]
+    xs = x[:, None] + offsets[:, :, 1]
+    return ys, xs
+
+def triangulate_grid(
+    grid: np.ndarray
+) -> np.ndarray:
+    """
+    Triangles (T, 3) over the valid pixels of a vertex grid.
+    """
+    ys, xs = triangle_pixels(grid)
+    return grid[ys, xs].astype(np.int32)
+
+def grid_vertices(
+    depth: np.ndarray,
+    grid: np.ndarray
+) -> np.ndarray:
+    """
+    Vertex positions (V, 3) of the valid pixels, in vertex index order.
+    """
+    scaler = np.max(grid.shape[:2])
+    ys, xs = np.nonzero(grid >= 0)
+
+    v = np.empty((ys.shape[0], 3), dtype=np.float32)
+    v[:, 0] = xs / scaler
+    v[:, 1] = -ys / scaler
+    v[:, 2] = -depth[ys, xs]
+    return v
+
+def grid_uvs(
+    grid: np.ndarray
+) -> np.ndarray:
+    """
+    Texture coordinates (V, 2) per vertex, indexed like the vertices.
+    """
+    h, w = grid.shape[:2]
+    ys, xs = np.nonzero(grid >= 0)
+
+    uv = np.empty((ys.shape[0], 2), dtype=np.float32)
+    uv[:, 0] = xs / w
+    uv[:, 1] = 1 - ys / h
+    return uv
+
+def create_mesh_arrays(
+    depth: np.ndarray,
+    grid: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns:
+        vertices (V, 3), triangles (T, 3), per-vertex uvs (V, 2)
+    """
+    return grid_vertices(depth, grid), triangulate_grid(grid), grid_uvs(grid)
+
+def pointcloud_arrays(
+    image: np.ndarray,
+    depth: np.ndarray,
+    max_points: int = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Colored points of the masked pixels, centered like the meshes. The pixel
+    grid is subsampled by a uniform stride to at most max_points.
+
+    Returns:
+        points (N, 3), uint8 colors (N, 3)
+    """
+    mask = depth > 5
+    if max_points is not None:
+        stride = max(int(np.ceil(np.sqrt(mask.sum() / max(max_points, 1)))), 1)
+        image, depth, mask = image[::stride, ::stride], depth[::stride, ::stride], mask[::stride, ::stride]
+
+    grid, v_num = create_pixel_vertice_mapping(mask)
+    points = grid_vertices(depth / -200, grid)
+    if v_num > 0:
+        points -= points.mean(axis=0)
+
+    ys, xs = np.nonzero(grid >= 0)
+    return points, image[ys, xs]
 
 def create_mesh(
     img: np.ndarray,
@@ -24,88 +155,22 @@ def create_mesh(
     v_num: int,
     verbose: bool = False
 ) -> o3d.geometry.TriangleMesh:
-    # Params
-    scaler = np.max(grid.shape[:2])
-    
-    # Init vertices, triangles, uvs
-    v = np.zeros((v_num, 3), dtype=np.float32)
-    t = []
-    t_uv = []
-    
-    for y in tqdm(range(grid.shape[0]), 'Triangulation', disable=not verbose):
-        prev_block = False
-        for x in range(grid.shape[1]):
-            if grid[y, x] == -1:
-                prev_block = False
-                continue
-            
-            # Vertice coordinate
-            v[grid[y, x]] = [x / scaler, -y / scaler, -depth[y, x]]
-            
-            if y == grid.shape[0] - 1:
-                continue
-            
-            # Check available pixels
-            bl = True
-            if x == 0 or grid[y + 1, x - 1] == -1:
-                bl = False
-            
-            b = True
-            if grid[y + 1, x] == -1:
-                b = False
-            
-            br = True
-            if x == grid.shape[1] - 1 or grid[y + 1, x + 1] == -1:
-                br = False
-            
-            r = True
-            if x == grid.shape[1] - 1 or grid[y, x + 1] == -1:
-                r = False
-            
-            # Add triangles
-            if bl and b and not prev_block:
-                t.append([grid[y, x], grid[y + 1, x - 1], grid[y + 1, x]])
-                t_uv.append([x, y])
-                t_uv.append([x - 1, y + 1])
-                t_uv.append([x, y + 1])
-            
-            prev_block = False
-            if b and br:
-                t.append([grid[y, x], grid[y + 1, x], grid[y + 1, x + 1]])
-                t_uv.append([x, y])
-                t_uv.append([x, y + 1])
-                t_uv.append([x + 1, y + 1])
-                prev_block = True
-                
-            if r and br:
-                t.append([grid[y, x], grid[y + 1, x + 1], grid[y, x + 1]])
-                t_uv.append([x, y])
-                t_uv.append([x + 1, y + 1])
-                t_uv.append([x + 1, y])
-                prev_block = True
-                
-            if r and b and not prev_block:
-                t.append([grid[y, x], grid[y + 1, x], grid[y, x + 1]])
-                t_uv.append([x, y])
-                t_uv.append([x, y + 1])
-                t_uv.append([x + 1, y])
-                prev_block = True
-
-    # To numpy
-    t = np.array(t, dtype=np.int32)
-    t_uv = np.array(t_uv, dtype=np.float32)
-    
-    # Normalize UV
-    t_uv[:, 0] = t_uv[:, 0] / grid.shape[1]
-    t_uv[:, 1] = (1 - t_uv[:, 1] / grid.shape[0])
-    
+    v, t, uv = create_mesh_arrays(depth, grid)
+    assert v.shape[0] == v_num, "Vertex count does not match the grid"
+
+    if verbose:
+        print(f"Triangulation: {v.shape[0]} vertices, {t.shape[0]} triangles")
+
+    # Open3D stores uvs per triangle corner
+    t_uv = uv[t.reshape(-1)]
+
     # Create mesh
     mesh = o3d.geometry.TriangleMesh(o3d.utility.Vector3dVector(v),
                                      o3d.utility.Vector3iVector(t))
     mesh.textures = [o3d.geometry.Image(img.copy()).flip_vertical()]
     mesh.triangle_material_ids = o3d.utility.IntVector(np.zeros(t.shape[0], dtype=np.int32))
     mesh.triangle_uvs = o3d.utility.Vector2dVector(t_uv)
-    
+
     return mesh
 
 def create_pc(
@@ -115,24 +180,17 @@ def create_pc(
     v_num: int,
     verbose: bool = False
 ) -> o3d.geometry.PointCloud:
-    # Params
-    scaler = np.max(grid.shape[:2])
-    
-    # Init vertices, triangles, uvs
-    vertices = np.zeros((v_num, 3), dtype=np.float32)
-    vertices_color = np.zeros((v_num, 3), dtype=np.float32)
-    
-    for y in tqdm(range(grid.shape[0]), 'PC Building', disable=not verbose):
-        for x in range(grid.shape[1]):
-            vi = grid[y, x]
-            if vi == -1: continue
-            vertices[vi] = [x / scaler, -y / scaler, -depth[y, x]]
-            vertices_color[vi] = image[y, x] / 255.0
-    
+    vertices = grid_vertices(depth, grid)
+    ys, xs = np.nonzero(grid >= 0)
+    vertices_color = image[ys, xs].astype(np.float32) / 255.0
+
+    if verbose:
+        print(f"PC Building: {vertices.shape[0]} points")
+
     pc = o3d.geometry.PointCloud()
-    
+
     pc.points = o3d.utility.Vector3dVector(vertices)
     pc.colors = o3d.utility.Vector3dVector(vertices_color)
     pc.translate(-pc.get_center())
-    
-    return pc
\ No newline at end of file
+
+    return pc
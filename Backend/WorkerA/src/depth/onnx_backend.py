@@ -0,0 +1,84 @@
+import os
+import numpy as np
+from typing import Union
+
+import torch
+
+def export_onnx(
+    model: torch.nn.Module,
+    path: str,
+    size: int = 518,
+    opset: int = 17
+) -> str:
+    """
+    Export DepthAnything with dynamic batch and spatial axes.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    dummy = torch.randn(1, 3, size, size)
+    torch.onnx.export(
+        model.cpu().eval(),
+        dummy,
+        path,
+        input_names=["image"],
+        output_names=["depth"],
+        dynamic_axes={
+            "image": {0: "batch", 2: "height", 3: "width"},
+            "depth": {0: "batch", 1: "height", 2: "width"}
+        },
+        opset_version=opset,
+        do_constant_folding=True
+    )
+    return path
+
+def quantize_onnx(
+    path: str,
+    quantized_path: str
+) -> str:
+    """
+    Dynamic int8 quantization of the transformer's linear layers.
+
+    Convolutions of the DPT head stay in float, they are a small share of
+    the runtime and quantizing them costs most of the accuracy.
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(
+        path,
+        quantized_path,
+        op_types_to_quantize=["MatMul", "Gemm"],
+        weight_type=QuantType.QInt8
+    )
+    return quantized_path
+
+class OnnxDepthModel:
+    """
+    ONNX Runtime session that stands in for the torch model: takes and
+    returns torch tensors so the facade's pre/postprocessing is shared.
+    """
+    def __init__(
+        self,
+        path: str,
+        num_threads: Union[int, None] = None
+    ) -> None:
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(
+            path,
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.path = path
+
+    def __call__(
+        self,
+        image_pt: torch.Tensor
+    ) -> torch.Tensor:
+        image_np = image_pt.detach().cpu().numpy().astype(np.float32)
+        depth_np = self.session.run(["depth"], {"image": image_np})[0]
+        return torch.from_numpy(depth_np)
@@ -0,0 +1,217 @@
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .meshing import triangle_pixels
+
+def corner_weights(size: int) -> np.ndarray:
+    """
+    Weights (size + 1, size + 1, 4) of the corners [top-left, top-right,
+    bottom-left, bottom-right] interpolating a block split along its
+    top-left to bottom-right diagonal, as the grid triangles are.
+    """
+    v, u = np.mgrid[0:size + 1, 0:size + 1] / size
+    lower = v >= u
+
+    weights = np.zeros((size + 1, size + 1, 4), dtype=np.float32)
+    weights[..., 0] = np.where(lower, 1 - v, 1 - u)
+    weights[..., 1] = np.where(lower, 0, u - v)
+    weights[..., 2] = np.where(lower, v - u, 0)
+    weights[..., 3] = np.where(lower, u, v)
+    return weights
+
+def block_errors(
+    depth: np.ndarray,
+    valid: np.ndarray,
+    size: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Max depth error of replacing every aligned block of size cells by two
+    triangles, inf where a block has invalid pixels, and the squared error
+    summed over the pixels the block owns (all but its last row and column).
+    """
+    blocks = sliding_window_view(depth, (size + 1, size + 1))[::size, ::size]
+    corners = blocks[..., [0, 0, -1, -1], [0, -1, 0, -1]]
+
+    residual = blocks - np.tensordot(corners, corner_weights(size), axes=([2], [2]))
+    error = np.abs(residual).max(axis=(2, 3))
+    squared = (residual[:, :, :size, :size] ** 2).sum(axis=(2, 3))
+
+    complete = sliding_window_view(valid, (size + 1, size + 1))[::size, ::size].all(axis=(2, 3))
+    error[~complete] = np.inf
+    return error, squared
+
+def perimeter_offsets(size: int) -> np.ndarray:
+    """
+    (dy, dx) of the 4 * size boundary points of a block, counter-clockwise
+    from the top-left corner like the grid triangles are wound.
+    """
+    steps = np.arange(size)
+    return np.concatenate([
+        np.stack([steps, np.zeros(size, dtype=int)], axis=1),
+        np.stack([np.full(size, size), steps], axis=1),
+        np.stack([size - steps, np.full(size, size)], axis=1),
+        np.stack([np.zeros(size, dtype=int), size - steps], axis=1)
+    ])
+
+class QuadtreeTriangulator:
+    """
+    Adaptive triangulation of a depth grid. Aligned power-of-two blocks
+    within a depth tolerance become two triangles, the rest keeps the
+    per-pixel grid triangulation.
+
+    Block errors are computed once, every tolerance then only selects
+    leaves, so levels of detail come out of a single pass. Blocks with
+    smaller neighbours are fanned from their centre through the vertices
+    on their edges, leaving no cracks at T-junctions.
+    """
+    def __init__(
+        self,
+        depth: np.ndarray,
+        mask: np.ndarray,
+        grid: np.ndarray
+    ) -> None:
+        h, w = grid.shape[:2]
+        self.grid = grid
+        self.num_valid = int(mask.sum())
+        self.depth_range = float(np.ptp(depth[mask])) if self.num_valid > 0 else 0.0
+
+        # Padded to 2^k + 1 vertices a side, padding is invalid
+        cells = 1 << int(np.ceil(np.log2(max(h, w, 2) - 1)))
+        self.cells = cells
+        self.padded_grid = np.full((cells + 1, cells + 1), -1, dtype=np.int64)
+        self.padded_grid[:h, :w] = grid
+        padded_depth = np.zeros((cells + 1, cells + 1), dtype=np.float32)
+        padded_depth[:h, :w] = depth
+        valid = self.padded_grid >= 0
+
+        self.sizes = [1 << k for k in range(int(np.log2(cells)), 0, -1)]
+        self.errors: Dict[int, Tuple[np.ndarray, np.ndarray]] = {
+            size: block_errors(padded_depth, valid, size) for size in self.sizes
+        }
+
+        # Per-pixel triangulation and the cell every triangle lies in
+        self.pixel_ys, self.pixel_xs = triangle_pixels(grid)
+        self.cell_ys = self.pixel_ys.min(axis=1)
+        self.cell_xs = self.pixel_xs.min(axis=1)
+
+    def _leaves(
+        self,
+        tolerance: float
+    ) -> Tuple[Dict[int, Tuple[np.ndarray, np.ndarray]], np.ndarray]:
+        # Largest blocks first, a block is a leaf unless an ancestor is
+        covered = np.zeros((self.cells, self.cells), dtype=bool)
+        leaves = {}
+        for size in self.sizes:
+            error, _ = self.errors[size]
+            leaf = (error <= tolerance) & ~covered[::size, ::size]
+            ys, xs = np.nonzero(leaf)
+            leaves[size] = (ys * size, xs * size)
+            covered |= np.repeat(np.repeat(leaf, size, axis=0), size, axis=1)
+        return leaves, covered
+
+    def triangulate(
+        self,
+        tolerance: float
+    ) -> Tuple[np.ndarray, Dict[str, float]]:
+        """
+        Triangles (T, 3) indexing the grid's vertices, and the max and RMS
+        depth error over the valid pixels as fractions of the depth range.
+
+        Args:
+            tolerance: max depth error of a merged block, as a fraction of
+                the depth range
+        """
+        leaves, covered = self._leaves(tolerance * self.depth_range)
+
+        # Grid triangles outside merged blocks
+        keep = ~covered[self.cell_ys, self.cell_xs]
+        pixel_ys, pixel_xs = self.pixel_ys[keep], self.pixel_xs[keep]
+
+        # Vertices other triangles end on, block edges must pass through them
+        active = np.zeros(self.padded_grid.shape, dtype=bool)
+        active[pixel_ys, pixel_xs] = True
+        for size, (ys, xs) in leaves.items():
+            for dy, dx in [(0, 0), (0, size), (size, 0), (size, size)]:
+                active[ys + dy, xs + dx] = True
+
+        triangles = [self.grid[pixel_ys, pixel_xs]]
+        max_error, squared = 0.0, 0.0
+        for size, (ys, xs) in leaves.items():
+            if ys.shape[0] == 0:
+                continue
+            error, block_squared = self.errors[size]
+            max_error = max(max_error, float(error[ys // size, xs // size].max()))
+            squared += float(block_squared[ys // size, xs // size].sum())
+
+            offsets = perimeter_offsets(size)
+            perimeter_ys = ys[:, None] + offsets[:, 0]
+            perimeter_xs = xs[:, None] + offsets[:, 1]
+            on_edge = active[perimeter_ys, perimeter_xs]
+
+            # Only corners on the edges: two triangles like a grid cell
+            simple = on_edge.sum(axis=1) == 4
+            g = self.padded_grid
+            tl, tr = g[ys, xs], g[ys, xs + size]
+            bl, br = g[ys + size, xs], g[ys + size, xs + size]
+            triangles.append(np.stack([tl, bl, br], axis=1)[simple])
+            triangles.append(np.stack([tl, br, tr], axis=1)[simple])
+
+            # Otherwise a fan from the centre over the edge vertices in order
+            fan = np.flatnonzero(~simple)
+            if fan.shape[0] == 0:
+                continue
+            leaf, k = np.nonzero(on_edge[fan])
+            starts = np.flatnonzero(np.r_[True, np.diff(leaf) != 0])
+            ends = np.r_[starts[1:], leaf.shape[0]] - 1
+            following = np.arange(leaf.shape[0]) + 1
+            following[ends] = starts
+
+            block = fan[leaf]
+            center = g[ys[block] + size // 2, xs[block] + size // 2]
+            first = g[perimeter_ys[block, k], perimeter_xs[block, k]]
+            second = g[perimeter_ys[block, k[following]], perimeter_xs[block, k[following]]]
+            triangles.append(np.stack([center, first, second], axis=1))
+
+        triangles = np.concatenate(triangles).astype(np.int32)
+        depth_range = max(self.depth_range, 1e-12)
+        stats = {
+            "max_error": max_error / depth_range,
+            "rms_error": float(np.sqrt(squared / max(self.num_valid, 1))) / depth_range
+        }
+        return triangles, stats
+
+def compact(
+    triangles: np.ndarray,
+    num_vertices: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vertices used by triangles and the triangles re-indexed to them.
+    """
+    used = np.unique(triangles)
+    remap = np.full(num_vertices, -1, dtype=np.int32)
+    remap[used] = np.arange(used.shape[0], dtype=np.int32)
+    return used, remap[triangles]
+
+def adaptive_lods(
+    depth: np.ndarray,
+    mask: np.ndarray,
+    grid: np.ndarray,
+    tolerances: Sequence[float]
+) -> List[Tuple[np.ndarray, np.ndarray, Dict[str, float]]]:
+    """
+    One adaptive triangulation per tolerance, coarsest last.
+
+    Returns:
+        per level: used vertex indices (V,), triangles (T, 3) indexing
+        them, error stats
+    """
+    triangulator = QuadtreeTriangulator(depth, mask, grid)
+    num_vertices = int(mask.sum())
+
+    lods = []
+    for tolerance in tolerances:
+        triangles, stats = triangulator.triangulate(tolerance)
+        used, triangles = compact(triangles, num_vertices)
+        lods.append((used, triangles, stats))
+    return lods
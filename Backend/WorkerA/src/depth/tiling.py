@@ -0,0 +1,70 @@
+import numpy as np
+from typing import List, Tuple, Union
+
+def tile_starts(
+    length: int,
+    tile: int,
+    stride: int
+) -> List[int]:
+    """
+    Start offsets of windows of tile covering [0, length), the last one
+    flush with the end.
+    """
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    return starts + [length - tile]
+
+def tile_windows(
+    height: int,
+    width: int,
+    tile_size: int,
+    overlap: float
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Overlapping (y0, y1, x0, x1) windows of at most tile_size pixels.
+    """
+    stride = max(int(tile_size * (1 - overlap)), 1)
+    return [
+        (y, min(y + tile_size, height), x, min(x + tile_size, width))
+        for y in tile_starts(height, tile_size, stride)
+        for x in tile_starts(width, tile_size, stride)
+    ]
+
+def blend_weights(
+    height: int,
+    width: int,
+    ramp: int
+) -> np.ndarray:
+    """
+    Weights ramping up linearly over ramp pixels from every border, tiles
+    fade into their neighbours across the overlap.
+    """
+    def ramp_1d(n):
+        distance = np.minimum(np.arange(n), np.arange(n)[::-1]) + 1
+        return np.clip(distance / max(ramp, 1), 1e-3, 1.0)
+    return np.outer(ramp_1d(height), ramp_1d(width)).astype(np.float32)
+
+def align_scale_shift(
+    depth: np.ndarray,
+    reference: np.ndarray,
+    weights: Union[np.ndarray, None] = None
+) -> Tuple[float, float]:
+    """
+    Scale and shift (s, t) minimizing the weighted squared error of
+    s * depth + t against reference. Relative depth is only defined up to
+    both, every tile is aligned to the same global estimate.
+    """
+    w = np.ones_like(depth) if weights is None else weights
+    sw = w.sum()
+    mean_d = (w * depth).sum() / sw
+    mean_r = (w * reference).sum() / sw
+    var_d = (w * (depth - mean_d) ** 2).sum() / sw
+    if var_d < 1e-8:
+        return 1.0, float(mean_r - mean_d)
+
+    scale = (w * (depth - mean_d) * (reference - mean_r)).sum() / sw / var_d
+    # An inverted fit means the tile has no usable structure, only shift it
+    if scale <= 0:
+        return 1.0, float(mean_r - mean_d)
+    return float(scale), float(mean_r - scale * mean_d)
@@ -1,12 +1,222 @@
 import torch
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple, Union
+from PIL import Image
 from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler, DiffusionPipeline
 
-def load_2_1():
-    model_id = "stabilityai/stable-diffusion-2-1"
+# Memory saving modes, slower but with lower peak VRAM
+MEMORY_MODES = ["attention_slicing", "vae_slicing", "vae_tiling"]
 
+def dtype_for(device: str) -> torch.dtype:
+    # Half precision only on GPUs, CPU kernels lack or emulate it
+    return torch.float16 if device.startswith("cuda") else torch.float32
+
+def load(
+    model_id: str,
+    device: str = "cuda",
+    torch_dtype: torch.dtype = torch.float16,
+    memory_modes: Sequence[str] = ()
+) -> StableDiffusionPipeline:
+    # Safetensors weights are memory-mapped instead of unpickled
+    pipe = StableDiffusionPipeline.from_pretrained(model_id, torch_dtype=torch_dtype, use_safetensors=True)
+    
     # Use the DPMSolverMultistepScheduler (DPM-Solver++) scheduler here instead
-    pipe = StableDiffusionPipeline.from_pretrained(model_id, torch_dtype=torch.float16)
     pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
-    pipe = pipe.to("cuda")
+    pipe = pipe.to(device)
+    
+    for mode in memory_modes:
+        if mode not in MEMORY_MODES:
+            raise ValueError(f"Invalid memory mode: {mode}")
+        getattr(pipe, f"enable_{mode}")()
+    
+    return pipe
+
+def load_2_1(**kwargs):
+    return load("stabilityai/stable-diffusion-2-1", **kwargs)
+
+def warmup(pipe: StableDiffusionPipeline):
+    """
+    One short generation, so kernel selection and allocations happen before the first task.
+    """
+    pipe(prompt="warmup", num_inference_steps=1, height=512, width=512)
+
+class PromptEmbeddingCache:
+    """
+    LRU cache of CLIP text embeddings keyed by token ids, so prompts that
+    tokenize the same share an entry. Bounded by entry count and bytes.
+    """
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_bytes: int = 128 << 20
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        
+        self.entries: "OrderedDict[Tuple[int, ...], torch.Tensor]" = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+    
+    def _evict(self):
+        while len(self.entries) > self.max_entries or (self.bytes > self.max_bytes and len(self.entries) > 1):
+            _, embedding = self.entries.popitem(last=False)
+            self.bytes -= embedding.numel() * embedding.element_size()
+    
+    @torch.no_grad()
+    def embed(
+        self,
+        pipe: StableDiffusionPipeline,
+        texts: Sequence[str]
+    ) -> torch.Tensor:
+        """
+        Embeddings (N, tokens, dim) of texts, misses go through the text
+        encoder in one forward pass.
+        """
+        input_ids = pipe.tokenizer(
+            list(texts),
+            padding="max_length",
+            max_length=pipe.tokenizer.model_max_length,
+            truncation=True,
+            return_tensors="pt"
+        ).input_ids
+        keys = [tuple(ids.tolist()) for ids in input_ids]
+        
+        with self.lock:
+            found = { key: self.entries[key] for key in keys if key in self.entries }
+            for key in found:
+                self.entries.move_to_end(key)
+            misses = sum(1 for key in keys if key not in found)
+            self.hits += len(keys) - misses
+            self.misses += misses
+        
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if len(missing) > 0:
+            encoded = pipe.text_encoder(torch.tensor(missing, device=pipe.device))[0]
+            encoded = encoded.to(dtype=pipe.text_encoder.dtype)
+            
+            with self.lock:
+                for key, embedding in zip(missing, encoded):
+                    if key not in self.entries:
+                        self.bytes += embedding.numel() * embedding.element_size()
+                    # Own storage, a view would keep the whole batch alive
+                    self.entries[key] = embedding.clone()
+                    found[key] = self.entries[key]
+                self._evict()
+        
+        return torch.stack([found[key] for key in keys])
+    
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "mb": self.bytes / (1 << 20),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups > 0 else 0.0
+            }
+
+def generate_batch(
+    pipe: StableDiffusionPipeline,
+    prompts: Sequence[str],
+    negative_prompts: Sequence[Union[str, None]] = None,
+    seeds: Sequence[Union[int, None]] = None,
+    embedding_cache: Union[PromptEmbeddingCache, None] = None,
+    num_images_per_prompt: int = 1,
+    **kwargs
+) -> List[Image.Image]:
+    """
+    One pipeline call for many prompts, images come back in prompt order,
+    num_images_per_prompt consecutive ones per prompt.
+    
+    A missing negative prompt is sent as "", which is what the pipeline uses
+    for the unconditional branch anyway. Items without a seed get a random one,
+    the images of a seeded prompt use seed, seed + 1, ...
+    With embedding_cache, repeated prompts skip the text encoder.
+    """
+    if negative_prompts is not None:
+        negative_prompts = [n or "" for n in negative_prompts]
+        
+        # All empty, let the pipeline take its own path
+        if not any(negative_prompts):
+            negative_prompts = None
+    
+    generators = None
+    if seeds is not None and any(seed is not None for seed in seeds):
+        generators = []
+        for seed in seeds:
+            for variant in range(num_images_per_prompt):
+                generator = torch.Generator(device=pipe.device)
+                if seed is None:
+                    generator.seed()
+                else:
+                    generator.manual_seed(int(seed) + variant)
+                generators.append(generator)
+    
+    if embedding_cache is not None:
+        # Both branches as embeddings, the pipeline skips its text encoder
+        out = pipe(
+            prompt_embeds=embedding_cache.embed(pipe, prompts),
+            negative_prompt_embeds=embedding_cache.embed(pipe, negative_prompts or [""] * len(prompts)),
+            generator=generators,
+            num_images_per_prompt=num_images_per_prompt,
+            **kwargs
+        )
+        return out.images
+    
+    out = pipe(
+        prompt=list(prompts),
+        negative_prompt=negative_prompts,
+        generator=generators,
+        num_images_per_prompt=num_images_per_prompt,
+        **kwargs
+    )
+    return out.images
+
+def generate_variants(
+    pipe: StableDiffusionPipeline,
+    prompts: Sequence[str],
+    num_variants: Sequence[int],
+    negative_prompts: Sequence[Union[str, None]] = None,
+    seeds: Sequence[Union[int, None]] = None,
+    **kwargs
+) -> List[List[Image.Image]]:
+    """
+    num_variants[i] images of prompts[i], all from one pipeline call.
+    
+    Equal counts use num_images_per_prompt, mixed counts repeat the prompts
+    instead, the embedding cache makes the repeats free.
+    """
+    counts = [int(n) for n in num_variants]
+    if len(set(counts)) == 1:
+        images = generate_batch(
+            pipe,
+            prompts,
+            negative_prompts=negative_prompts,
+            seeds=seeds,
+            num_images_per_prompt=counts[0],
+            **kwargs
+        )
+    else:
+        repeated = lambda values: [value for value, n in zip(values, counts) for _ in range(n)]
+        images = generate_batch(
+            pipe,
+            repeated(prompts),
+            negative_prompts=None if negative_prompts is None else repeated(negative_prompts),
+            seeds=None if seeds is None else [
+                None if seed is None else int(seed) + variant
+                for seed, n in zip(seeds, counts) for variant in range(n)
+            ],
+            **kwargs
+        )
     
-    return pipe
\ No newline at end of file
+    variants, start = [], 0
+    for n in counts:
+        variants.append(images[start:start + n])
+        start += n
+    return variants
@@ -0,0 +1,172 @@
+# Base
+import json
+import time
+import random
+from typing import Sequence
+
+# Local
+from .aws.queue import SQSHelper
+from .scheduling import FairScheduler, ScheduledTask
+
+class TransientError(Exception):
+    """
+    Failure that is expected to go away on retry (network, throttling, OOM).
+    """
+
+class PoisonTaskError(Exception):
+    """
+    Failure caused by the task itself, retrying will not help.
+    """
+
+# Error classes, matched by name to avoid importing torch/botocore here
+TRANSIENT_ERROR_NAMES = {
+    "OutOfMemoryError",
+    "EndpointConnectionError",
+    "ConnectTimeoutError",
+    "ReadTimeoutError",
+    "ConnectionClosedError",
+    "ThrottlingException",
+    "BrokenProcessPool"
+}
+
+def classify_error(error: Exception) -> str:
+    if isinstance(error, PoisonTaskError):
+        return "permanent"
+    if isinstance(error, (TransientError, ConnectionError, TimeoutError)):
+        return "transient"
+    if type(error).__name__ in TRANSIENT_ERROR_NAMES:
+        return "transient"
+    if isinstance(error, RuntimeError) and "out of memory" in str(error).lower():
+        return "transient"
+    return "permanent"
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        max_receives: int = 12,
+        base_delay_s: float = 10,
+        max_delay_s: float = 900
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.max_receives = max_receives
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+
+    def delay(self, attempt: int) -> int:
+        """
+        Exponential backoff with jitter, attempt starts at 1.
+        """
+        delay = self.base_delay_s * (2 ** max(0, attempt - 1))
+        delay = min(delay, self.max_delay_s)
+        delay *= random.uniform(0.5, 1.0)
+        return int(max(1, delay))
+
+class TaskFailureHandler:
+    """
+    Decides what happens to a task that raised: retry it with backoff,
+    or move it to the dead-letter queue and report it as failed.
+
+    Attempts are counted by the retries that re-send the task, receives
+    that never ran it do not use any up. Tasks that crash the worker never
+    get to retry, they are given up once their SQS receive count passes
+    max_receives.
+    """
+    def __init__(
+        self,
+        result_queue: SQSHelper,
+        dead_letter_queue: SQSHelper,
+        policy: RetryPolicy = None
+    ) -> None:
+        self.result_queue = result_queue
+        self.dead_letter_queue = dead_letter_queue
+        self.policy = RetryPolicy() if policy is None else policy
+
+    def _error_info(
+        self,
+        task: ScheduledTask,
+        error: Exception,
+        kind: str
+    ) -> dict:
+        return {
+            "class": type(error).__name__,
+            "kind": kind,
+            "message": str(error),
+            "attempts": task.attempt,
+            "receives": task.receive_count
+        }
+
+    def exhausted(self, task: ScheduledTask) -> bool:
+        """
+        Received more often than releases and crashes explain, the task
+        keeps taking down the worker.
+        """
+        return task.receive_count > self.policy.max_receives
+
+    def handle(
+        self,
+        scheduler: FairScheduler,
+        task: ScheduledTask,
+        task_type: str,
+        error: Exception,
+        also_failed: Sequence[str] = ()
+    ) -> bool:
+        """
+        Args:
+            also_failed: task types the task completes too, reported failed
+                with it when it is given up
+
+        Returns:
+            True if the task will be retried
+        """
+        kind = classify_error(error)
+
+        # Retry
+        if kind == "transient" and task.attempt < self.policy.max_attempts:
+            delay = self.policy.delay(task.attempt)
+            print(f"Retrying {task_type} task in {delay}s (attempt {task.attempt}): {error}")
+            scheduler.retry(task, delay)
+            return True
+
+        # Dead-letter
+        error_info = self._error_info(task, error, kind)
+        print(f"Moving {task_type} task to dead-letter queue: {error_info}")
+        try:
+            self.dead_letter_queue.send_message(json.dumps({
+                "queue": scheduler.base_name,
+                "task_type": task_type,
+                "body": task.message.body,
+                "error": error_info,
+                "failed_at": time.time()
+            }))
+        except Exception as e:
+            # Keep the task, it fails again and is dead-lettered later
+            print(f"Failed to dead-letter {task_type} task, releasing it: {e}")
+            scheduler.release(task, self.policy.delay(task.attempt))
+            return True
+        try:
+            scheduler.delete(task)
+        except Exception as e:
+            print(f"Failed to delete dead-lettered message: {e}")
+        for failed_type in [task_type, *also_failed]:
+            self.report(task, failed_type, error_info)
+        return False
+
+    def report(
+        self,
+        task: ScheduledTask,
+        task_type: str,
+        error_info: dict
+    ):
+        """
+        Failed result message, unless the message has no project to report on.
+        """
+        if task.project_id is None:
+            return
+        self.result_queue.send_message(json.dumps({
+            "project_id": task.project_id,
+            "task_type": task_type,
+            "status": "failed",
+            "error": error_info,
+            **task.result_fields()
+        }))
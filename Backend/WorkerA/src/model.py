@@ -1,36 +1,158 @@
 # Base
 import io
 import json
-import zipfile
-from pathlib import Path
+import time
+import uuid
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Sequence, Tuple, Union
 
 # Third-party
-import cv2
 import numpy as np
-import open3d as o3d
 
 # Local
-from . import depth, diffusion, utils
+from . import depth, diffusion, utils, artifacts, perspective
 from .data_key import DataKey
 from .aws.storage import S3Helper
-from .aws.queue import SQSHelper, QueueMessage
+from .aws.queue import SQSHelper
 from .aws.credentials import AWSCredentials
+from .scheduling import FairScheduler, ScheduledTask, DEFAULT_LANE_WEIGHTS
+from .roles import ROLES, WorkerCapabilities, RoleThroughput, CapabilityAdvertiser
+from .batching import DynamicBatcher
+from .loading import ModelHandle
+from .residency import ResidencyManager
+from .stages import Job, Stage, StagePipeline
+from .polling import PolledQueue, QueuePoller
+from .postprocess import PostProcessPool
+from .failures import TaskFailureHandler, TransientError, PoisonTaskError
+
+# Task type -> role serving it
+TASK_ROLES = { task_type: role for role, task_type in ROLES.items() }
+
+# Fused task type -> task types it completes, reported separately to the server
+FUSED_TASKS = { "imesh_gen": ["image_gen", "pmesh_gen"] }
 
 class MeshGenServerModel:
     def __init__(
         self,
         credentials: AWSCredentials = None,
-        temp_dir: Path = "data/temp",
-        wait_time: int = 2
+        wait_time: int = 2,
+        image_queue_weight: float = 1.0,
+        mesh_queue_weight: float = 1.0,
+        queue_prefetch: int = 1,
+        image_batch_size: int = 1,
+        image_batch_deadline_s: float = 0.5,
+        max_variants: int = 8,
+        prompt_cache_entries: int = 512,
+        prompt_cache_mb: int = 128,
+        mesh_batch_size: int = 1,
+        mesh_batch_deadline_s: float = 0.2,
+        mesh_resolution: int = 256,
+        pointcloud_max_points: int = 1 << 16,
+        mesh_lod_tolerances: Sequence[float] = (),
+        io_workers: int = 4,
+        cpu_workers: int = 2,
+        postprocess_processes: int = 2,
+        stage_capacity: int = 4,
+        report_interval_s: float = 60,
+        mde_encoder: str = "vitl",
+        mde_device: str = "cuda",
+        mde_backend: str = "torch",
+        mde_acceleration: Sequence[str] = (),
+        mde_tile_above: Union[int, None] = None,
+        mde_tile_size: int = 518,
+        sd_memory_modes: Sequence[str] = (),
+        vram_budget_gb: Union[float, None] = None,
+        pin_memory: bool = True,
+        roles: Sequence[str] = ("image", "perspective"),
+        lanes: Sequence[str] = None,
+        advertise_interval_s: float = 30
     ) -> None:
-        self.temp_dir = Path(temp_dir)
-        self.temp_dir.mkdir(parents=True, exist_ok=True)
-        
         self.wait_time = wait_time
         
+        # Queues are polled concurrently, ready batches dispatched by weight.
+        # queue_prefetch bounds the batches the poller holds and the messages
+        # every scheduler lane buffers, the rest stay for other workers
+        self.queue_weights = { "image_gen": image_queue_weight, "pmesh_gen": mesh_queue_weight }
+        self.queue_prefetch = queue_prefetch
+        
+        # Only the models and queues of these roles are set up
+        self.roles = list(roles)
+        for role in self.roles:
+            if role not in ["image", "perspective"]:
+                raise ValueError(f"Role {role} is not served by this worker")
+        
+        # Lanes to consume, e.g. CPU nodes leave interactive to GPU nodes
+        self.lane_weights = {
+            priority: weight
+            for priority, weight in DEFAULT_LANE_WEIGHTS.items()
+            if lanes is None or priority.lane in lanes
+        }
+        self.capabilities = WorkerCapabilities(
+            self.roles,
+            device=mde_device,
+            encoder=mde_encoder if "perspective" in self.roles else None,
+            backend=mde_backend if "perspective" in self.roles else None,
+            lanes=lanes
+        )
+        self.throughput = RoleThroughput()
+        self.advertise_interval_s = advertise_interval_s
+        
+        # Tasks acknowledged without running, their outputs existed
+        self.skipped_existing = 0
+        
+        # Depth model, ONNX backends serve perspective meshes on CPU nodes
+        self.mde_encoder = mde_encoder
+        self.mde_device = mde_device
+        self.mde_backend = mde_backend
+        self.mde_acceleration = list(mde_acceleration)
+        
+        # Uploads with a longer side are inferred at native resolution in tiles
+        self.mde_tile_above = mde_tile_above
+        self.mde_tile_size = mde_tile_size
+        
+        # Image tasks gathered into one pipeline call
+        self.image_batch_size = image_batch_size
+        self.image_batch_deadline_s = image_batch_deadline_s
+        self.max_variants = max_variants
+        
+        # Text embeddings of repeated prompts, 0 entries disables the cache
+        self.prompt_cache = None
+        if prompt_cache_entries > 0:
+            self.prompt_cache = diffusion.PromptEmbeddingCache(
+                max_entries=prompt_cache_entries,
+                max_bytes=prompt_cache_mb << 20
+            )
+        
+        # P-mesh tasks gathered into shared depth forward passes
+        self.mesh_batch_size = mesh_batch_size
+        self.mesh_batch_deadline_s = mesh_batch_deadline_s
+        self.mesh_resolution = mesh_resolution
+        self.pointcloud_max_points = pointcloud_max_points
+        
+        # Adaptive levels of detail, depth tolerance as a fraction of the range
+        self.mesh_lod_tolerances = list(mesh_lod_tolerances)
+        
+        # Pipeline stages
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers
+        self.postprocess_processes = postprocess_processes
+        self.stage_capacity = stage_capacity
+        self.report_interval_s = report_interval_s
+        
+        # GPU residency of the models, idle ones go to host memory under a budget.
+        # Both models live on the worker's device, e.g. cuda:1 or cpu
+        self.sd_memory_modes = list(sd_memory_modes)
+        self.residency = ResidencyManager(mde_device, budget_gb=vram_budget_gb, pin_memory=pin_memory)
+        
         self.setup_aws(credentials)
-        self.setup_sd()
-        self.setup_mde()
+        self.model_handles: List[ModelHandle] = []
+        if "image" in self.roles:
+            self.setup_sd()
+        if "perspective" in self.roles:
+            self.setup_mde()
+        self.setup_pipeline()
+        self.setup_polling()
     
     def setup_aws(
         self,
@@ -43,209 +165,605 @@ class MeshGenServerModel:
             credentials=credentials
         )
         
-        # SQS
-        self.sqs_image_gen = SQSHelper(
-            "mg-image-queue",
+        # SQS (priority lanes, fair per tenant), only for served roles
+        self.sqs_image_gen = None
+        self.sqs_perspective_gen = None
+        if "image" in self.roles:
+            self.sqs_image_gen = FairScheduler(
+                "mg-image-queue",
+                region="eu-central-1",
+                credentials=credentials,
+                lane_weights=self.lane_weights,
+                prefetch=self.queue_prefetch,
+                wait_time=self.wait_time
+            )
+        if "perspective" in self.roles:
+            self.sqs_perspective_gen = FairScheduler(
+                "mg-perspective-gen",
+                region="eu-central-1",
+                credentials=credentials,
+                lane_weights=self.lane_weights,
+                prefetch=self.queue_prefetch,
+                wait_time=self.wait_time
+            )
+        self.sqs_result = SQSHelper(
+            "mg-result-queue",
             region="eu-central-1",
             credentials=credentials
         )
-        self.sqs_perspective_gen = SQSHelper(
-            "mg-perspective-gen",
+        self.sqs_dead_letter = SQSHelper(
+            "mg-dead-letter",
             region="eu-central-1",
             credentials=credentials
         )
-        self.sqs_result = SQSHelper(
-            "mg-result-queue",
-            region="eu-central-1",
-            credentials=credentials
+        
+        # Retries and dead-lettering of failed tasks
+        self.failures = TaskFailureHandler(self.sqs_result, self.sqs_dead_letter)
+        
+        self.task_queues = {
+            "image_gen": self.sqs_image_gen,
+            "pmesh_gen": self.sqs_perspective_gen,
+            "imesh_gen": self.sqs_image_gen
+        }
+        
+        # Capabilities and per-role throughput, for routing and reporting on the server
+        self.advertiser = CapabilityAdvertiser(
+            self.sqs_result,
+            self.capabilities,
+            self.throughput,
+            counters=self.duplicate_counters,
+            interval_s=self.advertise_interval_s
         )
     
     def setup_sd(self):
-        self.sd = diffusion.load_2_1()
+        # Loads in the background, image tasks are taken once it is ready
+        self.sd_handle = ModelHandle(
+            "stable-diffusion-2-1",
+            lambda: self.residency.register_pipeline("sd", diffusion.load_2_1(
+                device=self.residency.load_device(),
+                torch_dtype=diffusion.dtype_for(self.mde_device),
+                memory_modes=self.sd_memory_modes
+            )),
+            warmup=self._warmup_sd
+        ).start()
+        self.model_handles.append(self.sd_handle)
     
     def setup_mde(self):
-        self.mde = depth.DepthAnythingFacade(
-            encoder="vitl",
-            device="cuda"
+        # Loads in the background, p-mesh tasks are taken once it is ready
+        self.mde_handle = ModelHandle(
+            f"depth-anything-{self.mde_encoder}",
+            lambda: self._register_mde(depth.DepthAnythingFacade(
+                encoder=self.mde_encoder,
+                device=self.mde_device,
+                backend=self.mde_backend,
+                acceleration=self.mde_acceleration
+            )),
+            warmup=lambda mde: self._infer_depth(mde, np.zeros((518, 518, 3), dtype=np.uint8))
+        ).start()
+        self.model_handles.append(self.mde_handle)
+        
+        # Concurrent depth requests share forward passes, items are (image, size)
+        self.mde_batcher = DynamicBatcher(
+            lambda items: self._infer_depth_batch(
+                [image for image, _ in items],
+                [size for _, size in items]
+            ),
+            max_batch_size=self.mesh_batch_size,
+            max_wait_s=0.02,
+            name="mde-batcher"
+        )
+    
+    def _warmup_sd(self, pipe):
+        with self.residency.use("sd"):
+            diffusion.warmup(pipe)
+    
+    def _register_mde(
+        self,
+        mde: depth.DepthAnythingFacade
+    ) -> depth.DepthAnythingFacade:
+        # Torch depth on the GPU shares the budget, ONNX and CPU models stay put
+        if self.mde_backend == "torch" and self.mde_device.startswith("cuda"):
+            self.residency.register("depth", getattr(mde.model, "eager", mde.model))
+        return mde
+    
+    def _depth_scope(self):
+        if "depth" in self.residency.modules:
+            return self.residency.use("depth")
+        return nullcontext()
+    
+    def _infer_depth(
+        self,
+        mde: depth.DepthAnythingFacade,
+        image: np.ndarray
+    ) -> np.ndarray:
+        with self._depth_scope():
+            return mde(image)
+    
+    def _infer_depth_batch(
+        self,
+        images: List[np.ndarray],
+        sizes: List[Union[Tuple[int, int], None]]
+    ) -> List[np.ndarray]:
+        with self._depth_scope():
+            return self.mde.infer_batch(images, max_batch_size=self.mesh_batch_size, sizes=sizes)
+    
+    @property
+    def sd(self):
+        return self.sd_handle.get()
+    
+    @property
+    def mde(self) -> depth.DepthAnythingFacade:
+        return self.mde_handle.get()
+    
+    def setup_pipeline(self):
+        # Meshing off the inference process, 0 processes keeps it in the stage threads
+        self.postprocess = PostProcessPool(self.postprocess_processes if "perspective" in self.roles else 0)
+        self.postprocess.warmup()
+        
+        # Images of fused tasks upload while their depth and mesh are computed
+        self.image_upload_executor = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="image-upload")
+        
+        # GPU stages are fed by I/O and CPU stages running in parallel
+        self.pipeline = StagePipeline(
+            stages=[
+                Stage("download", self._stage_download, workers=self.io_workers, capacity=self.stage_capacity),
+                Stage("diffusion", self._stage_diffusion, workers=1, capacity=self.stage_capacity),
+                # One worker per batch slot, the batcher merges their requests
+                Stage("depth", self._stage_depth, workers=self.mesh_batch_size, capacity=self.stage_capacity),
+                Stage("encode", self._stage_encode, workers=self.cpu_workers, capacity=self.stage_capacity),
+                # Threads wait on the post-processing processes, one per process keeps them busy
+                Stage("meshing", self._stage_meshing, workers=max(self.cpu_workers, self.postprocess_processes), capacity=self.stage_capacity),
+                Stage("upload", self._stage_upload, workers=self.io_workers, capacity=self.stage_capacity)
+            ],
+            routes={
+                "image_gen": ["diffusion", "encode", "upload"],
+                "pmesh_gen": ["download", "depth", "meshing", "upload"],
+                # Image and perspective mesh in one task, the image never leaves memory
+                "imesh_gen": ["diffusion", "encode", "depth", "meshing", "upload"]
+            },
+            on_error=self._on_job_error
         )
     
-    # Private (Image)
+    def setup_polling(self):
+        # Only queues whose model is loaded are polled
+        queues = []
+        if "image" in self.roles:
+            queues.append(PolledQueue(
+                "image_gen",
+                self.sqs_image_gen,
+                max_tasks=self.image_batch_size,
+                deadline_s=self.image_batch_deadline_s,
+                weight=self.queue_weights["image_gen"],
+                prefetch=self.queue_prefetch,
+                enabled=lambda: self.sd_handle.ready
+            ))
+        if "perspective" in self.roles:
+            queues.append(PolledQueue(
+                "pmesh_gen",
+                self.sqs_perspective_gen,
+                max_tasks=self.mesh_batch_size,
+                deadline_s=self.mesh_batch_deadline_s,
+                weight=self.queue_weights["pmesh_gen"],
+                prefetch=self.queue_prefetch,
+                enabled=lambda: self.mde_handle.ready
+            ))
+        self.poller = QueuePoller(queues)
+    
+    # Private (Receive)
     ################################################################
     
-    def _run_image_generation(self):
+    def _run_image_generation(self, tasks: List[ScheduledTask]):
         try:
-            self.__run_image_generation()
+            self.__run_image_generation(tasks)
         except Exception as e:
             print(f"Error in image generation: {e}")
     
-    def __run_image_generation(self):
-        print(f"Looking for image generation tasks")
-        tasks = self.sqs_image_gen.receive_messages(
-            max_messages=1,
-            wait_time=self.wait_time
-        )
+    def __run_image_generation(self, tasks: List[ScheduledTask]):
         print(f"Read {len(tasks)} tasks from image queue")
         
+        # Parse
+        valid_tasks, batch, kinds = [], [], []
         for task in tasks:
-            task_data = task.body_json()
-            print(f"Task data: {task_data}")
-
             try:
-                print("Inferencing")
-                out = self.sd(
-                    prompt=task_data["positive_prompt"],
-                    negative_prompt=task_data["negative_prompt"]
-                )
-                image_pil = out.images[0]
-
-                print("Writing image to buffer")
-                image_bytes = io.BytesIO()
-                image_pil.save(image_bytes, format="PNG")
-                image_bytes.seek(0)
+                task_data = self._parse_task(task)
+                kind = "imesh_gen" if self._fuses(task_data) else "image_gen"
+                if self._skip_if_done(kind, task, task_data):
+                    continue
                 
-                print("Saving image")
-                self.s3_storage.upload_file(
-                    DataKey.image(task_data["project_id"]),
-                    image_bytes
-                )
+                task_data["positive_prompt"] = str(task_data["positive_prompt"])
+                task_data["num_variants"] = min(max(int(task_data.get("num_variants") or 1), 1), self.max_variants)
+                if kind == "imesh_gen" and task_data.get("seed") is None:
+                    # A retry must reproduce the image already reported
+                    task_data["seed"] = uuid.UUID(task_data["project_id"]).int % (1 << 31)
+                valid_tasks.append(task)
+                batch.append(task_data)
+                kinds.append(kind)
             
             except Exception as e:
                 print(f"Failed to process image task: {e}")
-            
-            finally:
-                print("Deleting message")
-                self.sqs_image_gen.delete_message(task.receipt_handle)
-                
-                # Send result message
-                message = json.dumps({
-                    "project_id": task_data["project_id"],
-                    "task_type": "image_gen"
-                })
-                self.sqs_result.send_message(message)
-    
-    # Private (Mesh)
-    ################################################################
+                self.failures.handle(self.sqs_image_gen, task, "image_gen", e)
+        
+        # The whole batch shares one pipeline call
+        if len(valid_tasks) > 0:
+            self.pipeline.submit(Job("image_gen", valid_tasks, batch=batch, kinds=kinds))
     
-    def _run_mesh_generation(self):
+    def _run_mesh_generation(self, tasks: List[ScheduledTask]):
         try:
-            self.__run_mesh_generation()
+            self.__run_mesh_generation(tasks)
         except Exception as e:
             print(f"Error in mesh generation: {e}")
     
-    def __run_mesh_generation(self):
-        print(f"Looking for mesh generation tasks")
-        tasks = self.sqs_perspective_gen.receive_messages(
-            max_messages=1,
-            wait_time=self.wait_time
-        )
+    def __run_mesh_generation(self, tasks: List[ScheduledTask]):
         print(f"Read {len(tasks)} tasks from p-mesh queue")
         
         for task in tasks:
-            task_data = task.body_json()
-            print(f"Task data: {task_data}")
-
             try:
-                print("Loading image")
-                image_bytes = self.s3_storage.download_file(
-                    DataKey.image(task_data["project_id"])
-                )
-                
-                image_pil = utils.open_image(image_bytes, mode="RGB")
-                image_np = np.array(image_pil)
-                
-                print("Inferencing")
-                depth_map = self.mde(image_np)
-
-                print("Reconstructing")
-                textured_mesh = self.generate_textured_mesh(image_np, depth_map, resolution=256)
-                texturless_mesh = self.create_texturless_mesh(textured_mesh)
-                
-                print("Saving textured mesh")
-                buffer = self.mesh_to_zip(textured_mesh)
-                self.s3_storage.upload_file(
-                    DataKey.mesh(task_data["project_id"], perspective=True, textured=True),
-                    buffer
-                )
-                
-                print("Saving mesh")
-                buffer = self.mesh_to_zip(texturless_mesh)
-                self.s3_storage.upload_file(
-                    DataKey.mesh(task_data["project_id"], perspective=True, textured=False),
-                    buffer
-                )
-            
+                task_data = self._parse_task(task)
+                if self._skip_if_done("pmesh_gen", task, task_data):
+                    continue
             except Exception as e:
                 print(f"Failed to process p-mesh task: {e}")
+                self.failures.handle(self.sqs_perspective_gen, task, "pmesh_gen", e)
+                continue
             
-            finally:
-                print("Deleting message")
-                self.sqs_perspective_gen.delete_message(task.receipt_handle)
-                
-                # Send result message
-                message = json.dumps({
-                    "project_id": task_data["project_id"],
-                    "task_type": "pmesh_gen"
-                })
-                self.sqs_result.send_message(message)
-    
-    def generate_textured_mesh(
+            self.pipeline.submit(Job("pmesh_gen", [task], task_data=task_data))
+    
+    def _fuses(
         self,
-        image: np.ndarray,
-        depth_map: np.ndarray,
-        resolution: int = 512
-    ) -> o3d.geometry.TriangleMesh:
-        depth_map = cv2.resize(
-            depth_map.astype(np.float32),
-            (resolution, resolution)
+        task_data: dict
+    ) -> bool:
+        """
+        Mesh requested with the image, and this worker can do it. Otherwise
+        the server queues the mesh once the image is reported.
+        """
+        return (
+            bool(task_data.get("perspective_mesh", False))
+            and "perspective" in self.roles
+            and self.mde_handle.ready
         )
-        mask = depth_map > 5
-        depth_map /= -200
+    
+    def _mesh_resolution(
+        self,
+        task_data: dict
+    ) -> int:
+        return task_data.get("resolution") or self.mesh_resolution
+
+    def _parse_task(
+        self,
+        task: ScheduledTask
+    ) -> dict:
+        # Task crashed the worker on earlier attempts
+        if self.failures.exhausted(task):
+            raise PoisonTaskError(f"Gave up after {task.receive_count - 1} receives without finishing")
         
-        v_grid, v_num = depth.create_pixel_vertice_mapping(mask)
-        mesh = depth.create_mesh(image, depth_map, v_grid, v_num)
+        task_data = task.body_json()
+        print(f"Task data: {task_data}")
+        return task_data
+    
+    def _output_keys(
+        self,
+        task_type: str,
+        task_data: dict
+    ) -> List[str]:
+        if task_type in FUSED_TASKS:
+            return [key for fused in FUSED_TASKS[task_type] for key in self._output_keys(fused, task_data)]
+        
+        project_id = task_data["project_id"]
+        if task_type == "image_gen":
+            num_variants = int(task_data.get("num_variants") or 1)
+            variants = [DataKey.image(project_id, i) for i in range(num_variants)] if num_variants > 1 else []
+            return [DataKey.image(project_id)] + variants
         
-        # Center mesh
-        mesh.translate(-mesh.get_center())
+        resolution = task_data.get("resolution")
+        return [
+            DataKey.mesh(project_id, perspective=True, textured=textured, resolution=resolution)
+            for textured in [True, False]
+        ]
+    
+    def _skip_if_done(
+        self,
+        task_type: str,
+        task: ScheduledTask,
+        task_data: dict
+    ) -> bool:
+        """
+        Acknowledge without running when all outputs exist already, e.g. the
+        message came back while another worker was finishing it.
+        """
+        keys = self._output_keys(task_type, task_data)
+        if not all(self.s3_storage.file_exists(key) for key in keys):
+            return False
+        
+        print(f"Outputs of {task_type} task exist, skipping")
+        self.skipped_existing += 1
+        self._acknowledge(task_type, task, task_data)
+        return True
+    
+    def _send_result(
+        self,
+        task_type: str,
+        task: ScheduledTask,
+        task_data: dict,
+        **fields
+    ):
+        message = json.dumps({
+            "project_id": task_data["project_id"],
+            "task_type": task_type,
+            "status": "done",
+            **task.result_fields(),
+            **fields
+        })
+        self.sqs_result.send_message(message)
         
-        return mesh
+        self.throughput.record(TASK_ROLES[task_type])
     
-    def create_texturless_mesh(
+    def _acknowledge(
         self,
-        textured_mesh: o3d.geometry.TriangleMesh
-    ) -> o3d.geometry.TriangleMesh:
-        mesh = o3d.geometry.TriangleMesh()
-        mesh.vertices = textured_mesh.vertices
-        mesh.triangles = textured_mesh.triangles
-        return mesh
-    
-    def mesh_to_zip(
+        task_type: str,
+        task: ScheduledTask,
+        task_data: dict,
+        reported: Sequence[str] = None
+    ):
+        """
+        Delete the message and report every task type it completes, except
+        the ones reported already.
+        """
+        print("Deleting message")
+        self.task_queues[task_type].delete(task)
+        
+        fused = task_type in FUSED_TASKS
+        for result_type in FUSED_TASKS.get(task_type, [task_type]):
+            if reported is None or result_type not in reported:
+                self._send_result(result_type, task, task_data, fused=fused)
+    
+    def _on_job_error(
         self,
-        mesh: o3d.geometry.TriangleMesh
+        job: Job,
+        error: Exception
     ):
-        # Clean temp dir
-        for file_p in self.temp_dir.glob("*"):
-            file_p.unlink()
-        
-        # Save to temp dir
-        mesh_p = self.temp_dir / "mesh.obj"
-        o3d.io.write_triangle_mesh(str(mesh_p), mesh)
-        
-        # Write to zip
-        files_p = list(self.temp_dir.glob("*"))
-        buffer = io.BytesIO()
-        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            for file_p in files_p:
-                zip_file.write(file_p, file_p.name)
-                file_p.unlink()
-        
-        # Return
-        buffer.seek(0)
-        return buffer
+        if job.kind not in FUSED_TASKS:
+            for task in job.tasks:
+                self.failures.handle(self.task_queues[job.kind], task, job.kind, error)
+            return
+        
+        # The image may have been reported while the mesh failed
+        if "image_upload" in job.data:
+            wait([job.data["image_upload"]])
+        failed = [
+            task_type for task_type in FUSED_TASKS[job.kind]
+            if task_type not in job.data.get("reported", [])
+        ]
+        for task in job.tasks:
+            self.failures.handle(self.task_queues[job.kind], task, failed[-1], error, also_failed=failed[:-1])
+    
+    # Private (Stages)
+    ################################################################
+    
+    def _stage_download(self, job: Job) -> Job:
+        print("Loading image")
+        image_bytes = self.s3_storage.download_file(
+            DataKey.image(job.data["task_data"]["project_id"])
+        )
+        if image_bytes is None:
+            raise TransientError("Failed to download image")
+        
+        image_pil = utils.open_image(image_bytes, mode="RGB")
+        job.data["image"] = np.array(image_pil)
+        
+        # Depth of an earlier run, re-meshing skips inference
+        depth_key = DataKey.depth(job.data["task_data"]["project_id"])
+        if self.s3_storage.file_exists(depth_key):
+            depth_bytes = self.s3_storage.download_file(depth_key)
+            if depth_bytes is not None:
+                print("Loaded stored depth")
+                job.data["depth"] = artifacts.depth_from_png(depth_bytes)
+                job.data["depth_stored"] = True
+        return job
+    
+    def _stage_diffusion(self, job: Job) -> List[Job]:
+        batch = job.data["batch"]
+        
+        print(f"Inferencing batch of {len(batch)}")
+        # The text encoder is left to load on demand, cached prompts skip it
+        with self.residency.use("sd.unet", "sd.vae"):
+            variants = diffusion.generate_variants(
+                self.sd,
+                prompts=[task_data["positive_prompt"] for task_data in batch],
+                num_variants=[task_data.get("num_variants", 1) for task_data in batch],
+                negative_prompts=[task_data.get("negative_prompt") for task_data in batch],
+                seeds=[task_data.get("seed") for task_data in batch],
+                embedding_cache=self.prompt_cache
+            )
+        
+        # Fan out, the remaining stages run per task and fused tasks go on to depth
+        return [
+            Job(kind, [task], task_data=task_data, variants=images)
+            for task, task_data, images, kind in zip(job.tasks, batch, variants, job.data["kinds"])
+        ]
+    
+    def _stage_depth(self, job: Job) -> Job:
+        if "depth" in job.data:
+            return job
+        
+        # Image-sized depth, it is stored for re-meshing at any resolution
+        print("Inferencing")
+        image = job.data["image"]
+        if self.mde_tile_above is not None and max(image.shape[:2]) > self.mde_tile_above:
+            with self._depth_scope():
+                job.data["depth"] = self.mde.infer_tiled(
+                    image,
+                    tile_size=self.mde_tile_size,
+                    max_batch_size=self.mesh_batch_size
+                )
+        else:
+            # Mesh grid depth from the same pass, interpolated on the device
+            resolution = self._mesh_resolution(job.data["task_data"])
+            job.data["depth"], job.data["grid_depth"] = self.mde_batcher(
+                (image, [image.shape[:2], (resolution, resolution)])
+            )
+        return job
+    
+    def _stage_encode(self, job: Job) -> Job:
+        print("Writing image to buffer")
+        project_id = job.data["task_data"]["project_id"]
+        variants = job.data["variants"]
+        
+        encoded = []
+        for image_pil in variants:
+            image_bytes = io.BytesIO()
+            image_pil.save(image_bytes, format="PNG")
+            encoded.append(image_bytes.getvalue())
+        
+        # The first variant is the project image until the client selects another
+        job.data["uploads"] = [(DataKey.image(project_id), io.BytesIO(encoded[0]))]
+        if len(variants) > 1:
+            job.data["uploads"] += [(DataKey.image(project_id, i), io.BytesIO(data)) for i, data in enumerate(encoded)]
+        
+        if job.kind == "imesh_gen":
+            # Depth gets the decoded image, the PNGs upload in the background
+            job.data["image"] = np.asarray(variants[0])
+            job.data["image_upload"] = self.image_upload_executor.submit(
+                self._upload_images,
+                job,
+                job.data.pop("uploads")
+            )
+        return job
+    
+    def _stage_meshing(self, job: Job) -> Job:
+        task_data = job.data["task_data"]
+        
+        # Requested resolution gets its own artifacts, the default keeps the plain keys
+        key_resolution = task_data.get("resolution")
+        
+        # Image and depth go to a post-processing process through shared memory,
+        # stored depth has no grid depth and is resized there
+        arrays = [job.data["image"], job.data["depth"]]
+        if "grid_depth" in job.data:
+            arrays.append(job.data["grid_depth"])
+        uploads = self.postprocess.run(
+            perspective.perspective_artifacts,
+            arrays,
+            project_id=task_data["project_id"],
+            resolution=self._mesh_resolution(task_data),
+            key_resolution=key_resolution,
+            lod_tolerances=self.mesh_lod_tolerances,
+            pointcloud_max_points=self.pointcloud_max_points,
+            store_depth=not job.data.get("depth_stored", False)
+        )
+        job.data["uploads"] = [(key, io.BytesIO(data)) for key, data in uploads]
+        return job
+    
+    def _upload(
+        self,
+        uploads: List[Tuple[str, io.BytesIO]]
+    ) -> bool:
+        print(f"Saving {len(uploads)} artifacts")
+        uploaded = True
+        for key, buffer in uploads:
+            uploaded &= self.s3_storage.upload_file(key, buffer)
+        return uploaded
+    
+    def _upload_images(
+        self,
+        job: Job,
+        uploads: List[Tuple[str, io.BytesIO]]
+    ) -> bool:
+        """
+        Images of a fused task, reported done before its mesh is.
+        """
+        if not self._upload(uploads):
+            return False
+        self._send_result("image_gen", job.tasks[0], job.data["task_data"], fused=True)
+        job.data["reported"] = ["image_gen"]
+        return True
+    
+    def _stage_upload(self, job: Job):
+        uploaded = self._upload(job.data["uploads"])
+        if "image_upload" in job.data:
+            uploaded &= job.data["image_upload"].result()
+        if not uploaded:
+            raise TransientError("Failed to upload artifacts")
+        
+        self._acknowledge(job.kind, job.tasks[0], job.data["task_data"], reported=job.data.get("reported"))
     
     # Public
     ################################################################
     
+    def duplicate_counters(self) -> Dict[str, int]:
+        counters = { "skipped_existing": self.skipped_existing, "redelivered": 0, "lease_lost": 0, "heartbeats": 0 }
+        for scheduler in [self.sqs_image_gen, self.sqs_perspective_gen]:
+            if scheduler is None:
+                continue
+            for name in ["redelivered", "lease_lost", "heartbeats"]:
+                counters[name] += scheduler.counters[name]
+        return counters
+    
+    def report(self):
+        for name, stats in self.pipeline.report().items():
+            print(
+                f"Stage {name}: {stats['utilization']:.0%} busy, "
+                f"{stats['queued']} queued, {stats['processed']} processed, {stats['failed']} failed"
+            )
+        
+        for handle in self.model_handles:
+            print(f"Model {handle.name}: {handle.describe()}")
+        
+        for role, stats in self.throughput.summary().items():
+            print(f"Role {role}: {stats['completed']} completed, {stats['per_min']:.1f} per min")
+        
+        if self.postprocess.processes > 0:
+            stats = self.postprocess.report()
+            print(
+                f"Post-processing: {stats['pending']} pending ({stats['queued']} queued, peak {stats['peak_pending']}), "
+                f"{stats['completed']} completed, {stats['failed']} failed, "
+                f"wait {stats['wait_ms']:.0f} ms, run {stats['run_ms']:.0f} ms, {stats['shared_mb']:.0f} MB shared"
+            )
+        
+        for kind, stats in self.poller.report().items():
+            print(
+                f"Queue {kind}: weight {stats['weight']:g}, {stats['received']} received, "
+                f"{stats['ready']} prefetched, {stats['empty_polls']} of {stats['polls']} polls empty, "
+                f"held {stats['held_ms']:.0f} ms per batch"
+            )
+        
+        counters = ", ".join(f"{name} {count}" for name, count in self.duplicate_counters().items())
+        print(f"Duplicates: {counters}")
+        
+        if self.prompt_cache is not None and "image" in self.roles:
+            stats = self.prompt_cache.stats()
+            print(
+                f"Prompt cache: {stats['hit_rate']:.0%} hits ({stats['hits']} of {stats['hits'] + stats['misses']}), "
+                f"{stats['entries']} entries, {stats['mb']:.1f} MB"
+            )
+        
+        if len(self.residency.modules) > 0:
+            print(f"GPU memory: {self.residency.summary()}")
+            for name, stats in self.residency.report().items():
+                print(
+                    f"Module {name}: {stats['mb']:.0f} MB, {'resident' if stats['resident'] else 'offloaded'}, "
+                    f"{stats['loads']} loads, {stats['offloads']} offloads, {stats['transfer_s']:.1f} s moving"
+                )
+        
+        if "perspective" in self.roles and self.mde_handle.ready:
+            timings = ", ".join(f"{stage} {ms:.1f} ms" for stage, ms in self.mde.timing_report().items())
+            print(f"Depth per image: {timings}")
+    
     def run(self):
+        self.pipeline.start()
+        self.advertiser.start()
+        self.poller.start()
+        
+        last_report = time.monotonic()
         while True:
-            self._run_image_generation()
-            self._run_mesh_generation()
\ No newline at end of file
+            # Batches of queues whose first stage has room, the others wait prefetched
+            polled = self.poller.next(timeout=1.0, accepts=self.pipeline.accepts)
+            if polled is not None:
+                kind, tasks = polled
+                if kind == "image_gen":
+                    self._run_image_generation(tasks)
+                else:
+                    self._run_mesh_generation(tasks)
+            
+            if time.monotonic() - last_report >= self.report_interval_s:
+                self.report()
+                last_report = time.monotonic()
\ No newline at end of file
@@ -0,0 +1,118 @@
+# Base
+from typing import List, Sequence, Tuple, Union
+
+# Third-party
+import cv2
+import numpy as np
+
+# Local
+from . import depth, artifacts
+from .artifacts import MeshData
+from .data_key import DataKey
+
+def mesh_depth(
+    depth_map: np.ndarray,
+    resolution: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Depth on the mesh grid in mesh units, and the mask of kept pixels.
+    """
+    depth_map = depth_map.astype(np.float32)
+    # Depth inferred for the mesh grid arrives at its size already
+    if depth_map.shape[:2] != (resolution, resolution):
+        depth_map = cv2.resize(depth_map, (resolution, resolution))
+    mask = depth_map > 5
+    depth_map /= -200
+    return depth_map, mask
+
+def textured_mesh(
+    image: np.ndarray,
+    depth_map: np.ndarray,
+    resolution: int = 512
+) -> MeshData:
+    depth_map, mask = mesh_depth(depth_map, resolution)
+
+    v_grid, v_num = depth.create_pixel_vertice_mapping(mask)
+    vertices, triangles, uvs = depth.create_mesh_arrays(depth_map, v_grid)
+
+    # Center mesh
+    if v_num > 0:
+        vertices -= vertices.mean(axis=0)
+
+    return MeshData(vertices, triangles, uvs=uvs, texture=image)
+
+def lod_meshes(
+    mesh: MeshData,
+    depth_map: np.ndarray,
+    resolution: int,
+    tolerances: Sequence[float]
+) -> List[MeshData]:
+    """
+    Adaptive meshes of the textured mesh's grid, one per LOD tolerance.
+    Vertices are the full mesh's, so levels line up with it.
+    """
+    if len(tolerances) == 0:
+        return []
+
+    depth_map, mask = mesh_depth(depth_map, resolution)
+    v_grid, _ = depth.create_pixel_vertice_mapping(mask)
+
+    meshes = []
+    lods = depth.adaptive_lods(depth_map, mask, v_grid, tolerances)
+    for tolerance, (used, triangles, stats) in zip(tolerances, lods):
+        print(
+            f"LOD {tolerance:g}: {triangles.shape[0]} of {mesh.triangles.shape[0]} triangles, "
+            f"max error {stats['max_error']:.2%}"
+        )
+        meshes.append(MeshData(
+            mesh.vertices[used],
+            triangles,
+            uvs=mesh.uvs[used],
+            texture=mesh.texture
+        ))
+    return meshes
+
+def perspective_artifacts(
+    image: np.ndarray,
+    depth_map: np.ndarray,
+    grid_depth_map: Union[np.ndarray, None] = None,
+    *,
+    project_id: str,
+    resolution: int,
+    key_resolution: Union[int, None] = None,
+    lod_tolerances: Sequence[float] = (),
+    pointcloud_max_points: Union[int, None] = None,
+    store_depth: bool = True
+) -> List[Tuple[str, bytes]]:
+    """
+    Encoded perspective artifacts of a depth map, (key, data) pairs. Runs
+    in post-processing processes, so it only returns bytes.
+
+    depth_map is image-sized, it is stored and makes the point cloud.
+    grid_depth_map is the same depth at resolution, the meshes use it
+    instead of resizing depth_map.
+    """
+    print(f"Reconstructing at {resolution}")
+    mesh_source = depth_map if grid_depth_map is None else grid_depth_map
+    mesh = textured_mesh(image, mesh_source, resolution=resolution)
+
+    meshes = [(None, mesh)] + list(enumerate(lod_meshes(mesh, mesh_source, resolution, lod_tolerances), 1))
+    uploads = []
+    for lod, lod_mesh in meshes:
+        uploads += [
+            (DataKey.mesh(project_id, perspective=True, textured=True, resolution=key_resolution, lod=lod), artifacts.mesh_to_zip(lod_mesh)),
+            (DataKey.mesh(project_id, perspective=True, textured=False, resolution=key_resolution, lod=lod), artifacts.mesh_to_zip(lod_mesh.without_texture()))
+        ]
+
+    if store_depth:
+        # Preview point cloud, at image resolution whatever the mesh grid
+        points, colors = depth.pointcloud_arrays(
+            image,
+            depth_map.astype(np.float32),
+            max_points=pointcloud_max_points
+        )
+        uploads += [
+            (DataKey.depth(project_id), artifacts.depth_to_png(depth_map)),
+            (DataKey.pointcloud(project_id), artifacts.pointcloud_to_ply(points, colors))
+        ]
+    return [(key, buffer.getvalue()) for key, buffer in uploads]
@@ -0,0 +1,181 @@
+# Base
+import time
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+# Local
+from .scheduling import FairScheduler, ScheduledTask
+
+class PolledQueue:
+    """
+    A task queue with its own polling thread, received batches wait in
+    ready until they are dispatched.
+    """
+    def __init__(
+        self,
+        kind: str,
+        scheduler: FairScheduler,
+        max_tasks: int = 1,
+        deadline_s: float = 0.5,
+        weight: float = 1.0,
+        prefetch: int = 1,
+        enabled: Callable[[], bool] = None
+    ) -> None:
+        self.kind = kind
+        self.scheduler = scheduler
+        self.max_tasks = max_tasks
+        self.deadline_s = deadline_s
+        self.weight = weight
+        self.enabled = enabled or (lambda: True)
+
+        # Batches received but not dispatched, their messages are heartbeated
+        self.prefetch = prefetch
+        self.ready: deque = deque()
+
+        # Stride scheduling state
+        self.pass_ = 0.0
+
+        # Statistics
+        self.polls = 0
+        self.empty_polls = 0
+        self.received = 0
+        self.dispatched = 0
+        self.batches = 0
+        self.held_s = 0.0
+
+class QueuePoller:
+    """
+    Long polls every queue at once, one thread each, so a task never waits
+    for the poll of another queue to time out.
+
+    Ready batches are dispatched by stride scheduling on the queue weights.
+    A queue stops polling while prefetch batches of it wait, a worker does
+    not hide more tasks from the others than it is about to run.
+    """
+    def __init__(
+        self,
+        queues: Sequence[PolledQueue],
+        idle_wait_s: float = 0.5
+    ) -> None:
+        self.queues: Dict[str, PolledQueue] = { queue.kind: queue for queue in queues }
+        self.idle_wait_s = idle_wait_s
+
+        self.vtime = 0.0
+        self.condition = threading.Condition()
+        self.termination_event = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    # Private
+    ################################################################
+
+    def _poll(self, queue: PolledQueue):
+        while not self.termination_event.is_set():
+            with self.condition:
+                # Prefetch limit reached or model not loaded yet
+                if len(queue.ready) >= queue.prefetch or not queue.enabled():
+                    self.condition.wait(self.idle_wait_s)
+                    continue
+
+            try:
+                tasks = queue.scheduler.next_batch(
+                    max_tasks=queue.max_tasks,
+                    deadline_s=queue.deadline_s
+                )
+            except Exception as e:
+                print(f"Failed to poll {queue.kind} queue: {e}")
+                self.termination_event.wait(self.idle_wait_s)
+                continue
+
+            with self.condition:
+                queue.polls += 1
+                if len(tasks) == 0:
+                    queue.empty_polls += 1
+                    continue
+
+                # Idle queues do not bank credit while away
+                if len(queue.ready) == 0:
+                    queue.pass_ = max(queue.pass_, self.vtime)
+                queue.ready.append((time.monotonic(), tasks))
+                queue.received += len(tasks)
+                self.condition.notify_all()
+
+    def _select(
+        self,
+        accepts: Callable[[str], bool]
+    ) -> Union[Tuple[str, List[ScheduledTask]], None]:
+        # Caller holds the condition
+        active = [q for q in self.queues.values() if len(q.ready) > 0 and accepts(q.kind)]
+        if len(active) == 0:
+            return None
+
+        queue = min(active, key=lambda q: (q.pass_, q.kind))
+        self.vtime = queue.pass_
+        queue.pass_ += 1.0 / queue.weight
+
+        ready_at, tasks = queue.ready.popleft()
+        queue.dispatched += len(tasks)
+        queue.batches += 1
+        queue.held_s += time.monotonic() - ready_at
+
+        # A prefetch slot is free again
+        self.condition.notify_all()
+        return queue.kind, tasks
+
+    # Public
+    ################################################################
+
+    def start(self):
+        for queue in self.queues.values():
+            thread = threading.Thread(
+                target=self._poll,
+                args=(queue,),
+                name=f"poll-{queue.kind}",
+                daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def next(
+        self,
+        timeout: float = 1.0,
+        accepts: Callable[[str], bool] = None
+    ) -> Union[Tuple[str, List[ScheduledTask]], None]:
+        """
+        Next (kind, tasks) batch of a queue accepts allows, None on timeout.
+        """
+        accepts = accepts or (lambda kind: True)
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                selected = self._select(accepts)
+                if selected is not None:
+                    return selected
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                # Pipeline capacity frees without notifying, check it again soon
+                self.condition.wait(min(remaining, 0.05))
+
+    def report(self) -> Dict[str, dict]:
+        with self.condition:
+            return {
+                queue.kind: {
+                    "weight": queue.weight,
+                    "ready": sum(len(tasks) for _, tasks in queue.ready),
+                    "polls": queue.polls,
+                    "empty_polls": queue.empty_polls,
+                    "received": queue.received,
+                    "dispatched": queue.dispatched,
+                    "held_ms": 1000 * queue.held_s / max(queue.batches, 1)
+                }
+                for queue in self.queues.values()
+            }
+
+    def stop(self):
+        self.termination_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
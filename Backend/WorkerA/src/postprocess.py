@@ -0,0 +1,194 @@
+# Base
+import sys
+import time
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Union
+
+# Third-party
+import numpy as np
+
+# Name, shape and dtype of an array in shared memory
+ArraySpec = Tuple[str, Tuple[int, ...], str]
+
+def share_array(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, ArraySpec]:
+    """
+    Copy of array in a new shared memory block, and the spec to attach it.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    del view
+    return shm, (shm.name, tuple(array.shape), array.dtype.str)
+
+def attach_array(spec: ArraySpec) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    """
+    View of a shared array without copying it, the block stays owned by its creator.
+    """
+    name, shape, dtype = spec
+    # Before 3.13 attaching registers the block with the resource tracker too
+    kwargs = { "track": False } if sys.version_info >= (3, 13) else {}
+    shm = shared_memory.SharedMemory(name=name, **kwargs)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def run_shared(
+    fn: Callable,
+    specs: Sequence[ArraySpec],
+    kwargs: Dict[str, Any]
+) -> Tuple[Any, float, float]:
+    """
+    fn on views of the shared arrays, in a pool process.
+
+    Returns:
+        result, start time (epoch s), run time (s)
+    """
+    started_at = time.time()
+    attached = [attach_array(spec) for spec in specs]
+    try:
+        result = fn(*[array for _, array in attached], **kwargs)
+    finally:
+        handles = [shm for shm, _ in attached]
+        del attached
+        for shm in handles:
+            shm.close()
+    return result, started_at, time.time() - started_at
+
+def ready() -> bool:
+    return True
+
+class PostProcessPool:
+    """
+    CPU post-processing in separate processes, off the GIL of the process
+    running inference.
+
+    Input arrays are copied once into shared memory and the workers map
+    them, nothing large is pickled. Results come back pickled, fn should
+    return compact ones (encoded artifacts). Without processes fn runs in
+    the calling thread.
+    """
+    def __init__(
+        self,
+        processes: int = 2
+    ) -> None:
+        self.processes = processes
+        self.executor = self._create_executor()
+
+        # Statistics
+        self.lock = threading.Lock()
+        self.restarts = 0
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_s = 0.0
+        self.run_s = 0.0
+        self.shared_bytes = 0
+
+    # Private
+    ################################################################
+
+    def _create_executor(self) -> Union[ProcessPoolExecutor, None]:
+        if self.processes <= 0:
+            return None
+        # Spawned, the workers do not inherit CUDA state or held locks
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        # Calls that shared the broken executor all fail, only the first replaces it
+        with self.lock:
+            if self.executor is not broken:
+                return
+            print("Post-processing process died, restarting the pool")
+            self.executor = self._create_executor()
+            self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.warmup()
+
+    # Public
+    ################################################################
+
+    def warmup(self):
+        """
+        Start the processes in the background, they import the modules once.
+        """
+        if self.executor is not None:
+            for _ in range(self.processes):
+                self.executor.submit(ready)
+
+    def run(
+        self,
+        fn: Callable,
+        arrays: Sequence[np.ndarray],
+        **kwargs
+    ):
+        """
+        fn(*arrays, **kwargs) in a pool process, blocks until it is done.
+        fn must be a module-level function.
+        """
+        if self.executor is None:
+            start = time.time()
+            result = fn(*arrays, **kwargs)
+            with self.lock:
+                self.completed += 1
+                self.run_s += time.time() - start
+            return result
+
+        shared = [share_array(np.ascontiguousarray(array)) for array in arrays]
+        with self.lock:
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+            self.shared_bytes += sum(shm.size for shm, _ in shared)
+
+        submitted_at = time.time()
+        executor = self.executor
+        try:
+            future = executor.submit(run_shared, fn, [spec for _, spec in shared], kwargs)
+            result, started_at, run_s = future.result()
+        except BrokenExecutor:
+            # A process crashed or was OOM-killed and the executor is unusable
+            # from now on, the task is retried on a fresh one (transient)
+            with self.lock:
+                self.failed += 1
+            self._restart(executor)
+            raise
+        except Exception:
+            with self.lock:
+                self.failed += 1
+            raise
+        finally:
+            for shm, _ in shared:
+                shm.close()
+                shm.unlink()
+            with self.lock:
+                self.pending -= 1
+
+        with self.lock:
+            self.completed += 1
+            self.wait_s += max(0.0, started_at - submitted_at)
+            self.run_s += run_s
+        return result
+
+    def report(self) -> Dict[str, float]:
+        with self.lock:
+            done = max(self.completed, 1)
+            return {
+                "processes": self.processes,
+                "pending": self.pending,
+                "queued": max(self.pending - self.processes, 0),
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "failed": self.failed,
+                "restarts": self.restarts,
+                "wait_ms": 1000 * self.wait_s / done,
+                "run_ms": 1000 * self.run_s / done,
+                "shared_mb": self.shared_bytes / (1 << 20)
+            }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
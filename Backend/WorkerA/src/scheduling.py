@@ -0,0 +1,383 @@
+# Base
+import time
+import threading
+from collections import deque
+from typing import Dict, List, Union
+
+# Local
+from .priority import Priority, lane_queue_name
+from .aws.queue import SQSHelper, QueueMessage
+from .aws.credentials import AWSCredentials
+
+# Message attribute counting execution attempts, set when a retry re-sends the message
+ATTEMPT_ATTRIBUTE = "attempt"
+
+DEFAULT_LANE_WEIGHTS = {
+    Priority.INTERACTIVE: 8.0,
+    Priority.BATCH: 2.0,
+    Priority.SPECULATIVE: 1.0
+}
+
+class ScheduledTask:
+    def __init__(
+        self,
+        message: QueueMessage,
+        priority: Priority
+    ) -> None:
+        self.message = message
+        self.priority = priority
+        self.received_at = time.time()
+        self.started_at: Union[float, None] = None
+
+        # Scheduling fields, invalid bodies fail later in body_json()
+        try:
+            data = message.body_json()
+        except Exception:
+            data = {}
+        self.project_id = data.get("project_id")
+        self.tenant_id = str(data.get("tenant_id") or "default")
+        self.submitted_at = data.get("submitted_at")
+
+    @property
+    def attempt(self) -> int:
+        """
+        Execution attempt, starts at 1 and grows with every retry. Receives
+        that never ran the task (released prefetches, lost leases) do not count.
+        """
+        return int(self.message.attributes.get(ATTEMPT_ATTRIBUTE, 1))
+
+    @property
+    def receive_count(self) -> int:
+        return self.message.receive_count
+
+    @property
+    def receipt_handle(self) -> str:
+        return self.message.receipt_handle
+
+    def body_json(self):
+        return self.message.body_json()
+
+    def wait_s(self) -> Union[float, None]:
+        if self.submitted_at is None or self.started_at is None:
+            return None
+        return max(0.0, self.started_at - float(self.submitted_at))
+
+    def result_fields(self) -> dict:
+        return {
+            "priority": self.priority.lane,
+            "tenant_id": self.tenant_id,
+            "submitted_at": self.submitted_at,
+            "wait_s": self.wait_s()
+        }
+
+class FairScheduler:
+    """
+    Weighted fair dequeuing over the priority lanes of one task type.
+
+    Lanes are picked by stride scheduling on their weights, so batch and
+    speculative work keeps moving while interactive work dominates. Inside
+    a lane, tenants are picked the same way among the buffered messages
+    only. Fairness over a tenant's whole backlog comes from the server,
+    which admits tasks to SQS per tenant (LaneQueues).
+    """
+    def __init__(
+        self,
+        base_name: str,
+        region: str,
+        credentials: AWSCredentials = None,
+        lane_weights: Dict[Priority, float] = None,
+        tenant_weights: Dict[str, float] = None,
+        prefetch: int = 1,
+        wait_time: int = 2,
+        max_buffered_s: float = 20,
+        heartbeat_interval_s: float = 60,
+        visibility_extension_s: int = 300
+    ) -> None:
+        self.base_name = base_name
+        self.lanes: Dict[Priority, SQSHelper] = {
+            priority: SQSHelper(
+                lane_queue_name(base_name, priority),
+                region=region,
+                credentials=credentials
+            )
+            for priority in Priority
+        }
+
+        self.lane_weights = dict(DEFAULT_LANE_WEIGHTS if lane_weights is None else lane_weights)
+        self.tenant_weights = dict(tenant_weights or {})
+
+        # Prefetched messages (per lane) stay invisible to other workers, keep
+        # the buffer small and release messages before their visibility expires
+        self.prefetch = prefetch
+        self.wait_time = wait_time
+        self.max_buffered_s = max_buffered_s
+
+        # Local buffer: lane -> tenant -> tasks in arrival order, the
+        # heartbeat thread extends and releases buffered messages too
+        self.buffer: Dict[Priority, Dict[str, deque]] = { p: {} for p in Priority }
+        self.buffer_lock = threading.RLock()
+
+        # Stride scheduling state
+        self.lane_pass: Dict[Priority, float] = { p: 0.0 for p in Priority }
+        self.lane_vtime = 0.0
+        self.tenant_pass: Dict[Priority, Dict[str, float]] = { p: {} for p in Priority }
+        self.tenant_vtime: Dict[Priority, float] = { p: 0.0 for p in Priority }
+
+        # Started tasks keep their messages hidden until deleted or retried,
+        # however long the job runs
+        self.heartbeat_interval_s = heartbeat_interval_s
+        self.visibility_extension_s = visibility_extension_s
+        self.in_flight: Dict[str, ScheduledTask] = {}
+        self.in_flight_lock = threading.Lock()
+
+        # Statistics, redelivered: started again after an earlier receive,
+        # lease_lost: heartbeat failed, another worker may run the task too,
+        # released: buffered too long and handed back to the queue
+        self.counters = { "started": 0, "redelivered": 0, "heartbeats": 0, "lease_lost": 0, "released": 0 }
+
+        self.heartbeat_termination_event = threading.Event()
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat, name=f"heartbeat-{base_name}", daemon=True)
+        if heartbeat_interval_s > 0:
+            self.heartbeat_thread.start()
+
+    # Private
+    ################################################################
+
+    def _enabled_lanes(self) -> List[Priority]:
+        return [p for p in Priority if self.lane_weights.get(p, 0) > 0]
+
+    def _lane_size(self, priority: Priority) -> int:
+        with self.buffer_lock:
+            return sum(len(tasks) for tasks in self.buffer[priority].values())
+
+    def _buffered(self) -> int:
+        return sum(self._lane_size(p) for p in Priority)
+
+    def _push(self, task: ScheduledTask):
+        lane = task.priority
+        with self.buffer_lock:
+            tenants = self.buffer[lane]
+
+            # Idle lanes and tenants do not bank credit while away
+            if self._lane_size(lane) == 0:
+                self.lane_pass[lane] = max(self.lane_pass[lane], self.lane_vtime)
+            if task.tenant_id not in tenants:
+                tenant_pass = self.tenant_pass[lane].get(task.tenant_id, 0.0)
+                self.tenant_pass[lane][task.tenant_id] = max(tenant_pass, self.tenant_vtime[lane])
+                tenants[task.tenant_id] = deque()
+
+            tenants[task.tenant_id].append(task)
+
+    def _discard(self, task: ScheduledTask):
+        with self.buffer_lock:
+            tenants = self.buffer[task.priority]
+            tasks = tenants.get(task.tenant_id)
+            if tasks is None or task not in tasks:
+                return
+            tasks.remove(task)
+            if len(tasks) == 0:
+                del tenants[task.tenant_id]
+
+    def _buffered_tasks(self) -> List[ScheduledTask]:
+        with self.buffer_lock:
+            return [task for tenants in self.buffer.values() for tasks in tenants.values() for task in tasks]
+
+    def _receive(
+        self,
+        long_poll: bool = True
+    ):
+        enabled = self._enabled_lanes()
+        if len(enabled) == 0:
+            return
+
+        # Short poll every enabled lane, each lane has its own prefetch budget
+        for priority in enabled:
+            free = self.prefetch - self._lane_size(priority)
+            if free <= 0:
+                continue
+
+            messages = self.lanes[priority].receive_messages(
+                max_messages=min(free, 10),
+                wait_time=0
+            )
+            for msg in messages:
+                self._push(ScheduledTask(msg, priority))
+
+        # Nothing anywhere, long poll the highest weighted enabled lane
+        if long_poll and self._buffered() == 0:
+            priority = max(enabled, key=lambda p: (self.lane_weights[p], -p))
+            messages = self.lanes[priority].receive_messages(
+                max_messages=min(self.prefetch, 10),
+                wait_time=self.wait_time
+            )
+            for msg in messages:
+                self._push(ScheduledTask(msg, priority))
+
+    def _start(self, task: ScheduledTask):
+        task.started_at = time.time()
+        with self.in_flight_lock:
+            self.in_flight[task.receipt_handle] = task
+            self.counters["started"] += 1
+            self.counters["redelivered"] += int(task.receive_count > 1)
+
+    def _finish(self, task: ScheduledTask):
+        with self.in_flight_lock:
+            self.in_flight.pop(task.receipt_handle, None)
+
+    def _heartbeat(self):
+        while not self.heartbeat_termination_event.wait(self.heartbeat_interval_s):
+            # Buffered messages are released or extended too, so none of
+            # them expires while a long task runs
+            self._release_stale()
+            with self.in_flight_lock:
+                tasks = list(self.in_flight.values())
+            buffered = self._buffered_tasks()
+
+            for task in tasks + buffered:
+                try:
+                    self.lanes[task.priority].change_message_visibility(
+                        task.receipt_handle,
+                        self.visibility_extension_s
+                    )
+                    self.counters["heartbeats"] += 1
+                except Exception as e:
+                    # Receipt expired, the message may be running elsewhere
+                    print(f"Failed to extend visibility of {task.project_id}: {e}")
+                    self.counters["lease_lost"] += 1
+                    self._finish(task)
+                    self._discard(task)
+
+    def _release_stale(self):
+        now = time.time()
+        stale: List[ScheduledTask] = []
+        with self.buffer_lock:
+            for tenants in self.buffer.values():
+                for tenant_id in list(tenants.keys()):
+                    tasks = tenants[tenant_id]
+                    while len(tasks) > 0 and now - tasks[0].received_at > self.max_buffered_s:
+                        stale.append(tasks.popleft())
+                    if len(tasks) == 0:
+                        del tenants[tenant_id]
+
+        for task in stale:
+            print(f"Releasing stale task from {task.priority.lane} lane")
+            self.counters["released"] += 1
+            try:
+                self.lanes[task.priority].change_message_visibility(task.receipt_handle, 0)
+            except Exception as e:
+                print(f"Failed to release message: {e}")
+
+    def _select(self) -> Union[ScheduledTask, None]:
+        with self.buffer_lock:
+            active = [p for p in self._enabled_lanes() if self._lane_size(p) > 0]
+            if len(active) == 0:
+                return None
+
+            # Lane with the lowest pass
+            lane = min(active, key=lambda p: (self.lane_pass[p], p))
+            self.lane_vtime = self.lane_pass[lane]
+            self.lane_pass[lane] += 1.0 / self.lane_weights[lane]
+
+            # Tenant with the lowest pass inside that lane
+            tenants = self.buffer[lane]
+            tenant_pass = self.tenant_pass[lane]
+            tenant_id = min(tenants, key=lambda t: (tenant_pass[t], tenants[t][0].received_at))
+            self.tenant_vtime[lane] = tenant_pass[tenant_id]
+            tenant_pass[tenant_id] += 1.0 / self.tenant_weights.get(tenant_id, 1.0)
+
+            task = tenants[tenant_id].popleft()
+            if len(tenants[tenant_id]) == 0:
+                del tenants[tenant_id]
+
+            return task
+
+    # Public
+    ################################################################
+
+    def next_task(self) -> Union[ScheduledTask, None]:
+        self._release_stale()
+        self._receive()
+
+        task = self._select()
+        if task is not None:
+            self._start(task)
+
+        return task
+
+    def next_batch(
+        self,
+        max_tasks: int,
+        deadline_s: float
+    ) -> List[ScheduledTask]:
+        """
+        Up to max_tasks tasks. Waits (long poll) for the first one, then keeps
+        collecting with short polls until the batch is full or deadline_s passed.
+        """
+        task = self.next_task()
+        if task is None:
+            return []
+
+        tasks = [task]
+        deadline = time.monotonic() + deadline_s
+        while len(tasks) < max_tasks:
+            self._receive(long_poll=False)
+            task = self._select()
+
+            if task is not None:
+                self._start(task)
+                tasks.append(task)
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(0.1, remaining))
+
+        return tasks
+
+    def delete(self, task: ScheduledTask):
+        self._finish(task)
+        return self.lanes[task.priority].delete_message(task.receipt_handle)
+
+    def release(
+        self,
+        task: ScheduledTask,
+        delay_s: int = 0
+    ):
+        """
+        Hide the message for delay_s seconds, then it is received again
+        with the same attempt.
+        """
+        self._finish(task)
+        try:
+            self.lanes[task.priority].change_message_visibility(task.receipt_handle, delay_s)
+        except Exception as e:
+            # The visibility timeout brings it back anyway
+            print(f"Failed to release message: {e}")
+
+    def retry(
+        self,
+        task: ScheduledTask,
+        delay_s: int
+    ):
+        """
+        Send the task again as its next attempt, delayed by delay_s seconds
+        (at most 15 minutes), and delete this message.
+        """
+        queue = self.lanes[task.priority]
+        try:
+            queue.send_message(
+                task.message.body,
+                attributes={ ATTEMPT_ATTRIBUTE: task.attempt + 1 },
+                delay_s=delay_s
+            )
+        except Exception as e:
+            print(f"Failed to re-send task, releasing it: {e}")
+            self.release(task, delay_s)
+            return
+
+        try:
+            self.delete(task)
+        except Exception as e:
+            # Comes back as a duplicate of the re-sent attempt
+            print(f"Failed to delete retried message: {e}")
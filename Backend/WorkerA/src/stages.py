@@ -0,0 +1,163 @@
+# Base
+import time
+import threading
+from queue import Queue, Empty
+from typing import Any, Callable, Dict, List, Sequence, Union
+
+class Job:
+    """
+    Unit of work flowing through the pipeline stages.
+    """
+    def __init__(
+        self,
+        kind: str,
+        tasks: list,
+        **data
+    ) -> None:
+        self.kind = kind
+        self.tasks = tasks
+        self.data: Dict[str, Any] = data
+        self.step = 0
+
+StageResult = Union[Job, List[Job], None]
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Job], StageResult],
+        workers: int = 1,
+        capacity: int = 4
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue: Queue = Queue(maxsize=capacity)
+
+        # Statistics
+        self.busy_s = 0.0
+        self.processed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def record(
+        self,
+        duration_s: float,
+        failed: bool = False
+    ):
+        with self.lock:
+            self.busy_s += duration_s
+            self.processed += 1
+            self.failed += int(failed)
+
+    def utilization(self, elapsed_s: float) -> float:
+        if elapsed_s <= 0:
+            return 0.0
+        return self.busy_s / (elapsed_s * self.workers)
+
+class StagePipeline:
+    """
+    Jobs flow through named stages along the route of their kind.
+
+    Every stage has its own threads and a bounded input queue, so a full
+    stage holds back the ones before it instead of piling up work, and
+    stages of different jobs (download, GPU, CPU, upload) overlap.
+    """
+    def __init__(
+        self,
+        stages: Sequence[Stage],
+        routes: Dict[str, List[str]],
+        on_error: Callable[[Job, Exception], None]
+    ) -> None:
+        self.stages = { stage.name: stage for stage in stages }
+        self.routes = routes
+        self.on_error = on_error
+
+        self.started_at: Union[float, None] = None
+        self.termination_event = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    # Private
+    ################################################################
+
+    def _forward(self, job: Job):
+        route = self.routes[job.kind]
+        if job.step < len(route):
+            self.stages[route[job.step]].queue.put(job)
+
+    def _work(self, stage: Stage):
+        while not self.termination_event.is_set():
+            try:
+                job = stage.queue.get(timeout=0.1)
+            except Empty:
+                continue
+
+            start = time.monotonic()
+            try:
+                results = stage.fn(job)
+                stage.record(time.monotonic() - start)
+
+            except Exception as e:
+                stage.record(time.monotonic() - start, failed=True)
+                print(f"Stage {stage.name} failed: {e}")
+                try:
+                    self.on_error(job, e)
+                except Exception as handler_error:
+                    print(f"Failed to handle stage error: {handler_error}")
+                continue
+
+            # Fanned-out jobs continue from the next step
+            if results is None:
+                results = []
+            elif isinstance(results, Job):
+                results = [results]
+            for result in results:
+                result.step = job.step + 1
+                self._forward(result)
+
+    # Public
+    ################################################################
+
+    def start(self):
+        self.started_at = time.monotonic()
+        for stage in self.stages.values():
+            for i in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(stage,),
+                    name=f"{stage.name}-{i}",
+                    daemon=True
+                )
+                thread.start()
+                self.threads.append(thread)
+
+    def accepts(self, kind: str) -> bool:
+        """
+        Whether the first stage of kind's route has room, submit would not block.
+        """
+        return not self.stages[self.routes[kind][0]].queue.full()
+
+    def submit(self, job: Job):
+        """
+        Blocks while the first stage of the job's route is full.
+        """
+        job.step = 0
+        self._forward(job)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        elapsed_s = 0.0 if self.started_at is None else time.monotonic() - self.started_at
+        return {
+            name: {
+                "workers": stage.workers,
+                "queued": stage.queue.qsize(),
+                "processed": stage.processed,
+                "failed": stage.failed,
+                "utilization": stage.utilization(elapsed_s)
+            }
+            for name, stage in self.stages.items()
+        }
+
+    def stop(self):
+        self.termination_event.set()
+        for thread in self.threads:
+            thread.join()
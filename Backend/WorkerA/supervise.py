@@ -0,0 +1,26 @@
+import sys
+import argparse
+
+from src.supervisor import Supervisor, detect_devices
+
+parser = argparse.ArgumentParser(description="One MeshGen worker A per device, arguments after -- go to every worker")
+parser.add_argument("--devices", nargs="+", default=None)  # cuda:0 cuda:1 ..., cpu:0 cpu:1 ..., all GPUs if unset
+parser.add_argument("--per-device", type=int, default=1)
+parser.add_argument("--device-memory-gb", type=float, default=None)  # split between the workers of a card
+parser.add_argument("--max-restarts", type=int, default=5)
+parser.add_argument("worker_args", nargs=argparse.REMAINDER)
+args = parser.parse_args()
+
+# Workers only hold the batches they are about to run, the others take the rest
+worker_args = ["--queue-prefetch", "1"]
+if args.device_memory_gb is not None:
+    worker_args += ["--vram-budget-gb", str(args.device_memory_gb / args.per_device)]
+worker_args += args.worker_args[1:] if args.worker_args[:1] == ["--"] else args.worker_args
+
+supervisor = Supervisor(
+    [sys.executable, "main.py", *worker_args],
+    args.devices or detect_devices(),
+    per_device=args.per_device,
+    max_restarts=args.max_restarts
+)
+supervisor.run()
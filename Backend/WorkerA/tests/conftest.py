@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import the worker's modules as main.py does, from the worker directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,80 @@
+# Base
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Third-party
+import pytest
+
+# Local
+from src.batching import DynamicBatcher
+
+class RecordingFn:
+    def __init__(self) -> None:
+        self.batches = []
+        self.threads = set()
+
+    def __call__(self, items: list) -> list:
+        self.batches.append(list(items))
+        self.threads.add(threading.current_thread().name)
+        return [item * 2 for item in items]
+
+def test_full_batches_run_without_waiting():
+    fn = RecordingFn()
+    batcher = DynamicBatcher(fn, max_batch_size=8, max_wait_s=0.5, name="test-batcher")
+    try:
+        futures = [batcher.submit(i) for i in range(20)]
+        assert [future.result(timeout=5) for future in futures] == [i * 2 for i in range(20)]
+    finally:
+        batcher.stop()
+
+    # Full batches in arrival order, the rest runs at the deadline
+    assert [len(batch) for batch in fn.batches] == [8, 8, 4]
+    assert sum(fn.batches, []) == list(range(20))
+    assert fn.threads == { "test-batcher" }
+    assert batcher.mean_batch_size() == pytest.approx(20 / 3)
+
+def test_lone_item_runs_at_the_deadline():
+    fn = RecordingFn()
+    batcher = DynamicBatcher(fn, max_batch_size=8, max_wait_s=0.05)
+    try:
+        start = time.monotonic()
+        assert batcher(21) == 42
+        elapsed = time.monotonic() - start
+    finally:
+        batcher.stop()
+
+    assert fn.batches == [[21]]
+    assert 0.04 <= elapsed < 1.0
+
+def test_concurrent_callers_get_their_own_results():
+    fn = RecordingFn()
+    batcher = DynamicBatcher(fn, max_batch_size=4, max_wait_s=0.02)
+    try:
+        with ThreadPoolExecutor(16) as pool:
+            results = list(pool.map(batcher, range(64)))
+    finally:
+        batcher.stop()
+
+    assert results == [i * 2 for i in range(64)]
+    assert all(len(batch) <= 4 for batch in fn.batches)
+    assert batcher.items == 64
+    # Callers were actually batched together
+    assert batcher.batches < 64
+
+def test_failed_batch_fails_every_caller_and_batcher_keeps_running():
+    def fn(items: list) -> list:
+        if "bad" in items:
+            raise ValueError("bad item")
+        return items
+
+    batcher = DynamicBatcher(fn, max_batch_size=4, max_wait_s=0.5)
+    try:
+        futures = [batcher.submit(item) for item in ["a", "bad", "c", "d"]]
+        for future in futures:
+            with pytest.raises(ValueError, match="bad item"):
+                future.result(timeout=5)
+
+        assert batcher("e") == "e"
+    finally:
+        batcher.stop()
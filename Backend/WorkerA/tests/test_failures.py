@@ -0,0 +1,108 @@
+# Base
+import json
+from typing import List
+
+# Third-party
+import pytest
+
+# Local
+from src.priority import Priority
+from src.aws.queue import QueueMessage
+from src.scheduling import ScheduledTask
+from src.failures import PoisonTaskError, TransientError, RetryPolicy, TaskFailureHandler, classify_error
+
+class FakeQueue:
+    def __init__(self) -> None:
+        self.sent: List[dict] = []
+
+    def send_message(self, message: str):
+        self.sent.append(json.loads(message))
+
+class FakeScheduler:
+    """
+    Records what the failure handler decided for each task.
+    """
+    def __init__(self) -> None:
+        self.base_name = "test-queue"
+        self.retried = []
+        self.released = []
+        self.deleted = []
+
+    def retry(self, task: ScheduledTask, delay_s: int):
+        self.retried.append((task.project_id, delay_s))
+
+    def release(self, task: ScheduledTask, delay_s: int = 0):
+        self.released.append((task.project_id, delay_s))
+
+    def delete(self, task: ScheduledTask):
+        self.deleted.append(task.project_id)
+
+def make_task(attempt: int = 1, receive_count: int = 1) -> ScheduledTask:
+    body = json.dumps({ "project_id": "p0", "tenant_id": "tenant-a" })
+    message = QueueMessage(body, "receipt-p0", receive_count, { "attempt": str(attempt) })
+    return ScheduledTask(message, Priority.BATCH)
+
+class BrokenProcessPool(Exception):
+    pass
+
+class ThrottlingException(Exception):
+    pass
+
+@pytest.mark.parametrize("error, kind", [
+    (PoisonTaskError("bad prompt"), "permanent"),
+    (TransientError("try again"), "transient"),
+    (ConnectionError("reset"), "transient"),
+    (TimeoutError("slow"), "transient"),
+    (RuntimeError("CUDA out of memory. Tried to allocate 2 GiB"), "transient"),
+    (BrokenProcessPool("process died"), "transient"),
+    (ThrottlingException("rate exceeded"), "transient"),
+    (RuntimeError("shape mismatch"), "permanent"),
+    (ValueError("invalid image"), "permanent"),
+    (KeyError("prompt"), "permanent")
+])
+def test_classify_error(error: Exception, kind: str):
+    assert classify_error(error) == kind
+
+def test_retry_delay_grows_with_jitter_and_is_capped():
+    policy = RetryPolicy(base_delay_s=10, max_delay_s=900)
+    for attempt in range(1, 12):
+        upper = min(10 * 2 ** (attempt - 1), 900)
+        for _ in range(50):
+            delay = policy.delay(attempt)
+            assert int(upper * 0.5) <= delay <= upper
+    # SQS takes whole seconds, a delay never rounds down to zero
+    assert all(RetryPolicy(base_delay_s=0.1).delay(1) == 1 for _ in range(20))
+
+def test_transient_errors_are_retried_until_max_attempts():
+    scheduler, results, dead_letters = FakeScheduler(), FakeQueue(), FakeQueue()
+    handler = TaskFailureHandler(results, dead_letters, RetryPolicy(max_attempts=3))
+
+    assert handler.handle(scheduler, make_task(attempt=2), "image", ConnectionError("reset"))
+    assert [project_id for project_id, _ in scheduler.retried] == ["p0"]
+    assert dead_letters.sent == []
+
+    # Last attempt, dead-lettered and reported failed
+    assert not handler.handle(scheduler, make_task(attempt=3), "image", ConnectionError("reset"))
+    assert len(scheduler.retried) == 1
+    assert dead_letters.sent[0]["error"]["attempts"] == 3
+    assert scheduler.deleted == ["p0"]
+    assert results.sent[0]["status"] == "failed"
+
+def test_poison_task_fails_at_once_for_all_its_task_types():
+    scheduler, results, dead_letters = FakeScheduler(), FakeQueue(), FakeQueue()
+    handler = TaskFailureHandler(results, dead_letters)
+
+    retried = handler.handle(scheduler, make_task(), "image", PoisonTaskError("bad prompt"), also_failed=["mesh"])
+
+    assert not retried
+    assert scheduler.retried == []
+    assert dead_letters.sent[0]["error"]["kind"] == "permanent"
+    assert [result["task_type"] for result in results.sent] == ["image", "mesh"]
+    assert results.sent[0]["error"]["class"] == "PoisonTaskError"
+
+def test_crash_loops_are_given_up_by_receive_count():
+    handler = TaskFailureHandler(FakeQueue(), FakeQueue(), RetryPolicy(max_receives=5))
+
+    # Released prefetches and lost leases do not use up attempts
+    assert not handler.exhausted(make_task(attempt=1, receive_count=5))
+    assert handler.exhausted(make_task(attempt=1, receive_count=6))
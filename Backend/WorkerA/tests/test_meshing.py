@@ -0,0 +1,78 @@
+# Third-party
+import numpy as np
+import pytest
+
+# The depth package loads the model backends with it
+pytest.importorskip("torch")
+pytest.importorskip("open3d")
+
+# Local
+from src.depth.meshing import create_pixel_vertice_mapping, triangulate_grid
+
+def reference_mapping(mask: np.ndarray):
+    grid = np.ones(mask.shape[:2], dtype=np.int32) * -1
+    i = 0
+    for y in range(mask.shape[0]):
+        for x in range(mask.shape[1]):
+            if mask[y, x]:
+                grid[y, x] = i
+                i += 1
+    return grid, i
+
+def reference_triangles(grid: np.ndarray) -> np.ndarray:
+    """
+    Per-pixel triangulation loop the vectorized version replaced.
+    """
+    t = []
+    h, w = grid.shape[:2]
+    for y in range(h - 1):
+        prev_block = False
+        for x in range(w):
+            if grid[y, x] == -1:
+                prev_block = False
+                continue
+
+            bl = x > 0 and grid[y + 1, x - 1] != -1
+            b = grid[y + 1, x] != -1
+            br = x < w - 1 and grid[y + 1, x + 1] != -1
+            r = x < w - 1 and grid[y, x + 1] != -1
+
+            if bl and b and not prev_block:
+                t.append([grid[y, x], grid[y + 1, x - 1], grid[y + 1, x]])
+
+            prev_block = False
+            if b and br:
+                t.append([grid[y, x], grid[y + 1, x], grid[y + 1, x + 1]])
+                prev_block = True
+            if r and br:
+                t.append([grid[y, x], grid[y + 1, x + 1], grid[y, x + 1]])
+                prev_block = True
+            if r and b and not prev_block:
+                t.append([grid[y, x], grid[y + 1, x], grid[y, x + 1]])
+                prev_block = True
+
+    return np.array(t, dtype=np.int32).reshape(-1, 3)
+
+@pytest.mark.parametrize("shape, density", [
+    ((1, 9), 1.0),
+    ((9, 1), 1.0),
+    ((2, 2), 1.0),
+    ((17, 23), 0.0),
+    ((17, 23), 0.3),
+    ((17, 23), 0.7),
+    ((40, 31), 0.95),
+    ((40, 31), 1.0)
+])
+def test_triangulation_matches_pixel_loop(shape: tuple, density: float):
+    rng = np.random.default_rng(sum(shape))
+    mask = rng.random(shape) < density
+
+    grid, count = create_pixel_vertice_mapping(mask)
+    expected_grid, expected_count = reference_mapping(mask)
+    assert count == expected_count
+    np.testing.assert_array_equal(grid, expected_grid)
+
+    # Same triangles in the same order, so meshes stay byte identical
+    triangles = triangulate_grid(grid)
+    assert triangles.dtype == np.int32
+    np.testing.assert_array_equal(triangles, reference_triangles(grid))
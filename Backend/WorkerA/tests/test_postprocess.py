@@ -0,0 +1,53 @@
+# Base
+import os
+from concurrent.futures import BrokenExecutor
+
+# Third-party
+import numpy as np
+import pytest
+
+# Local
+from src.postprocess import PostProcessPool
+from src.failures import classify_error
+
+def total(array: np.ndarray, scale: float = 1.0) -> float:
+    return float(array.sum()) * scale
+
+def crash(array: np.ndarray) -> float:
+    # Like an OOM kill, the process dies without raising
+    os._exit(1)
+
+def shared_blocks() -> set:
+    # Shared memory blocks only, not the semaphores of executors
+    if not os.path.isdir("/dev/shm"):
+        return set()
+    return { name for name in os.listdir("/dev/shm") if name.startswith("psm_") }
+
+def test_results_come_back_through_shared_memory():
+    pool = PostProcessPool(1)
+    try:
+        array = np.arange(12, dtype=np.float32).reshape(3, 4)
+        assert pool.run(total, [array], scale=2.0) == 132.0
+    finally:
+        pool.shutdown()
+
+def test_crashed_process_is_transient_and_pool_recovers():
+    pool = PostProcessPool(1)
+    before = shared_blocks()
+    try:
+        array = np.ones((64, 64), dtype=np.float32)
+        with pytest.raises(BrokenExecutor) as info:
+            pool.run(crash, [array])
+        assert classify_error(info.value) == "transient"
+
+        # A fresh executor serves the next task
+        assert pool.run(total, [array]) == 4096.0
+        report = pool.report()
+        assert report["restarts"] == 1
+        assert report["failed"] == 1
+        assert report["pending"] == 0
+    finally:
+        pool.shutdown()
+
+    # Blocks of the failed call were unlinked too
+    assert shared_blocks() == before
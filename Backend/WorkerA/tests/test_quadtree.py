@@ -0,0 +1,91 @@
+# Third-party
+import numpy as np
+import pytest
+
+# The depth package loads the model backends with it
+pytest.importorskip("torch")
+pytest.importorskip("open3d")
+
+# Local
+from src.depth.meshing import create_pixel_vertice_mapping, triangulate_grid
+from src.depth.quadtree import QuadtreeTriangulator, adaptive_lods
+
+TOLERANCES = [0.0, 0.002, 0.01, 0.05, 1.0]
+
+def bumpy_depth(h: int, w: int) -> np.ndarray:
+    # Flat regions merge into large blocks, the bump keeps small ones
+    ys, xs = np.mgrid[0:h, 0:w].astype(np.float32)
+    bump = np.exp(-((ys - h * 0.6) ** 2 + (xs - w * 0.3) ** 2) / (0.02 * h * w))
+    return (1.0 + 0.01 * xs + 0.5 * bump).astype(np.float32)
+
+def vertex_pixels(grid: np.ndarray) -> np.ndarray:
+    return np.stack(np.nonzero(grid >= 0), axis=1)
+
+def signed_areas(triangles: np.ndarray, pixels: np.ndarray) -> np.ndarray:
+    a, b, c = (pixels[triangles[:, i]].astype(np.float64) for i in range(3))
+    return ((b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0]) - (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1])) / 2
+
+def boundary_edges(triangles: np.ndarray) -> np.ndarray:
+    """
+    Directed edges without their reverse in another triangle. Raises if an
+    edge is used twice in the same direction (overlap or flipped winding).
+    """
+    edges = np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]])
+    directed = set(map(tuple, edges.tolist()))
+    assert len(directed) == edges.shape[0]
+    return np.array([edge for edge in directed if edge[::-1] not in directed]).reshape(-1, 2)
+
+def check_surface(triangles: np.ndarray, pixels: np.ndarray, expected_area: float):
+    areas = signed_areas(triangles, pixels)
+    # One winding, no degenerate triangles, no holes or overlaps
+    assert np.all(areas > 0) or np.all(areas < 0)
+    assert np.abs(areas).sum() == pytest.approx(expected_area)
+
+def test_full_mask_lods_are_watertight():
+    h, w = 37, 50
+    depth = bumpy_depth(h, w)
+    mask = np.ones((h, w), dtype=bool)
+    grid, _ = create_pixel_vertice_mapping(mask)
+    pixels = vertex_pixels(grid)
+    triangulator = QuadtreeTriangulator(depth, mask, grid)
+
+    counts = []
+    for tolerance in TOLERANCES:
+        triangles, stats = triangulator.triangulate(tolerance)
+        counts.append(triangles.shape[0])
+        assert stats["max_error"] <= tolerance + 1e-6
+        check_surface(triangles, pixels, (h - 1) * (w - 1))
+
+        # Every interior edge is shared by exactly two triangles, so the
+        # only open edges run along the image border: no T-junction cracks
+        edges = boundary_edges(triangles)
+        ends = pixels[edges]
+        on_border = (ends[..., 0] == 0) | (ends[..., 0] == h - 1) | (ends[..., 1] == 0) | (ends[..., 1] == w - 1)
+        assert on_border.all()
+        same_side = (ends[:, 0, 0] == ends[:, 1, 0]) | (ends[:, 0, 1] == ends[:, 1, 1])
+        assert same_side.all()
+        length = np.abs(ends[:, 0] - ends[:, 1]).sum()
+        assert length == 2 * (h - 1) + 2 * (w - 1)
+
+    # Even zero tolerance merges exactly planar blocks, coarser levels use fewer triangles
+    assert counts[0] < triangulate_grid(grid).shape[0]
+    assert counts == sorted(counts, reverse=True)
+    assert counts[-1] < counts[0] // 10
+
+def test_masked_lods_cover_the_grid_surface():
+    h, w = 45, 33
+    depth = bumpy_depth(h, w)
+    ys, xs = np.mgrid[0:h, 0:w]
+    mask = (ys - 20) ** 2 + (xs - 15) ** 2 > 36
+    mask[:, :3] = False
+    grid, num_vertices = create_pixel_vertice_mapping(mask)
+    pixels = vertex_pixels(grid)
+
+    grid_area = np.abs(signed_areas(triangulate_grid(grid), pixels)).sum()
+    for used, triangles, _ in adaptive_lods(depth, mask, grid, TOLERANCES):
+        # Compacted vertices, mapped back to the grid for geometry
+        assert triangles.max() < used.shape[0] <= num_vertices
+        triangles = used[triangles]
+
+        check_surface(triangles, pixels, grid_area)
+        boundary_edges(triangles)
@@ -0,0 +1,114 @@
+# Base
+import json
+from typing import Dict, List
+
+# Local
+from src.priority import Priority
+from src.aws.queue import QueueMessage
+from src.scheduling import FairScheduler
+
+class FakeLane:
+    """
+    In-memory stand-in for the SQS queue of one lane.
+    """
+    def __init__(self) -> None:
+        self.messages: List[QueueMessage] = []
+        self.long_polls = 0
+        self.visibility: Dict[str, int] = {}
+        self.deleted: List[str] = []
+
+    def add(self, project_id: str, tenant_id: str = "default"):
+        body = json.dumps({ "project_id": project_id, "tenant_id": tenant_id })
+        self.messages.append(QueueMessage(body, f"receipt-{project_id}"))
+
+    def receive_messages(self, max_messages: int = 1, wait_time: int = 10) -> List[QueueMessage]:
+        self.long_polls += int(wait_time > 0)
+        messages, self.messages = self.messages[:max_messages], self.messages[max_messages:]
+        return messages
+
+    def change_message_visibility(self, receipt_handle: str, timeout: int):
+        self.visibility[receipt_handle] = timeout
+
+    def delete_message(self, receipt_handle: str):
+        self.deleted.append(receipt_handle)
+
+def make_scheduler(**kwargs) -> FairScheduler:
+    scheduler = FairScheduler("test-queue", region="eu-central-1", heartbeat_interval_s=0, **kwargs)
+    scheduler.lanes = { priority: FakeLane() for priority in Priority }
+    return scheduler
+
+def test_restricted_lanes_never_touch_other_lanes():
+    scheduler = make_scheduler(lane_weights={ Priority.BATCH: 2.0, Priority.SPECULATIVE: 1.0 })
+    scheduler.lanes[Priority.INTERACTIVE].add("interactive")
+
+    # Empty buffer, the long poll goes to the highest weighted enabled lane
+    assert scheduler.next_task() is None
+    assert scheduler.lanes[Priority.BATCH].long_polls == 1
+    assert scheduler.lanes[Priority.INTERACTIVE].long_polls == 0
+
+    scheduler.lanes[Priority.BATCH].add("batch")
+    scheduler.lanes[Priority.SPECULATIVE].add("speculative")
+    started = [scheduler.next_task().project_id, scheduler.next_task().project_id]
+
+    assert sorted(started) == ["batch", "speculative"]
+    assert scheduler.next_task() is None
+    # The interactive message stays in SQS for the workers serving it
+    assert len(scheduler.lanes[Priority.INTERACTIVE].messages) == 1
+
+def started(scheduler: FairScheduler, count: int) -> List[str]:
+    return [scheduler.next_task().project_id for _ in range(count)]
+
+def test_lanes_share_starts_by_weight():
+    scheduler = make_scheduler(lane_weights={ Priority.INTERACTIVE: 3.0, Priority.BATCH: 1.0 })
+    for i in range(40):
+        scheduler.lanes[Priority.INTERACTIVE].add(f"i{i}")
+        scheduler.lanes[Priority.BATCH].add(f"b{i}")
+
+    lanes = [project_id[0] for project_id in started(scheduler, 20)]
+
+    # 3:1 over full stride cycles, batch work keeps moving
+    assert lanes.count("i") == 15
+    assert lanes.count("b") == 5
+    assert "b" in lanes[:4]
+
+def test_tenants_alternate_inside_a_lane():
+    scheduler = make_scheduler(prefetch=10, lane_weights={ Priority.BATCH: 1.0 })
+    lane = scheduler.lanes[Priority.BATCH]
+    for i in range(6):
+        lane.add(f"a{i}", "tenant-a")
+    lane.add("b0", "tenant-b")
+    lane.add("b1", "tenant-b")
+
+    # Tenant b is not stuck behind all of tenant a's buffered messages
+    assert started(scheduler, 6) == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+def test_tenant_weights_inside_a_lane():
+    scheduler = make_scheduler(
+        prefetch=10,
+        lane_weights={ Priority.BATCH: 1.0 },
+        tenant_weights={ "tenant-a": 2.0 }
+    )
+    lane = scheduler.lanes[Priority.BATCH]
+    for i in range(5):
+        lane.add(f"a{i}", "tenant-a")
+        lane.add(f"b{i}", "tenant-b")
+
+    tenants = [project_id[0] for project_id in started(scheduler, 6)]
+    assert tenants.count("a") == 4
+    assert tenants.count("b") == 2
+
+def test_idle_lanes_do_not_bank_credit():
+    scheduler = make_scheduler(lane_weights={ Priority.INTERACTIVE: 1.0, Priority.BATCH: 1.0 })
+    for i in range(10):
+        scheduler.lanes[Priority.BATCH].add(f"b{i}")
+    started(scheduler, 10)
+
+    # Interactive was idle while batch ran alone, it joins at the current
+    # virtual time instead of taking the next ten starts in a row
+    for i in range(10):
+        scheduler.lanes[Priority.INTERACTIVE].add(f"i{i}")
+        scheduler.lanes[Priority.BATCH].add(f"b{10 + i}")
+    lanes = [project_id[0] for project_id in started(scheduler, 6)]
+
+    assert "b" in lanes[:3]
+    assert abs(lanes.count("i") - lanes.count("b")) <= 2
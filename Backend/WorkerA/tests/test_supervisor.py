@@ -0,0 +1,96 @@
+# Base
+import os
+import sys
+import json
+import time
+from pathlib import Path
+
+# Third-party
+import pytest
+
+# Local
+from src.supervisor import Supervisor, core_slices
+
+# Stand-in worker: records what it was started with, then crashes
+CHILD = """
+import os, sys, json
+record = {
+    "argv": sys.argv[1:],
+    "cuda_visible_devices": os.environ.get("CUDA_VISIBLE_DEVICES"),
+    "omp_num_threads": os.environ.get("OMP_NUM_THREADS"),
+    "affinity": sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+}
+path = os.path.join(os.environ["SUPERVISOR_TEST_DIR"], f"{os.getpid()}.json")
+with open(path, "w") as file:
+    json.dump(record, file)
+sys.exit(3)
+"""
+
+def child_records(directory: Path) -> list:
+    return [json.loads(path.read_text()) for path in sorted(directory.glob("*.json"))]
+
+def wait_for_exit(supervisor: Supervisor, timeout_s: float = 10):
+    deadline = time.monotonic() + timeout_s
+    for worker in supervisor.workers:
+        if worker.process is not None:
+            worker.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+
+def test_children_get_their_device_slice(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("SUPERVISOR_TEST_DIR", str(tmp_path))
+    supervisor = Supervisor(
+        [sys.executable, "-c", CHILD, "--queue-prefetch", "1"],
+        ["cuda:1", "cpu:0", "cpu:1"]
+    )
+
+    for worker in supervisor.workers:
+        supervisor._start(worker)
+    wait_for_exit(supervisor)
+    records = [
+        json.loads((tmp_path / f"{worker.process.pid}.json").read_text())
+        for worker in supervisor.workers
+    ]
+
+    # The GPU child sees its card as cuda:0 only, and is not pinned
+    gpu = records[0]
+    assert gpu["argv"] == ["--queue-prefetch", "1", "--device", "cuda:0"]
+    assert gpu["cuda_visible_devices"] == "1"
+    assert gpu["omp_num_threads"] == os.environ.get("OMP_NUM_THREADS")
+    if hasattr(os, "sched_getaffinity"):
+        assert gpu["affinity"] == sorted(os.sched_getaffinity(0))
+
+    # CPU children hide the GPUs and each get their own core slice
+    for record, cores in zip(records[1:], core_slices(2)):
+        assert record["argv"] == ["--queue-prefetch", "1", "--device", "cpu"]
+        assert record["cuda_visible_devices"] == ""
+        assert record["omp_num_threads"] == str(len(cores))
+        if hasattr(os, "sched_setaffinity"):
+            assert record["affinity"] == cores
+
+def test_crashing_child_backs_off_then_is_given_up(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("SUPERVISOR_TEST_DIR", str(tmp_path))
+    supervisor = Supervisor(
+        [sys.executable, "-c", CHILD],
+        ["cpu:0"],
+        max_restarts=2,
+        backoff_s=0.05,
+        max_backoff_s=0.08
+    )
+    worker = supervisor.workers[0]
+
+    delays = []
+    supervisor._start(worker)
+    deadline = time.monotonic() + 30
+    while not worker.given_up and time.monotonic() < deadline:
+        crashes = len(worker.crashes)
+        supervisor._check(worker)
+        if len(worker.crashes) > crashes and not worker.given_up:
+            delays.append(worker.next_start - worker.crashes[-1])
+        time.sleep(0.01)
+
+    assert worker.given_up
+    # Exponential backoff, capped at max_backoff_s
+    assert delays == pytest.approx([0.05, 0.08])
+    assert worker.starts == 3
+    assert worker.exit_codes == [3, 3, 3]
+    assert len(child_records(tmp_path)) == 3
+    assert supervisor.report()["cpu:0"]["given_up"]
@@ -22,6 +22,9 @@ from src.utils.camera_util import (
 from src.utils.infer_util import remove_background, resize_foreground, images_to_video
 from huggingface_hub import hf_hub_download
 
+from loading import ModelHandle, cached_safetensors
+from residency import ResidencyManager
+
 def get_render_cameras(batch_size=1, M=120, radius=2.5, elevation=10.0, is_flexicubes=False):
     """
     Get the rendering camera parameters.
@@ -67,38 +70,75 @@ IS_FLEXICUBES = True if config_name.startswith('instant-mesh') else False
 
 device = torch.device('cuda')
 
-# load diffusion model
-print('Loading diffusion model ...')
-pipeline = DiffusionPipeline.from_pretrained(
-    "sudo-ai/zero123plus-v1.2", 
-    custom_pipeline="InstantMesh/zero123plus",
-    torch_dtype=torch.float16,
-)
-pipeline.scheduler = EulerAncestralDiscreteScheduler.from_config(
-    pipeline.scheduler.config, timestep_spacing='trailing'
-)
+# Safetensors copies of the checkpoints, memory-mapped on later starts
+weights_dir = 'models/safetensors'
 
-# load custom white-background UNet
-unet_ckpt_path = hf_hub_download(repo_id="TencentARC/InstantMesh", filename="diffusion_pytorch_model.bin", repo_type="model")
-state_dict = torch.load(unet_ckpt_path, map_location='cpu')
-pipeline.unet.load_state_dict(state_dict, strict=True)
+# Both models share the card, idle ones go to host memory under a budget
+residency = ResidencyManager('cuda')
+
+def set_device(name: str):
+    """
+    Card the models load on, e.g. cuda:1, set before loading.
+    """
+    global device, residency
+    device = torch.device(name)
+    residency = ResidencyManager(name, budget_gb=residency.budget_gb, pin_memory=residency.pin_memory)
+
+# Memory saving modes of the diffusion pipeline, set before loading
+MEMORY_MODES = ['attention_slicing', 'vae_slicing', 'vae_tiling']
+memory_modes = []
+
+def load_diffusion():
+    print('Loading diffusion model ...')
+    pipeline = DiffusionPipeline.from_pretrained(
+        "sudo-ai/zero123plus-v1.2", 
+        custom_pipeline="InstantMesh/zero123plus",
+        torch_dtype=torch.float16,
+    )
+    pipeline.scheduler = EulerAncestralDiscreteScheduler.from_config(
+        pipeline.scheduler.config, timestep_spacing='trailing'
+    )
 
-pipeline = pipeline.to(device)
+    # load custom white-background UNet
+    unet_ckpt_path = hf_hub_download(repo_id="TencentARC/InstantMesh", filename="diffusion_pytorch_model.bin", repo_type="model")
+    state_dict = cached_safetensors(unet_ckpt_path, os.path.join(weights_dir, 'instant_mesh_unet.safetensors'))
+    pipeline.unet.load_state_dict(state_dict, strict=True)
+
+    pipeline = pipeline.to(residency.load_device())
+    for mode in memory_modes:
+        if mode not in MEMORY_MODES:
+            raise ValueError(f'Invalid memory mode: {mode}')
+        if mode == 'attention_slicing':
+            pipeline.enable_attention_slicing()
+        else:
+            # The custom pipeline may not forward these, the VAE has them
+            getattr(pipeline.vae, {'vae_slicing': 'enable_slicing', 'vae_tiling': 'enable_tiling'}[mode])()
+    return residency.register_pipeline('zero123plus', pipeline)
+
+def load_reconstruction():
+    print('Loading reconstruction model ...')
+    model_ckpt_path = hf_hub_download(repo_id="TencentARC/InstantMesh", filename="instant_mesh_large.ckpt", repo_type="model")
+    state_dict = cached_safetensors(
+        model_ckpt_path,
+        os.path.join(weights_dir, 'instant_mesh_large.safetensors'),
+        # Only the generator weights of the lightning checkpoint
+        extract=lambda ckpt: {k[14:]: v for k, v in ckpt['state_dict'].items() if k.startswith('lrm_generator.') and 'source_camera' not in k}
+    )
+    model = instantiate_from_config(model_config)
+    model.load_state_dict(state_dict, strict=True)
 
-# load reconstruction model
-print('Loading reconstruction model ...')
-model_ckpt_path = hf_hub_download(repo_id="TencentARC/InstantMesh", filename="instant_mesh_large.ckpt", repo_type="model")
-model = instantiate_from_config(model_config)
-state_dict = torch.load(model_ckpt_path, map_location='cpu')['state_dict']
-state_dict = {k[14:]: v for k, v in state_dict.items() if k.startswith('lrm_generator.') and 'source_camera' not in k}
-model.load_state_dict(state_dict, strict=True)
+    model = model.to(residency.load_device())
+    if IS_FLEXICUBES:
+        model.init_flexicubes_geometry(device, fovy=30.0)
+    return residency.register('instant-mesh', model.eval())
 
-model = model.to(device)
-if IS_FLEXICUBES:
-    model.init_flexicubes_geometry(device, fovy=30.0)
-model = model.eval()
+def warmup_diffusion(pipeline):
+    with residency.use('zero123plus'):
+        pipeline(Image.new('RGB', (320, 320), 'white'), num_inference_steps=1)
 
-print('Loading Finished!')
+# Loaded on first use, or in the background once started
+diffusion_model = ModelHandle('zero123plus', load_diffusion, warmup=warmup_diffusion)
+reconstruction_model = ModelHandle('instant-mesh-large', load_reconstruction)
 
 def preprocess(input_image, do_remove_background):
 
@@ -114,17 +154,21 @@ def generate_mvs(input_image, sample_steps, sample_seed):
     seed_everything(sample_seed)
     
     # sampling
+    pipeline = diffusion_model.get()
     generator = torch.Generator(device=device)
-    z123_image = pipeline(
-        input_image, 
-        num_inference_steps=sample_steps, 
-        generator=generator,
-    ).images[0]
+    with residency.use('zero123plus'):
+        z123_image = pipeline(
+            input_image, 
+            num_inference_steps=sample_steps, 
+            generator=generator,
+        ).images[0]
 
     return z123_image
 
 
 def make_mesh(planes):
+    model = reconstruction_model.get()
+    
     # Inference
     with torch.no_grad():
         mesh_out = model.extract_mesh(
@@ -146,6 +190,7 @@ def make_mesh(planes):
     )
 
 def make3d(images):
+    model = reconstruction_model.get()
 
     images = np.asarray(images, dtype=np.float32) / 255.0
     images = torch.from_numpy(images).permute(2, 0, 1).contiguous().float()     # (3, 960, 640)
@@ -190,15 +235,11 @@ def run(
     sample_steps=75,
     sample_seed=42
 ):
-    # Cleat GPU memory before running
-    torch.cuda.empty_cache()
-    
+    # The residency manager frees cached blocks when it offloads, not every run
     processed_image = preprocess(image, do_remove_background)
     mv_images = generate_mvs(processed_image, sample_steps, sample_seed)
-    planes = make3d(mv_images)
-    vertices, uvs, faces, mesh_tex_idx, tex_map = make_mesh(planes)
-    
-    # Cleat GPU memory after running
-    torch.cuda.empty_cache()
+    with residency.use('instant-mesh'):
+        planes = make3d(mv_images)
+        vertices, uvs, faces, mesh_tex_idx, tex_map = make_mesh(planes)
     
     return vertices, uvs, faces, mesh_tex_idx, tex_map
\ No newline at end of file
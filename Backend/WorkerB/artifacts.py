@@ -0,0 +1,226 @@
+# Base
+import io
+import zipfile
+import tempfile
+from typing import BinaryIO, Dict, Union
+
+# Third-party
+import cv2
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+# Rows formatted per string operation when writing OBJ
+OBJ_CHUNK_ROWS = 1 << 16
+
+# PNG text chunk holding the depth units per 16-bit step
+DEPTH_SCALE_KEY = "depth_scale"
+
+class MeshData:
+    """
+    Array mesh as it is packaged into artifacts.
+
+    Args:
+        vertices: (V, 3) positions
+        triangles: (T, 3) vertex indices
+        uvs: (U, 2) texture coordinates, OBJ convention (v = 0 at the bottom)
+        uv_triangles: (T, 3) uv indices, defaults to triangles (per-vertex uvs)
+        texture: (H, W, 3) uint8 RGB, top row first
+    """
+    def __init__(
+        self,
+        vertices: np.ndarray,
+        triangles: np.ndarray,
+        uvs: np.ndarray = None,
+        uv_triangles: np.ndarray = None,
+        texture: np.ndarray = None
+    ) -> None:
+        self.vertices = vertices
+        self.triangles = triangles
+        self.uvs = uvs
+        self.uv_triangles = triangles if uv_triangles is None and uvs is not None else uv_triangles
+        self.texture = texture
+
+    @property
+    def textured(self) -> bool:
+        return self.uvs is not None and self.texture is not None
+
+    def without_texture(self) -> "MeshData":
+        return MeshData(self.vertices, self.triangles)
+
+# Serialization
+################################################################
+
+def _write_rows(
+    buffer: io.BytesIO,
+    row_format: str,
+    rows: np.ndarray
+):
+    # One %-format per chunk instead of one per row
+    for start in range(0, rows.shape[0], OBJ_CHUNK_ROWS):
+        chunk = rows[start:start + OBJ_CHUNK_ROWS]
+        text = (row_format * chunk.shape[0]) % tuple(chunk.ravel().tolist())
+        buffer.write(text.encode("ascii"))
+
+def obj_bytes(
+    mesh: MeshData,
+    mtl_name: str = None,
+    material: str = "material_0"
+) -> bytes:
+    buffer = io.BytesIO()
+    textured = mesh.textured and mtl_name is not None
+
+    if textured:
+        buffer.write(f"mtllib {mtl_name}\n".encode("ascii"))
+
+    _write_rows(buffer, "v %f %f %f\n", np.asarray(mesh.vertices, dtype=np.float64))
+
+    if textured:
+        _write_rows(buffer, "vt %f %f\n", np.asarray(mesh.uvs, dtype=np.float64))
+        buffer.write(f"usemtl {material}\n".encode("ascii"))
+
+        # Interleave vertex and uv indices: f v/vt v/vt v/vt
+        faces = np.empty((mesh.triangles.shape[0], 6), dtype=np.int64)
+        faces[:, 0::2] = mesh.triangles
+        faces[:, 1::2] = mesh.uv_triangles
+        _write_rows(buffer, "f %d/%d %d/%d %d/%d\n", faces + 1)
+    else:
+        _write_rows(buffer, "f %d %d %d\n", np.asarray(mesh.triangles, dtype=np.int64) + 1)
+
+    return buffer.getvalue()
+
+def mtl_bytes(
+    texture_name: str,
+    material: str = "material_0"
+) -> bytes:
+    return (
+        f"newmtl {material}\n"
+        "Kd 1 1 1\n"
+        "Ka 0 0 0\n"
+        "Ks 0.4 0.4 0.4\n"
+        "Ns 10\n"
+        "illum 2\n"
+        f"map_Kd {texture_name}\n"
+    ).encode("ascii")
+
+def png_bytes(image: np.ndarray) -> bytes:
+    ok, data = cv2.imencode(".png", cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+    if not ok:
+        raise ValueError("Failed to encode PNG")
+    return data.tobytes()
+
+def mesh_files(
+    mesh: MeshData,
+    name: str = "mesh"
+) -> Dict[str, bytes]:
+    """
+    Files of an OBJ artifact: name.obj, plus name.mtl and name_0.png if textured.
+    """
+    if not mesh.textured:
+        return { f"{name}.obj": obj_bytes(mesh) }
+
+    texture_name = f"{name}_0.png"
+    return {
+        f"{name}.obj": obj_bytes(mesh, mtl_name=f"{name}.mtl"),
+        f"{name}.mtl": mtl_bytes(texture_name),
+        texture_name: png_bytes(mesh.texture)
+    }
+
+# Zip
+################################################################
+
+def zip_files(
+    files: Dict[str, bytes],
+    spool_max_size: int = None
+) -> Union[io.BytesIO, BinaryIO]:
+    """
+    Zip in memory, or in a spooled file that moves to disk past spool_max_size.
+    Nothing is shared between calls, so concurrent tasks can not collide.
+    """
+    if spool_max_size is None:
+        buffer = io.BytesIO()
+    else:
+        buffer = tempfile.SpooledTemporaryFile(max_size=spool_max_size)
+
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for name, data in files.items():
+            # PNG is compressed already
+            compress_type = zipfile.ZIP_STORED if name.endswith(".png") else zipfile.ZIP_DEFLATED
+            zip_file.writestr(name, data, compress_type=compress_type)
+
+    buffer.seek(0)
+    return buffer
+
+def mesh_to_zip(
+    mesh: MeshData,
+    name: str = "mesh",
+    spool_max_size: int = None
+) -> Union[io.BytesIO, BinaryIO]:
+    return zip_files(mesh_files(mesh, name), spool_max_size=spool_max_size)
+
+# Point cloud
+################################################################
+
+# Binary PLY vertex record: position and 8-bit color
+PLY_VERTEX_DTYPE = np.dtype([
+    ("x", "<f4"), ("y", "<f4"), ("z", "<f4"),
+    ("red", "u1"), ("green", "u1"), ("blue", "u1")
+])
+
+def ply_bytes(
+    points: np.ndarray,
+    colors: np.ndarray = None
+) -> bytes:
+    """
+    Binary little-endian PLY of points (N, 3) with uint8 RGB colors (N, 3),
+    15 bytes per point against ~30 per vertex line of an OBJ.
+    """
+    records = np.zeros(points.shape[0], dtype=PLY_VERTEX_DTYPE)
+    records["x"], records["y"], records["z"] = np.asarray(points, dtype=np.float32).T
+    if colors is not None:
+        records["red"], records["green"], records["blue"] = np.asarray(colors, dtype=np.uint8).T
+
+    header = (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        f"element vertex {points.shape[0]}\n"
+        "property float x\n"
+        "property float y\n"
+        "property float z\n"
+        "property uchar red\n"
+        "property uchar green\n"
+        "property uchar blue\n"
+        "end_header\n"
+    ).encode("ascii")
+    return header + records.tobytes()
+
+def pointcloud_to_ply(
+    points: np.ndarray,
+    colors: np.ndarray = None
+) -> io.BytesIO:
+    buffer = io.BytesIO(ply_bytes(points, colors))
+    buffer.seek(0)
+    return buffer
+
+# Depth
+################################################################
+
+def depth_to_png(depth: np.ndarray) -> io.BytesIO:
+    """
+    Depth (H, W) as a 16-bit grayscale PNG, quantized over its own range.
+    """
+    depth = np.clip(np.asarray(depth, dtype=np.float32), 0, None)
+    peak = float(depth.max()) if depth.size > 0 else 0.0
+    scale = peak / 65535 if peak > 0 else 1.0
+
+    info = PngImagePlugin.PngInfo()
+    info.add_text(DEPTH_SCALE_KEY, repr(scale))
+
+    buffer = io.BytesIO()
+    Image.fromarray(np.round(depth / scale).astype(np.uint16)).save(buffer, format="PNG", pnginfo=info)
+    buffer.seek(0)
+    return buffer
+
+def depth_from_png(buffer: BinaryIO) -> np.ndarray:
+    image = Image.open(buffer)
+    scale = float(image.info.get(DEPTH_SCALE_KEY, 1.0))
+    return np.array(image).astype(np.float32) * scale
@@ -1,7 +1,7 @@
 # Base
 import uuid
 import json
-from typing import Tuple, List, Union
+from typing import Tuple, List, Union, Dict
 from pathlib import Path
 
 # AWS
@@ -15,10 +15,14 @@ class QueueMessage:
     def __init__(
         self,
         body: str,
-        receipt_handle: str
+        receipt_handle: str,
+        receive_count: int = 1,
+        attributes: Dict[str, str] = None
     ) -> None:
         self.body = body
         self.receipt_handle = receipt_handle
+        self.receive_count = receive_count
+        self.attributes = attributes or {}
     
     def body_json(self):
         return json.loads(self.body)
@@ -60,12 +64,24 @@ class SQSHelper:
     
     def send_message(
         self,
-        message: str
+        message: str,
+        attributes: Dict[str, str] = None,
+        delay_s: int = 0
     ):
         sqs = self._init_client()
+        kwargs = {}
+        if attributes:
+            kwargs["MessageAttributes"] = {
+                name: { "DataType": "String", "StringValue": str(value) }
+                for name, value in attributes.items()
+            }
+        if delay_s > 0:
+            # SQS delays messages for at most 15 minutes
+            kwargs["DelaySeconds"] = min(int(delay_s), 900)
         response = sqs.send_message(
             QueueUrl=self.name,
-            MessageBody=message
+            MessageBody=message,
+            **kwargs
         )
         return response
 
@@ -82,6 +98,7 @@ class SQSHelper:
             QueueUrl=self.name,
             MaxNumberOfMessages=max_messages,
             MessageAttributeNames=['All'],
+            AttributeNames=['ApproximateReceiveCount'],
             WaitTimeSeconds=wait_time
         )
         
@@ -90,7 +107,12 @@ class SQSHelper:
         for msg in response.get("Messages", []):
             msg_entity = QueueMessage(
                 body=msg["Body"],
-                receipt_handle=msg["ReceiptHandle"]
+                receipt_handle=msg["ReceiptHandle"],
+                receive_count=int(msg.get("Attributes", {}).get("ApproximateReceiveCount", 1)),
+                attributes={
+                    name: value.get("StringValue")
+                    for name, value in msg.get("MessageAttributes", {}).items()
+                }
             )
             messages.append(msg_entity)
         
@@ -105,4 +127,32 @@ class SQSHelper:
             QueueUrl=self.name,
             ReceiptHandle=receipt_handle
         )
-        return response
\ No newline at end of file
+        return response
+
+    def change_message_visibility(
+        self,
+        receipt_handle: str,
+        timeout: int
+    ):
+        sqs = self._init_client()
+        response = sqs.change_message_visibility(
+            QueueUrl=self.name,
+            ReceiptHandle=receipt_handle,
+            VisibilityTimeout=timeout
+        )
+        return response
+
+    def get_queue_depth(self) -> Dict[str, int]:
+        sqs = self._init_client()
+        response = sqs.get_queue_attributes(
+            QueueUrl=self.name,
+            AttributeNames=[
+                "ApproximateNumberOfMessages",
+                "ApproximateNumberOfMessagesNotVisible"
+            ]
+        )
+        attributes = response.get("Attributes", {})
+        return {
+            "visible": int(attributes.get("ApproximateNumberOfMessages", 0)),
+            "in_flight": int(attributes.get("ApproximateNumberOfMessagesNotVisible", 0))
+        }
\ No newline at end of file
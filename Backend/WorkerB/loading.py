@@ -0,0 +1,119 @@
+# Base
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, Union
+
+# Third-party
+import torch
+from safetensors.torch import load_file, save_file
+
+class ModelHandle:
+    """
+    Model loaded once, in a background thread after start() or on first get().
+
+    Load and warmup times are kept for the startup report.
+    """
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        warmup: Callable[[Any], None] = None
+    ) -> None:
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+
+        self.model = None
+        self.error: Union[Exception, None] = None
+        self.timings: Dict[str, float] = {}
+
+        self.created_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.loaded_event = threading.Event()
+        self.thread: Union[threading.Thread, None] = None
+
+    # Private
+    ################################################################
+
+    def _load(self):
+        with self.lock:
+            if self.loaded_event.is_set():
+                return
+
+            try:
+                start = time.monotonic()
+                model = self.loader()
+                self.timings["load_s"] = time.monotonic() - start
+
+                if self.warmup is not None:
+                    start = time.monotonic()
+                    self.warmup(model)
+                    self.timings["warmup_s"] = time.monotonic() - start
+
+                self.model = model
+
+            except Exception as e:
+                print(f"Failed to load {self.name}: {e}")
+                self.error = e
+
+            finally:
+                self.timings["ready_after_s"] = time.monotonic() - self.created_at
+                self.loaded_event.set()
+
+        print(f"Model {self.name}: {self.describe()}")
+
+    # Public
+    ################################################################
+
+    def start(self) -> "ModelHandle":
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._load, name=f"load-{self.name}", daemon=True)
+            self.thread.start()
+        return self
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_event.is_set() and self.error is None
+
+    def get(self, timeout: float = None) -> Any:
+        """
+        The loaded model, loads it here if start() was never called.
+        """
+        if self.thread is None:
+            self._load()
+        elif not self.loaded_event.wait(timeout):
+            raise TimeoutError(f"Model {self.name} not loaded after {timeout} s")
+
+        if self.error is not None:
+            raise RuntimeError(f"Model {self.name} failed to load: {self.error}")
+        return self.model
+
+    def describe(self) -> str:
+        if len(self.timings) == 0:
+            return "loading"
+        return ", ".join(f"{key[:-2].replace('_', ' ')} {value:.1f} s" for key, value in self.timings.items())
+
+def cached_safetensors(
+    source_path: str,
+    target_path: str,
+    extract: Callable[[Dict[str, torch.Tensor]], Dict[str, torch.Tensor]] = None
+) -> Dict[str, torch.Tensor]:
+    """
+    State dict of a torch.load checkpoint, converted to safetensors at
+    target_path on first use. Later loads memory-map the converted file
+    instead of unpickling the whole checkpoint.
+    """
+    if not os.path.exists(target_path):
+        print(f"Converting {source_path} to {target_path}")
+        state_dict = torch.load(source_path, map_location="cpu")
+        if extract is not None:
+            state_dict = extract(state_dict)
+
+        # Write next to the target, rename once complete
+        os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+        partial = target_path + ".part"
+        save_file({ key: value.contiguous() for key, value in state_dict.items() }, partial)
+        os.replace(partial, target_path)
+
+    return load_file(target_path)
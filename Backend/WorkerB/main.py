@@ -1,6 +1,21 @@
+import argparse
+
 from aws.credentials import AWSCredentials
 from model import ObjectMeshGenModel
 
+parser = argparse.ArgumentParser(description="MeshGen worker B (object meshes)")
+parser.add_argument("--device", default="cuda")
+parser.add_argument("--queue-prefetch", type=int, default=1)
+parser.add_argument("--vram-budget-gb", type=float, default=None)
+parser.add_argument("--memory-modes", nargs="*", default=[], choices=["attention_slicing", "vae_slicing", "vae_tiling"])
+args = parser.parse_args()
+
 credentials = AWSCredentials.from_json_file("../credentials.json")
-model = ObjectMeshGenModel(credentials)
+model = ObjectMeshGenModel(
+    credentials,
+    queue_prefetch=args.queue_prefetch,
+    vram_budget_gb=args.vram_budget_gb,
+    memory_modes=args.memory_modes,
+    device=args.device
+)
 model.run()
\ No newline at end of file
@@ -1,9 +1,9 @@
 # Base
 import io
 import json
-import zipfile
+import time
 from uuid import UUID
-from pathlib import Path
+from typing import Dict, Sequence, Union
 
 # InstantMesh
 import sys
@@ -12,24 +12,49 @@ from InstantMesh import pipeline
 
 # Local
 import utils
+import artifacts
+from artifacts import MeshData
 from data_key import DataKey
 from aws.storage import S3Helper
 from aws.queue import SQSHelper, QueueMessage
 from aws.credentials import AWSCredentials
+from scheduling import FairScheduler, ScheduledTask
+from failures import TaskFailureHandler, TransientError, PoisonTaskError
+from roles import WorkerCapabilities, RoleThroughput, CapabilityAdvertiser
 
 class ObjectMeshGenModel:
     def __init__(
         self,
         credentials: AWSCredentials = None,
-        temp_dir: Path = "data/temp",
         wait_time: int = 2,
+        queue_prefetch: int = 1,
+        report_interval_s: float = 60,
+        advertise_interval_s: float = 30,
+        vram_budget_gb: Union[float, None] = None,
+        pin_memory: bool = True,
+        memory_modes: Sequence[str] = (),
+        device: str = "cuda"
     ) -> None:
-        self.temp_dir = Path(temp_dir)
-        self.temp_dir.mkdir(parents=True, exist_ok=True)
-        
         self.wait_time = wait_time
+        self.queue_prefetch = queue_prefetch
+        self.report_interval_s = report_interval_s
+        
+        # Both models on one card under one VRAM budget, configured before they load
+        pipeline.set_device(device)
+        pipeline.residency.budget_gb = vram_budget_gb
+        pipeline.residency.pin_memory = pin_memory
+        pipeline.memory_modes = list(memory_modes)
+        
+        # Object meshes need InstantMesh on a GPU
+        self.capabilities = WorkerCapabilities(["object"], device=device)
+        self.throughput = RoleThroughput()
+        self.advertise_interval_s = advertise_interval_s
+        
+        # Tasks acknowledged without running, their outputs existed
+        self.skipped_existing = 0
         
         self.setup_aws(credentials)
+        self.setup_models()
     
     def setup_aws(
         self,
@@ -43,41 +68,101 @@ class ObjectMeshGenModel:
         )
         
         # SQS
-        self.sqs_object_gen = SQSHelper(
+        self.sqs_object_gen = FairScheduler(
             "mg-object-gen",
             region="eu-central-1",
-            credentials=credentials
+            credentials=credentials,
+            prefetch=self.queue_prefetch,
+            wait_time=self.wait_time
         )
         self.sqs_result = SQSHelper(
             "mg-result-queue",
             region="eu-central-1",
             credentials=credentials
         )
+        self.sqs_dead_letter = SQSHelper(
+            "mg-dead-letter",
+            region="eu-central-1",
+            credentials=credentials
+        )
+        
+        # Retries and dead-lettering of failed tasks
+        self.failures = TaskFailureHandler(self.sqs_result, self.sqs_dead_letter)
+        
+        # Capabilities and throughput, for routing and reporting on the server
+        self.advertiser = CapabilityAdvertiser(
+            self.sqs_result,
+            self.capabilities,
+            self.throughput,
+            counters=self.duplicate_counters,
+            interval_s=self.advertise_interval_s
+        )
+    
+    def setup_models(self):
+        # Load in the background, tasks are taken once both are ready
+        self.model_handles = [
+            pipeline.diffusion_model.start(),
+            pipeline.reconstruction_model.start()
+        ]
     
     def run(self):
+        while not all(handle.ready for handle in self.model_handles):
+            for handle in self.model_handles:
+                if handle.error is not None:
+                    raise RuntimeError(f"Model {handle.name} failed to load: {handle.error}")
+            time.sleep(0.5)
+        for handle in self.model_handles:
+            print(f"Model {handle.name}: {handle.describe()}")
+        
+        self.advertiser.start()
+        last_report = time.monotonic()
         while True:
             try:
                 self._run_mesh_generation()
             except Exception as e:
                 print(f"Error in mesh generation: {e}")
+            
+            if time.monotonic() - last_report >= self.report_interval_s:
+                for role, stats in self.throughput.summary().items():
+                    print(f"Role {role}: {stats['completed']} completed, {stats['per_min']:.1f} per min")
+                counters = ", ".join(f"{name} {count}" for name, count in self.duplicate_counters().items())
+                print(f"Duplicates: {counters}")
+                print(f"GPU memory: {pipeline.residency.summary()}")
+                for name, stats in pipeline.residency.report().items():
+                    print(
+                        f"Module {name}: {stats['mb']:.0f} MB, {'resident' if stats['resident'] else 'offloaded'}, "
+                        f"{stats['loads']} loads, {stats['offloads']} offloads, {stats['transfer_s']:.1f} s moving"
+                    )
+                last_report = time.monotonic()
     
     def _run_mesh_generation(self):
         print(f"Looking for mesh generation tasks")
-        tasks = self.sqs_object_gen.receive_messages(
-            max_messages=1,
-            wait_time=self.wait_time
-        )
+        task = self.sqs_object_gen.next_task()
+        tasks = [] if task is None else [task]
         print(f"Read {len(tasks)} tasks from o-mesh queue")
         
         for task in tasks:
-            task_data = task.body_json()
-            print(f"Task data: {task_data}")
-
             try:
+                # Task crashed the worker on earlier attempts
+                if self.failures.exhausted(task):
+                    raise PoisonTaskError(f"Gave up after {task.receive_count - 1} receives without finishing")
+                
+                task_data = task.body_json()
+                print(f"Task data: {task_data}")
+                
+                # Message came back while another worker was finishing it
+                if self._outputs_exist(task_data):
+                    print("Outputs of o-mesh task exist, skipping")
+                    self.skipped_existing += 1
+                    self._acknowledge(task, task_data)
+                    continue
+                
                 print("Loading image")
                 image_bytes = self.s3_storage.download_file(
                     DataKey.image(task_data["project_id"])
                 )
+                if image_bytes is None:
+                    raise TransientError("Failed to download image")
                 
                 print("Processing image")
                 image = utils.open_image(image_bytes, mode="RGB")
@@ -86,55 +171,70 @@ class ObjectMeshGenModel:
                 print("Inferencing")
                 vertices, uvs, faces, tex_idx, tex_map = pipeline.run(image)
                 
+                mesh = MeshData(
+                    vertices,
+                    faces,
+                    uvs=uvs,
+                    uv_triangles=tex_idx,
+                    texture=utils.prepare_texture_map(tex_map)
+                )
+                
                 print("Creating texturless mesh")
-                self.clear_temp()
-                utils.save_obj(vertices, faces, self.temp_dir / "mesh.obj")
-                buffer = self.zip_temp()
+                buffer = artifacts.mesh_to_zip(mesh.without_texture())
 
                 print("Saving texturless mesh")
-                self.s3_storage.upload_file(
+                uploaded = self.s3_storage.upload_file(
                     DataKey.mesh(task_data["project_id"], perspective=False, textured=False),
                     buffer
                 )
                 
                 print("Creating textured mesh")
-                self.clear_temp()
-                utils.save_obj_with_mtl(vertices, uvs, faces, tex_idx, tex_map, self.temp_dir / "mesh.obj")
-                buffer = self.zip_temp()
+                buffer = artifacts.mesh_to_zip(mesh)
                 
                 print("Saving textured mesh")
-                self.s3_storage.upload_file(
+                uploaded &= self.s3_storage.upload_file(
                     DataKey.mesh(task_data["project_id"], perspective=False, textured=True),
                     buffer
                 )
+                if not uploaded:
+                    raise TransientError("Failed to upload mesh")
         
             except Exception as e:
                 print(f"Failed to process o-mesh task: {e}")
+                self.failures.handle(self.sqs_object_gen, task, "omesh_gen", e)
             
-            finally:
-                print("Deleting message")
-                self.sqs_object_gen.delete_message(task.receipt_handle)
-                
-                # Send result message
-                message = json.dumps({
-                    "project_id": task_data["project_id"],
-                    "task_type": "omesh_gen"
-                })
-                self.sqs_result.send_message(message)
+            else:
+                self._acknowledge(task, task_data)
     
-    def clear_temp(self):
-        for file_p in self.temp_dir.glob("*"):
-            file_p.unlink()
+    def _outputs_exist(self, task_data: dict) -> bool:
+        return all(
+            self.s3_storage.file_exists(
+                DataKey.mesh(task_data["project_id"], perspective=False, textured=textured)
+            )
+            for textured in [True, False]
+        )
     
-    def zip_temp(self):
-        # Write to zip
-        files_p = list(self.temp_dir.glob("*"))
-        buffer = io.BytesIO()
-        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            for file_p in files_p:
-                zip_file.write(file_p, file_p.name)
-                file_p.unlink()
+    def _acknowledge(
+        self,
+        task: ScheduledTask,
+        task_data: dict
+    ):
+        print("Deleting message")
+        self.sqs_object_gen.delete(task)
+        
+        # Send result message
+        message = json.dumps({
+            "project_id": task_data["project_id"],
+            "task_type": "omesh_gen",
+            "status": "done",
+            **task.result_fields()
+        })
+        self.sqs_result.send_message(message)
         
-        # Return
-        buffer.seek(0)
-        return buffer
\ No newline at end of file
+        self.throughput.record("object")
+    
+    def duplicate_counters(self) -> Dict[str, int]:
+        return {
+            "skipped_existing": self.skipped_existing,
+            **{ name: self.sqs_object_gen.counters[name] for name in ["redelivered", "lease_lost", "heartbeats"] }
+        }
@@ -0,0 +1,31 @@
+from enum import IntEnum
+from typing import Union
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+    SPECULATIVE = 2
+
+    @property
+    def lane(self) -> str:
+        return self.name.lower()
+
+    @staticmethod
+    def parse(value: Union[str, int, "Priority", None]) -> "Priority":
+        if value is None:
+            return Priority.INTERACTIVE
+        if isinstance(value, str):
+            return Priority[value.upper()]
+        return Priority(value)
+
+def lane_queue_name(
+    base_name: str,
+    priority: Priority
+) -> str:
+    """
+    Interactive lane keeps the original queue name, so old messages
+    and workers without lane support keep working.
+    """
+    if priority == Priority.INTERACTIVE:
+        return base_name
+    return f"{base_name}-{priority.lane}"
\ No newline at end of file
@@ -0,0 +1,263 @@
+# Base
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Union
+
+# Third-party
+import torch
+
+def module_bytes(module: torch.nn.Module) -> int:
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+class ResidentModule:
+    """
+    A registered module, where it lives and its host copies.
+    """
+    def __init__(
+        self,
+        name: str,
+        module: torch.nn.Module,
+        group: str
+    ) -> None:
+        self.name = name
+        self.module = module
+        self.group = group
+        self.bytes = module_bytes(module)
+
+        param = next(module.parameters(), None)
+        self.on_device = param is not None and param.device.type != "cpu"
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+        # Host copies kept after the first offload, weights never change
+        self.host_tensors: Dict[tuple, torch.Tensor] = {}
+
+        # Statistics
+        self.loads = 0
+        self.offloads = 0
+        self.transfer_s = 0.0
+
+class ResidencyManager:
+    """
+    Keeps registered modules on the GPU within a VRAM budget.
+
+    Modules are used inside use() scopes, or loaded on demand by a forward
+    pre-hook. To fit a module, the least recently used modules outside any
+    scope are moved to host memory, pinned so they come back with async
+    copies. Without a budget every module stays on the device.
+    """
+    def __init__(
+        self,
+        device: str = "cuda",
+        budget_gb: Union[float, None] = None,
+        pin_memory: bool = True,
+        wait_s: float = 30
+    ) -> None:
+        self.device = device
+        self.is_cuda = device.startswith("cuda")
+        self.budget_gb = budget_gb
+        self.pin_memory = pin_memory and self.is_cuda
+        self.wait_s = wait_s
+
+        self.modules: Dict[str, ResidentModule] = {}
+        self.condition = threading.Condition()
+
+    # Private
+    ################################################################
+
+    @property
+    def budget_bytes(self) -> Union[int, None]:
+        return None if self.budget_gb is None else int(self.budget_gb * (1 << 30))
+
+    def _resident_bytes(self) -> int:
+        return sum(entry.bytes for entry in self.modules.values() if entry.on_device)
+
+    def _host(
+        self,
+        entry: ResidentModule,
+        key: tuple,
+        tensor: torch.Tensor
+    ) -> torch.Tensor:
+        host = entry.host_tensors.get(key)
+        if host is None:
+            host = tensor.detach().to("cpu")
+            if self.pin_memory:
+                host = host.pin_memory()
+            entry.host_tensors[key] = host
+        return host
+
+    def _move(
+        self,
+        entry: ResidentModule,
+        to_device: bool
+    ):
+        start = time.perf_counter()
+        for module_name, module in entry.module.named_modules():
+            for name, param in module._parameters.items():
+                if param is not None:
+                    param.data = (
+                        self._host(entry, (module_name, name), param).to(self.device, non_blocking=True)
+                        if to_device else self._host(entry, (module_name, name), param)
+                    )
+            for name, buffer in module._buffers.items():
+                if buffer is not None:
+                    host = self._host(entry, (module_name, name), buffer)
+                    module._buffers[name] = host.to(self.device, non_blocking=True) if to_device else host
+
+        entry.on_device = to_device
+        entry.transfer_s += time.perf_counter() - start
+        if to_device:
+            entry.loads += 1
+        else:
+            entry.offloads += 1
+
+    def _fit(
+        self,
+        needed: int,
+        keep: List[ResidentModule]
+    ) -> bool:
+        """
+        Offload idle modules, least recently used first, until needed more
+        bytes fit the budget. False if the modules in use do not allow it.
+        """
+        budget = self.budget_bytes
+        if budget is None:
+            return True
+
+        idle = sorted(
+            (e for e in self.modules.values() if e.on_device and e.in_use == 0 and e not in keep),
+            key=lambda e: e.last_used
+        )
+        offloaded = False
+        while self._resident_bytes() + needed > budget and len(idle) > 0:
+            entry = idle.pop(0)
+            print(f"Offloading {entry.name} ({entry.bytes / (1 << 20):.0f} MB)")
+            self._move(entry, False)
+            offloaded = True
+
+        # Hand the blocks back, other processes on the card may need them
+        if offloaded and self.is_cuda:
+            with torch.cuda.device(self.device):
+                torch.cuda.empty_cache()
+        return self._resident_bytes() + needed <= budget
+
+    def _ensure(self, entries: List[ResidentModule]):
+        # Caller holds the condition
+        missing = [e for e in entries if not e.on_device]
+        needed = sum(e.bytes for e in missing)
+
+        deadline = time.monotonic() + self.wait_s
+        while len(missing) > 0 and not self._fit(needed, entries):
+            # Wait for modules in use elsewhere to be released
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"VRAM budget exceeded loading {', '.join(e.name for e in missing)}")
+                break
+            self.condition.wait(remaining)
+
+        for entry in missing:
+            self._move(entry, True)
+        for entry in entries:
+            entry.last_used = time.monotonic()
+
+    def _resolve(self, names) -> List[ResidentModule]:
+        entries = [e for e in self.modules.values() if e.name in names or e.group in names]
+        if len(entries) == 0:
+            raise KeyError(f"No registered modules: {', '.join(names)}")
+        return entries
+
+    # Public
+    ################################################################
+
+    def load_device(self) -> str:
+        """
+        Where to load models, on the host when a budget decides residency.
+        """
+        return "cpu" if self.budget_gb is not None else self.device
+
+    def register(
+        self,
+        name: str,
+        module: torch.nn.Module,
+        group: str = None
+    ) -> torch.nn.Module:
+        entry = ResidentModule(name, module, group or name)
+
+        # Called modules are loaded first and kept during the call, diffusers
+        # calls vae.decode, so the children get the hooks too
+        def pre_hook(*_):
+            with self.condition:
+                entry.in_use += 1
+                self._ensure([entry])
+
+        def post_hook(*_):
+            with self.condition:
+                entry.in_use -= 1
+                self.condition.notify_all()
+
+        for hooked in [module, *module.children()]:
+            hooked.register_forward_pre_hook(pre_hook)
+            hooked.register_forward_hook(post_hook, always_call=True)
+
+        with self.condition:
+            self.modules[name] = entry
+            if entry.on_device and not self._fit(0, [entry]):
+                print(f"VRAM budget exceeded registering {name}")
+        return module
+
+    def register_pipeline(
+        self,
+        group: str,
+        pipe
+    ):
+        """
+        Every torch module of a diffusers pipeline as group.component.
+        """
+        for component, module in pipe.components.items():
+            if isinstance(module, torch.nn.Module):
+                self.register(f"{group}.{component}", module, group=group)
+        return pipe
+
+    @contextmanager
+    def use(self, *names: str):
+        """
+        Modules or groups on the device and kept there for the scope.
+        """
+        with self.condition:
+            entries = self._resolve(names)
+            for entry in entries:
+                entry.in_use += 1
+            self._ensure(entries)
+        try:
+            yield
+        finally:
+            with self.condition:
+                for entry in entries:
+                    entry.in_use -= 1
+                    entry.last_used = time.monotonic()
+                self.condition.notify_all()
+
+    def report(self) -> Dict[str, dict]:
+        with self.condition:
+            report = {
+                entry.name: {
+                    "mb": entry.bytes / (1 << 20),
+                    "resident": entry.on_device,
+                    "loads": entry.loads,
+                    "offloads": entry.offloads,
+                    "transfer_s": entry.transfer_s
+                }
+                for entry in self.modules.values()
+            }
+        return report
+
+    def summary(self) -> str:
+        with self.condition:
+            resident = self._resident_bytes() / (1 << 30)
+        budget = "unbounded" if self.budget_gb is None else f"{self.budget_gb:.1f} GB"
+        allocated = ""
+        if self.is_cuda and torch.cuda.is_available():
+            allocated = f", allocated {torch.cuda.memory_allocated(self.device) / (1 << 30):.2f} GB, peak {torch.cuda.max_memory_allocated(self.device) / (1 << 30):.2f} GB"
+        return f"resident {resident:.2f} GB of {budget}{allocated}"
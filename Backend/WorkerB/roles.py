@@ -0,0 +1,137 @@
+# Base
+import json
+import time
+import uuid
+import socket
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Sequence
+
+# Role -> task type it serves
+ROLES = {
+    "image": "image_gen",
+    "perspective": "pmesh_gen",
+    "object": "omesh_gen"
+}
+
+def detect_vram_gb(device: str) -> float:
+    if not device.startswith("cuda"):
+        return 0.0
+    try:
+        import torch
+        return torch.cuda.get_device_properties(torch.device(device).index or 0).total_memory / (1 << 30)
+    except Exception:
+        return 0.0
+
+class RoleThroughput:
+    """
+    Completed tasks per role, rate over a sliding window.
+    """
+    def __init__(self, window_s: float = 300) -> None:
+        self.window_s = window_s
+        self.completed: Dict[str, int] = {}
+        self.recent: Dict[str, Deque[float]] = {}
+        self.lock = threading.Lock()
+
+    def record(self, role: str):
+        now = time.monotonic()
+        with self.lock:
+            self.completed[role] = self.completed.get(role, 0) + 1
+            self.recent.setdefault(role, deque()).append(now)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        now = time.monotonic()
+        summary = {}
+        with self.lock:
+            for role, completed in self.completed.items():
+                recent = self.recent[role]
+                while len(recent) > 0 and now - recent[0] > self.window_s:
+                    recent.popleft()
+                summary[role] = {
+                    "completed": completed,
+                    "per_min": 60 * len(recent) / self.window_s
+                }
+        return summary
+
+class WorkerCapabilities:
+    """
+    What a worker serves and on which hardware, as advertised to the server.
+    """
+    def __init__(
+        self,
+        roles: Sequence[str],
+        device: str,
+        encoder: str = None,
+        backend: str = None,
+        lanes: Sequence[str] = None
+    ) -> None:
+        for role in roles:
+            if role not in ROLES:
+                raise ValueError(f"Invalid role: {role}")
+
+        self.worker_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.roles = list(roles)
+        self.device = device
+        self.encoder = encoder
+        self.backend = backend
+        self.lanes = None if lanes is None else list(lanes)
+        self.vram_gb = detect_vram_gb(device)
+
+    def to_dict(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "roles": self.roles,
+            "device": self.device,
+            "encoder": self.encoder,
+            "backend": self.backend,
+            "lanes": self.lanes,
+            "vram_gb": round(self.vram_gb, 1)
+        }
+
+class CapabilityAdvertiser:
+    """
+    Sends the worker's capabilities and throughput to the result queue every
+    interval_s, the server keeps workers seen recently as live.
+    """
+    def __init__(
+        self,
+        result_queue,
+        capabilities: WorkerCapabilities,
+        throughput: RoleThroughput,
+        counters: Callable[[], Dict[str, int]] = None,
+        interval_s: float = 30
+    ) -> None:
+        self.result_queue = result_queue
+        self.capabilities = capabilities
+        self.throughput = throughput
+        self.counters = counters
+        self.interval_s = interval_s
+
+        self.termination_event = threading.Event()
+        self.thread = threading.Thread(target=self._loop, name="advertiser", daemon=True)
+
+    def _loop(self):
+        while not self.termination_event.is_set():
+            try:
+                self.advertise()
+            except Exception as e:
+                print(f"Failed to advertise capabilities: {e}")
+            self.termination_event.wait(self.interval_s)
+
+    def advertise(self):
+        message = json.dumps({
+            "message_type": "worker_status",
+            **self.capabilities.to_dict(),
+            "throughput": self.throughput.summary(),
+            "counters": {} if self.counters is None else self.counters(),
+            "sent_at": time.time()
+        })
+        self.result_queue.send_message(message)
+
+    def start(self) -> "CapabilityAdvertiser":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.termination_event.set()
+        self.thread.join()
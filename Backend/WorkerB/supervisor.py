@@ -0,0 +1,249 @@
+# Base
+import os
+import time
+import signal
+import threading
+import subprocess
+from collections import deque
+from typing import Deque, Dict, List, Sequence, Tuple, Union
+
+def detect_devices() -> List[str]:
+    """
+    One device per visible GPU, a single CPU device without any.
+    """
+    try:
+        import torch
+        count = torch.cuda.device_count()
+    except Exception:
+        count = 0
+    return [f"cuda:{i}" for i in range(count)] or ["cpu:0"]
+
+def parse_device(device: str) -> Tuple[str, int]:
+    """
+    (kind, index) of cuda:N or cpu:N, the index defaults to 0.
+    """
+    kind, _, index = device.partition(":")
+    if kind not in ["cuda", "cpu"]:
+        raise ValueError(f"Invalid device: {device}")
+    return kind, int(index or 0)
+
+def core_slices(num_slices: int) -> List[List[int]]:
+    """
+    The usable cores split into num_slices contiguous groups.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    if num_slices > len(cores):
+        return [[cores[i % len(cores)]] for i in range(num_slices)]
+    return [
+        cores[i * len(cores) // num_slices:(i + 1) * len(cores) // num_slices]
+        for i in range(num_slices)
+    ]
+
+class WorkerProcess:
+    """
+    A child worker on one device slice, and its restart history.
+    """
+    def __init__(
+        self,
+        name: str,
+        device: str,
+        command: List[str],
+        env: Dict[str, str],
+        cores: Union[List[int], None] = None
+    ) -> None:
+        self.name = name
+        self.device = device
+        self.command = command
+        self.env = env
+        self.cores = cores
+
+        self.process: Union[subprocess.Popen, None] = None
+        self.next_start = 0.0
+        self.given_up = False
+
+        # Statistics
+        self.starts = 0
+        self.crashes: Deque[float] = deque()
+        self.exit_codes: List[int] = []
+
+class Supervisor:
+    """
+    Runs one worker process per device slice and restarts the ones that exit.
+
+    A GPU child only sees its own card (CUDA_VISIBLE_DEVICES), so models,
+    library defaults and allocator state of a child stay on it, and a crash
+    or OOM takes down one slice only. CPU devices split the cores between
+    their children and hide the GPUs, the same paths run without a GPU.
+
+    Children consume the same queues and SQS hands every message to one of
+    them, so work spreads over the devices as each one frees up. Crashing
+    children restart with exponential backoff, a slot that crashes more than
+    max_restarts times within restart_window_s is given up.
+    """
+    def __init__(
+        self,
+        command: Sequence[str],
+        devices: Sequence[str],
+        per_device: int = 1,
+        device_arg: str = "--device",
+        max_restarts: int = 5,
+        restart_window_s: float = 600,
+        backoff_s: float = 2,
+        max_backoff_s: float = 60,
+        stop_timeout_s: float = 30
+    ) -> None:
+        self.max_restarts = max_restarts
+        self.restart_window_s = restart_window_s
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.stop_timeout_s = stop_timeout_s
+
+        # CPU devices share the cores, every child gets its own slice
+        cpu_children = sum(per_device for device in devices if parse_device(device)[0] == "cpu")
+        slices = iter(core_slices(max(cpu_children, 1)))
+
+        self.workers: List[WorkerProcess] = []
+        for device in devices:
+            kind, index = parse_device(device)
+            for slot in range(per_device):
+                env = { **os.environ, "PYTHONUNBUFFERED": "1" }
+                cores = None
+                if kind == "cuda":
+                    # The card is cuda:0 inside the child
+                    env["CUDA_VISIBLE_DEVICES"] = str(index)
+                    child_device = "cuda:0"
+                else:
+                    cores = next(slices)
+                    env["CUDA_VISIBLE_DEVICES"] = ""
+                    for name in ["OMP_NUM_THREADS", "MKL_NUM_THREADS"]:
+                        env[name] = str(len(cores))
+                    child_device = "cpu"
+
+                name = f"{device}#{slot}" if per_device > 1 else device
+                self.workers.append(WorkerProcess(
+                    name,
+                    device,
+                    [*command, device_arg, child_device],
+                    env,
+                    cores=cores
+                ))
+
+        self.stop_event = threading.Event()
+
+    # Private
+    ################################################################
+
+    def _forward_output(self, worker: WorkerProcess, process: subprocess.Popen):
+        for line in process.stdout:
+            print(f"[{worker.name}] {line}", end="", flush=True)
+
+    def _start(self, worker: WorkerProcess):
+        # Pinning happens in the child before exec
+        cores = worker.cores
+        preexec_fn = None
+        if cores is not None and hasattr(os, "sched_setaffinity"):
+            preexec_fn = lambda: os.sched_setaffinity(0, cores)
+
+        worker.process = subprocess.Popen(
+            worker.command,
+            env=worker.env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            preexec_fn=preexec_fn
+        )
+        worker.starts += 1
+        print(f"Started {worker.name} (pid {worker.process.pid})")
+        threading.Thread(
+            target=self._forward_output,
+            args=(worker, worker.process),
+            name=f"output-{worker.name}",
+            daemon=True
+        ).start()
+
+    def _check(self, worker: WorkerProcess):
+        if worker.given_up:
+            return
+
+        # Waiting for its backoff to pass
+        if worker.process is None:
+            if time.monotonic() >= worker.next_start:
+                self._start(worker)
+            return
+
+        code = worker.process.poll()
+        if code is None:
+            return
+
+        # Workers run until stopped, any exit is a crash
+        now = time.monotonic()
+        worker.process = None
+        worker.exit_codes.append(code)
+        worker.crashes.append(now)
+        while len(worker.crashes) > 0 and now - worker.crashes[0] > self.restart_window_s:
+            worker.crashes.popleft()
+
+        if len(worker.crashes) > self.max_restarts:
+            worker.given_up = True
+            print(f"Giving up on {worker.name}, {len(worker.crashes)} crashes in {self.restart_window_s:.0f}s")
+            return
+
+        delay = min(self.backoff_s * 2 ** (len(worker.crashes) - 1), self.max_backoff_s)
+        worker.next_start = now + delay
+        print(f"{worker.name} exited with code {code}, restarting in {delay:.1f}s")
+
+    # Public
+    ################################################################
+
+    def run(
+        self,
+        poll_interval_s: float = 1.0
+    ):
+        """
+        Blocks until SIGINT/SIGTERM or every slot was given up, then stops the children.
+        """
+        for signum in [signal.SIGINT, signal.SIGTERM]:
+            signal.signal(signum, lambda *_: self.stop_event.set())
+
+        for worker in self.workers:
+            self._start(worker)
+
+        while not self.stop_event.wait(poll_interval_s):
+            for worker in self.workers:
+                self._check(worker)
+            if all(worker.given_up for worker in self.workers):
+                print("All workers given up")
+                break
+
+        self.stop()
+
+    def report(self) -> Dict[str, dict]:
+        return {
+            worker.name: {
+                "device": worker.device,
+                "pid": None if worker.process is None else worker.process.pid,
+                "starts": worker.starts,
+                "recent_crashes": len(worker.crashes),
+                "last_exit_code": worker.exit_codes[-1] if len(worker.exit_codes) > 0 else None,
+                "given_up": worker.given_up
+            }
+            for worker in self.workers
+        }
+
+    def stop(self):
+        self.stop_event.set()
+        running = [w.process for w in self.workers if w.process is not None and w.process.poll() is None]
+        for process in running:
+            process.terminate()
+
+        deadline = time.monotonic() + self.stop_timeout_s
+        for process in running:
+            try:
+                process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
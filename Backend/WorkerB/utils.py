@@ -1,5 +1,4 @@
 import io
-import os
 import cv2
 import numpy as np
 from PIL import Image, ImageOps
@@ -29,54 +28,13 @@ def resize_with_aspect(
     image = image.resize(new_size, Image.LANCZOS)
     return image
 
-def save_obj(pointnp_px3, facenp_fx3, fname):
-    fol, na = os.path.split(fname)
-    na, _ = os.path.splitext(na)
-
-    with open(fname, 'w') as fid:
-        for pidx, p in enumerate(pointnp_px3):
-            pp = p
-            fid.write('v %f %f %f\n' % (pp[0], pp[1], pp[2]))
-
-        for i, f in enumerate(facenp_fx3):
-            f1 = f + 1
-            fid.write('f %d %d %d\n' % (f1[0], f1[1], f1[2]))
-
-def save_obj_with_mtl(pointnp_px3, tcoords_px2, facenp_fx3, facetex_fx3, texmap_hxwx3, fname):
-    fol, na = os.path.split(fname)
-    na, _ = os.path.splitext(na)
-
-    matname = '%s/%s.mtl' % (fol, na)
-    fid = open(matname, 'w')
-    fid.write('newmtl material_0\n')
-    fid.write('Kd 1 1 1\n')
-    fid.write('Ka 0 0 0\n')
-    fid.write('Ks 0.4 0.4 0.4\n')
-    fid.write('Ns 10\n')
-    fid.write('illum 2\n')
-    fid.write(f"map_Kd {na}_0.png\n")
-    fid.close()
-    ####
-
-    fid = open(fname, 'w')
-    fid.write('mtllib %s.mtl\n' % na)
-
-    for pidx, p in enumerate(pointnp_px3):
-        pp = p
-        fid.write('v %f %f %f\n' % (pp[0], pp[1], pp[2]))
-
-    for pidx, p in enumerate(tcoords_px2):
-        pp = p
-        fid.write('vt %f %f\n' % (pp[0], pp[1]))
-
-    fid.write('usemtl material_0\n')
-    for i, f in enumerate(facenp_fx3):
-        f1 = f + 1
-        f2 = facetex_fx3[i] + 1
-        fid.write('f %d/%d %d/%d %d/%d\n' % (f1[0], f2[0], f1[1], f2[1], f1[2], f2[2]))
-    fid.close()
-
-    # save texture map
+def prepare_texture_map(
+    texmap_hxwx3: np.ndarray
+) -> np.ndarray:
+    """
+    Float texture map (bottom row first) to uint8 RGB (top row first),
+    with empty texels filled from their neighbours.
+    """
     lo, hi = 0, 1
     img = np.asarray(texmap_hxwx3, dtype=np.float32)
     img = (img - lo) * (255 / (hi - lo))
@@ -87,4 +45,4 @@ def save_obj_with_mtl(pointnp_px3, tcoords_px2, facenp_fx3, facetex_fx3, texmap_
     dilate_img = cv2.dilate(img, kernel, iterations=1)
     img = img * (1 - mask) + dilate_img * mask
     img = img.clip(0, 255).astype(np.uint8)
-    Image.fromarray(np.ascontiguousarray(img[::-1, :, :]), 'RGB').save(f'{fol}/{na}_0.png')
\ No newline at end of file
+    return np.ascontiguousarray(img[::-1, :, :])
\ No newline at end of file